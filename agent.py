@@ -4,51 +4,66 @@ import numpy as np
 import random
 from neural_network import NeuralNetwork
 
+# Shared placeholder for last_inputs/last_outputs before the first update
+NO_ACTIVITY = (0, 0, 0)
+
 class Agent:
-    def __init__(self, x, y, environment, brain=None):
+    # Properties shared by every agent live on the class rather than per instance
+    speed = 100
+    turn_rate = 3.0
+    radius = 10
+    color = (0, 200, 0)
+    direction_indicator_color = (200, 0, 0)
+    
+    # Vision properties
+    vision_radius = 120
+    vision_angle = math.pi
+    vision_color = (200, 200, 200, 50)  #semi transparent
+    
+    # Fitness awarded per food item eaten
+    fitness_per_food = 10
+    
+    # Per-agent state only; no __dict__ keeps large populations compact
+    __slots__ = (
+        'position_x', 'position_y', 'direction',
+        'alive', 'energy', 'food_eaten',
+        'brain',
+        'last_inputs', 'last_outputs', 'target_food',
+        'is_stuck'
+    )
+    
+    def __init__(self, x, y, brain=None, brain_inputs=3, brain_dtype=np.float64):
         # Position and movement
         self.position_x = x
         self.position_y = y
         self.direction = random.uniform(0, 2 * math.pi)
-        self.speed = 100
-        self.turn_rate = 3.0
         
         # Agent properties
-        self.radius = 10
         self.alive = True
         self.energy = 100
         self.food_eaten = 0
-        self.color = (0, 200, 0)
-        self.direction_indicator_color = (200, 0, 0)
-        
-        # Vision properties
-        self.vision_radius = 120
-        self.vision_angle = math.pi
-        self.vision_color = (200, 200, 200, 50)  #semi transparent
-        
-        # Environment
-        self.environment = environment
         
         # Neural network
         if brain is not None:
             self.brain = brain.copy()
         else:
             # NN architecture:
-            # 3 inputs: distance to food, angle to food, energy level
+            # 3 inputs: distance to food, angle to food, energy level,
+            #   then any sensed by the population (see interactions.py)
             # 3 outputs: turn left, turn right, move forward
-            self.brain = NeuralNetwork([3, 8, 3])
+            self.brain = NeuralNetwork([brain_inputs, 8, 3], dtype=brain_dtype)
         
         # For visualization
-        self.last_inputs = [0, 0, 0]
-        self.last_outputs = [0, 0, 0]
+        self.last_inputs = NO_ACTIVITY
+        self.last_outputs = NO_ACTIVITY
         self.target_food = None
         
-        # To track if agent is stuck
-        self.last_positions = []
-        self.stuck_counter = 0
+        # Set by the population's stuck detection
         self.is_stuck = False
     
-    def update(self, foods, dt):
+    def update(self, foods, dt, environment, sense=()):
+        """One tick of perception, decision and movement; sense holds the
+        extra brain inputs, if the brain has any"""
         if not self.alive:
             return
         
@@ -98,6 +113,7 @@ class Agent:
         else:
             # No food in sight
             inputs = [1.0, 0.0, self.energy / 100]
+        inputs.extend(sense)
         
         self.last_inputs = inputs
         
@@ -105,26 +121,6 @@ class Agent:
         outputs = self.brain.forward(inputs).copy()
         self.last_outputs = outputs.copy()
         
-        # Check if agent is stuck
-        self.last_positions.append((self.position_x, self.position_y))
-        if len(self.last_positions) > 20:
-            self.last_positions.pop(0)
-            
-            # Check if position hasn't changed significantly
-            if len(self.last_positions) >= 20:
-                x_positions = [p[0] for p in self.last_positions]
-                y_positions = [p[1] for p in self.last_positions]
-                x_diff = max(x_positions) - min(x_positions)
-                y_diff = max(y_positions) - min(y_positions)
-                
-                if x_diff < 10 and y_diff < 10:
-                    self.stuck_counter += 1
-                    if self.stuck_counter > 5:
-                        self.is_stuck = True
-                else:
-                    self.stuck_counter = 0
-                    self.is_stuck = False
-        
         # Apply stronger food pull if agent is stuck or food is visible
         food_pull_modifier = 1.0
         if self.is_stuck:
@@ -172,15 +168,15 @@ class Agent:
             if new_x < self.radius:
                 new_x = self.radius + 1
                 self.direction = math.pi - self.direction  # Horizontal bounce
-            elif new_x > self.environment.width - self.radius:
-                new_x = self.environment.width - self.radius - 1
+            elif new_x > environment.width - self.radius:
+                new_x = environment.width - self.radius - 1
                 self.direction = math.pi - self.direction  # Horizontal bounce
                 
             if new_y < self.radius:
                 new_y = self.radius + 1
                 self.direction = -self.direction  # Vertical bounce
-            elif new_y > self.environment.height - self.radius:
-                new_y = self.environment.height - self.radius - 1
+            elif new_y > environment.height - self.radius:
+                new_y = environment.height - self.radius - 1
                 self.direction = -self.direction  # Vertical bounce
                 
             # Apply direct pull toward food if visible
@@ -211,13 +207,19 @@ class Agent:
         
         return distance < self.radius + food.radius
     
-    def draw(self, screen):
+    def draw(self, screen, offset=(0, 0), scale=1.0):
+        """Draw the agent; offset is the world position at the screen's origin
+        and scale the screen pixels per world unit"""
         if not self.alive:
             return
+        x = (self.position_x - offset[0]) * scale
+        y = (self.position_y - offset[1]) * scale
+        radius = max(1, round(self.radius * scale))
+        vision_radius = max(1, round(self.vision_radius * scale))
             
         # Draw vision cone (semi-transparent)
-        vision_surface = pygame.Surface((self.vision_radius * 2, self.vision_radius * 2), pygame.SRCALPHA)
-        center = (self.vision_radius, self.vision_radius)
+        vision_surface = pygame.Surface((vision_radius * 2, vision_radius * 2), pygame.SRCALPHA)
+        center = (vision_radius, vision_radius)
         
         # Calculate start and end angles for arc
         start_angle = self.direction - self.vision_angle / 2
@@ -225,15 +227,14 @@ class Agent:
         
         # Draw vision cone as a pie wedge
         pygame.draw.arc(vision_surface, self.vision_color, 
-                         (0, 0, self.vision_radius * 2, self.vision_radius * 2),
-                         start_angle, end_angle, self.vision_radius)
+                         (0, 0, vision_radius * 2, vision_radius * 2),
+                         start_angle, end_angle, vision_radius)
         
         # Create points for the wedge
         points = [center]
         for angle in np.linspace(start_angle, end_angle, 20):
-            x = center[0] + math.cos(angle) * self.vision_radius
-            y = center[1] + math.sin(angle) * self.vision_radius
-            points.append((x, y))
+            points.append((center[0] + math.cos(angle) * vision_radius,
+                           center[1] + math.sin(angle) * vision_radius))
         points.append(center)
         
         # Draw the wedge
@@ -243,11 +244,14 @@ class Agent:
         
         # Display the vision surface
         screen.blit(vision_surface, 
-                   (self.position_x - self.vision_radius, 
-                    self.position_y - self.vision_radius))
+                   (x - vision_radius, 
+                    y - vision_radius))
         
         # Draw line to target food if visible
         if self.target_food is not None:
+            target_x = (self.target_food.position_x - offset[0]) * scale
+            target_y = (self.target_food.position_y - offset[1]) * scale
+            
             # Get normalized distance for visual effects
             dx = self.target_food.position_x - self.position_x
             dy = self.target_food.position_y - self.position_y
@@ -261,13 +265,13 @@ class Agent:
                 0
             )
             pygame.draw.line(screen, line_color, 
-                            (self.position_x, self.position_y),
-                            (self.target_food.position_x, self.target_food.position_y), 1)
+                            (x, y),
+                            (target_x, target_y), 1)
             
             # Draw midpoint dot, larger when closer to food
-            mid_x = (self.position_x + self.target_food.position_x) / 2
-            mid_y = (self.position_y + self.target_food.position_y) / 2
-            dot_size = int(3 + (1 - normalized_distance) * 3)
+            mid_x = (x + target_x) / 2
+            mid_y = (y + target_y) / 2
+            dot_size = max(1, int((3 + (1 - normalized_distance) * 3) * scale))
             
             # Add subtle glow effect for the dot
             for i in range(3):
@@ -281,17 +285,17 @@ class Agent:
             pygame.draw.circle(screen, (255, 255, 0), (int(mid_x), int(mid_y)), dot_size)
         
         # Draw agent body
-        pygame.draw.circle(screen, self.color, (int(self.position_x), int(self.position_y)), self.radius)
+        pygame.draw.circle(screen, self.color, (int(x), int(y)), radius)
         
         # Draw direction indicator (line pointing in direction of movement)
-        end_x = self.position_x + math.cos(self.direction) * self.radius
-        end_y = self.position_y + math.sin(self.direction) * self.radius
+        end_x = x + math.cos(self.direction) * radius
+        end_y = y + math.sin(self.direction) * radius
         pygame.draw.line(screen, self.direction_indicator_color, 
-                        (self.position_x, self.position_y), 
+                        (x, y), 
                         (end_x, end_y), 2)
     
     def get_fitness(self):
-        return 10 * self.food_eaten
+        return self.fitness_per_food * self.food_eaten
     
     @staticmethod
     def normalize_angle(angle):
@@ -1,245 +1,859 @@
-from flask import Flask, render_template, jsonify, request, send_file
-import pygame
-import sys
-import random
-import math
-import numpy as np
-import io
-import base64
-import threading
 import time
-from agent import Agent
-from food import Food
-from environment import Environment
-from population import Population
-from neural_network_visualizer import NeuralNetworkVisualizer
 
-# Initialize Flask
-app = Flask(__name__)
+MODULE_START = time.perf_counter()
+
+from flask import Flask, Response, render_template, jsonify, request
+import base64
+import io
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import traceback
 
-# Initialize Pygame
-pygame.init()
+# Importing this module is cheap and side-effect free: pygame, NumPy and the
+# simulation are imported and started lazily by ensure_simulation_started(),
+# on the first request or from gunicorn's post_fork hook (gunicorn.conf.py).
 
 # Constants
 SCREEN_WIDTH = 900
 SCREEN_HEIGHT = 600
 SIMULATION_WIDTH = 900
 SIMULATION_HEIGHT = 600
+# A world larger than the frame is shown through a camera that follows the
+# best agent, with a minimap of the whole world
+WORLD_WIDTH = int(os.environ.get('WORLD_WIDTH', SIMULATION_WIDTH))
+WORLD_HEIGHT = int(os.environ.get('WORLD_HEIGHT', SIMULATION_HEIGHT))
+MINIMAP_WIDTH = 200
 BACKGROUND_COLOR = (30, 30, 30)
 TEXT_COLOR = (200, 200, 200)
+STEPS_PER_SECOND = 60
+
+# /api/frame and /api/status caching: shared caches (CDN, reverse proxy) may
+# reuse a response for CACHE_MAX_AGE seconds, browsers always revalidate
+# with the ETag; ?since=<tick> requests wait up to LONG_POLL_TIMEOUT seconds.
+# Each wait holds a gunicorn thread, so at most LONG_POLL_SLOTS wait at once
+# per worker (default: all threads but two, kept for control and health
+# requests); the rest, and any while paused, get 204 at once
+CACHE_MAX_AGE = int(os.environ.get('CACHE_MAX_AGE', 1))
+LONG_POLL_TIMEOUT = float(os.environ.get('LONG_POLL_TIMEOUT', 1.5))
+LONG_POLL_SLOTS = int(os.environ.get('LONG_POLL_SLOTS',
+                                     max(1, int(os.environ.get('GUNICORN_THREADS', 4)) - 2)))
+CONTROL_ACTIONS = ('pause', 'resume', 'reset', 'next_generation')
+
+# Set REPLAY_FILE to record every tick to a replay log that can be
+# played back through /api/replay/frame (with one simulation only: shared
+# mode or a single worker)
+REPLAY_FILE = os.environ.get('REPLAY_FILE')
+
+# Early generation-end policies, e.g. TERMINATION=alive=0.2,idle=5 (see termination.py)
+TERMINATION = os.environ.get('TERMINATION', '')
+
+# Food spawning and regrowth, e.g. FOOD_DYNAMICS=patchy,regrow=2 (see food_field.py)
+FOOD_DYNAMICS = os.environ.get('FOOD_DYNAMICS', '')
+
+# Set SHARED_SIMULATION=1 to run one simulation process for all gunicorn
+# workers; it publishes status and frames to shared memory and the workers
+# serve them from there (see shared_frame.py)
+SHARED_SIMULATION = os.environ.get('SHARED_SIMULATION') == '1'
+
+# Files one simulation appends to can't be shared by several per-worker
+# simulations, which would overwrite each other's records
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+SINGLE_SIMULATION = SHARED_SIMULATION or WEB_CONCURRENCY == 1
+if REPLAY_FILE and not SINGLE_SIMULATION:
+    print(f"Error: REPLAY_FILE needs SHARED_SIMULATION=1 or a single worker, not {WEB_CONCURRENCY} "
+          f"workers with their own simulations; not recording a replay")
+    REPLAY_FILE = None
+
+# /api/policy serves the best brain so far. Set POLICY_FILE to also export it
+# there (in shared mode it is always written to a file, a temporary one by
+# default, which the workers reload). Concurrent requests arriving within
+# POLICY_BATCH_WINDOW_MS of each other share one forward pass.
+POLICY_FILE = os.environ.get('POLICY_FILE')
+POLICY_BATCH_WINDOW_MS = float(os.environ.get('POLICY_BATCH_WINDOW_MS', 2))
+
+# Per-process memory budget in MiB (0: none). Near it a process drops frame
+# caches and caps frame quality, then also renders /api/frame at half size
+# (see memory_monitor.py); /api/memory reports usage per subsystem
+MEMORY_BUDGET_MB = float(os.environ.get('MEMORY_BUDGET_MB', 0))
+
+# Per-generation metrics for /api/history: the latest HISTORY_CAPACITY rows
+# are kept in memory, and with HISTORY_DIR every row is appended to files
+# there too (in shared mode always, a temporary directory by default, which
+# the workers read; see history.py)
+HISTORY_DIR = os.environ.get('HISTORY_DIR')
+HISTORY_CAPACITY = int(os.environ.get('HISTORY_CAPACITY', 4096))
+if HISTORY_DIR and not SINGLE_SIMULATION:
+    print(f"Error: HISTORY_DIR needs SHARED_SIMULATION=1 or a single worker, not {WEB_CONCURRENCY} "
+          f"workers with their own simulations; keeping each worker's history in memory only")
+    HISTORY_DIR = None
+HISTORY_POINTS = 500
+MEMORY_ACTIONS = ('trace_start', 'trace_stop', 'memory_snapshot')
+REDUCED_MEMORY, MINIMAL_MEMORY = 1, 2  # memory_monitor.REDUCED and MINIMAL
 
-# Global simulation state
+# Global simulation state (per worker process)
 simulation_state = {
-    'environment': None,
-    'population': None,
-    'foods': [],
-    'generation': 1,
-    'best_fitness': 0,
-    'generation_time': 0,
-    'paused': False,
-    'running': False,
-    'screen': None,
-    'clock': None,
+    'simulation': None,
+    'worker': None,
     'nn_visualizer': None,
     'last_frame': None,
-    'stats': {
-        'alive_count': 0,
-        'stuck_count': 0,
-        'fps': 60
-    }
+    'last_pixels': None,
+    'pid': None,
+    'startup': {},
+    # Latest (tick, revision, status, frame) in per-worker mode, and the
+    # count of control actions applied, which versions changes made while paused
+    'published': None,
+    'revision': 0,
+    # Shared mode: the buffer, the control pipe's write end and the simulation process id
+    'shared': None,
+    'control': None,
+    'process': None,
+    'policy_file': POLICY_FILE,
+    'history_dir': HISTORY_DIR,
+    # Shared mode: this worker's read-only view of the simulation's history
+    'history_reader': None
+}
+startup_lock = threading.Lock()
+published_condition = threading.Condition()
+long_poll_slots = threading.BoundedSemaphore(LONG_POLL_SLOTS)
+
+# Adaptive frames: one encode per quality tier per frame, shared by all
+# clients of this process, and each client's measured limits
+frame_quality_state = {
+    'encoder': None,
+    'clients': None
+}
+
+# Champion weights being served and the request batcher
+policy_state = {
+    'server': None,
+    'batcher': None
+}
+policy_lock = threading.Lock()
+
+# This process's MemoryMonitor, and in the shared simulation process the
+# latest report it publishes alongside the frame
+memory_state = {
+    'monitor': None,
+    'pid': None,
+    'report': b'{}',
+    'next_report': 0.0,
+    'snapshot': None
 }
+memory_lock = threading.Lock()
+
+def init_pygame():
+    """Initialize only what off-screen rendering needs: no display, no audio"""
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import pygame
+    pygame.font.init()  # Surfaces, drawing and PNG encoding need no other subsystem
+    return pygame
 
 def initialize_simulation():
     """Initialize the simulation"""
-    global simulation_state
-    
+    from simulation import Simulation
+    from food_field import parse_dynamics
+    from neural_network_visualizer import NeuralNetworkVisualizer
+    from termination import Termination, parse_policies
+
     print("Initializing simulation...")
-    
-    # Create environment
-    simulation_state['environment'] = Environment(SIMULATION_WIDTH, SIMULATION_HEIGHT)
-    print(f"Environment created: {SIMULATION_WIDTH}x{SIMULATION_HEIGHT}")
-    
-    # Create population
-    population_size = 50
-    simulation_state['population'] = Population(population_size, simulation_state['environment'])
-    print(f"Population created with {len(simulation_state['population'].agents)} agents")
-    
-    # Create food
-    food_count = 20
-    simulation_state['foods'] = []
-    for _ in range(food_count):
-        x = random.randint(30, SIMULATION_WIDTH-30)
-        y = random.randint(30, SIMULATION_HEIGHT-30)
-        simulation_state['foods'].append(Food(x, y))
-    print(f"Created {len(simulation_state['foods'])} food items")
-    
-    # Create neural network visualizer
-    simulation_state['nn_visualizer'] = NeuralNetworkVisualizer(
-        SIMULATION_WIDTH + 20, 20, 260, 300
-    )
-    
-    # Reset stats
-    simulation_state['generation'] = 1
-    simulation_state['best_fitness'] = 0
-    simulation_state['generation_time'] = 0
-    simulation_state['paused'] = False
-    simulation_state['running'] = True
-    
+    termination = Termination(parse_policies(TERMINATION))
+    simulation = Simulation(WORLD_WIDTH, WORLD_HEIGHT, log_generations=True, termination=termination,
+                            food_options=parse_dynamics(FOOD_DYNAMICS))
+    print(f"Population created with {len(simulation.population.agents)} agents, "
+          f"{len(simulation.foods)} food items")
+
+    # Record to the replay log; a reset re-records from generation 1
+    if REPLAY_FILE:
+        from replay import ReplayRecorder
+        simulation.recorder = ReplayRecorder(REPLAY_FILE, WORLD_WIDTH, WORLD_HEIGHT, chunk_ticks=60)
+        print(f"Recording replay to {REPLAY_FILE}")
+
+    # Keep the best brain for /api/policy, in memory when this process serves it
+    from policy import ChampionTracker
+    server = None if SHARED_SIMULATION else get_policy()[0]
+    simulation.on_generation_end = ChampionTracker(simulation_state['policy_file'], server)
+
+    from history import MetricsHistory
+    simulation.history = MetricsHistory(HISTORY_CAPACITY, simulation_state['history_dir'])
+
+    simulation_state['simulation'] = simulation
+    simulation_state['nn_visualizer'] = NeuralNetworkVisualizer(SIMULATION_WIDTH + 20, 20, 260, 300)
+    simulation_state['last_frame'] = None
+
     print("Simulation initialized successfully!")
 
-def reset_food():
-    """Reset all food to new random positions"""
-    for food in simulation_state['foods']:
-        food.position_x = random.randint(30, SIMULATION_WIDTH-30)
-        food.position_y = random.randint(30, SIMULATION_HEIGHT-30)
-
-def next_generation():
-    """Move to next generation"""
-    simulation_state['generation'] += 1
-    simulation_state['generation_time'] = 0
-    
-    # Evolve population
-    simulation_state['population'].evolve()
-    reset_food()
-
-def run_simulation_step():
-    """Run one step of the simulation"""
-    if simulation_state['paused'] or not simulation_state['population']:
+def ensure_simulation_started():
+    """Start this process's simulation thread if it isn't running yet.
+    Safe to call on every request; also restarts after a fork, since the
+    parent's thread does not survive it."""
+    pid = os.getpid()
+    if simulation_state['pid'] == pid:
         return
-    
-    dt = 1.0 / 60.0  # 60 FPS
-    simulation_state['generation_time'] += dt
-    
-    # Update agents
-    simulation_state['population'].update(simulation_state['foods'], dt)
-    
-    # Check food collisions
-    for agent in simulation_state['population'].agents:
-        if agent.alive:
-            for food in simulation_state['foods']:
-                if agent.check_food_collision(food):
-                    agent.energy += 50
-                    agent.food_eaten += 1
-                    food.position_x = random.randint(30, SIMULATION_WIDTH-30)
-                    food.position_y = random.randint(30, SIMULATION_HEIGHT-30)
-    
-    # Update best fitness
-    if simulation_state['population'].agents:
-        current_best = max([agent.get_fitness() for agent in simulation_state['population'].agents])
-        simulation_state['best_fitness'] = max(simulation_state['best_fitness'], current_best)
-    
-    # Check if generation should end
-    all_dead = all(not agent.alive for agent in simulation_state['population'].agents)
-    timeout = simulation_state['generation_time'] > 45  # 45 seconds timeout
-    
-    if all_dead or timeout:
-        print(f"Generation {simulation_state['generation']} ended - All dead: {all_dead}, Timeout: {timeout}")
-        next_generation()
-    
-    # Update stats
-    simulation_state['stats']['alive_count'] = sum(1 for agent in simulation_state['population'].agents if agent.alive)
-    simulation_state['stats']['stuck_count'] = sum(1 for agent in simulation_state['population'].agents if agent.alive and agent.is_stuck)
-
-def render_simulation():
-    """Render the simulation to an image"""
-    if not simulation_state['population']:
+
+    with startup_lock:
+        if simulation_state['pid'] == pid:
+            return
+
+        if SHARED_SIMULATION:
+            # Workers only read the shared buffer; the simulation runs elsewhere
+            start_shared_simulation()
+            simulation_state['pid'] = pid
+            return
+
+        init_start = time.perf_counter()
+        from simulation import SimulationWorker
+
+        init_pygame()
+        initialize_simulation()
+        worker = SimulationWorker(simulation_state['simulation'], dt=1.0 / STEPS_PER_SECOND,
+                                  max_steps_per_second=STEPS_PER_SECOND, on_step=publish)
+        with worker.lock:
+            publish(worker.simulation)
+        worker.start()
+        simulation_state['worker'] = worker
+        simulation_state['pid'] = pid
+
+        simulation_state['startup']['simulation_init_ms'] = (time.perf_counter() - init_start) * 1000
+        print(f"Worker {pid} started simulation in {simulation_state['startup']['simulation_init_ms']:.0f} ms "
+              f"(app import took {simulation_state['startup']['app_import_ms']:.0f} ms)")
+
+def start_shared_simulation():
+    """Create the shared buffer and fork the simulation process, once.
+    Call it before any threads exist: gunicorn's on_starting hook, or
+    __main__ for the development server. Workers forked afterwards inherit
+    the buffer and the write end of the control pipe."""
+    if simulation_state['process'] is not None:
+        return
+
+    from shared_frame import SharedFrameBuffer
+
+    shared = SharedFrameBuffer(create=True)
+    if not simulation_state['policy_file']:
+        simulation_state['policy_file'] = os.path.join(tempfile.gettempdir(), f"{shared.name}-policy.npz")
+    if not simulation_state['history_dir']:
+        simulation_state['history_dir'] = os.path.join(tempfile.gettempdir(), f"{shared.name}-history")
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(write_fd)
+        try:
+            run_shared_simulation(shared, read_fd)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            os._exit(0)
+
+    os.close(read_fd)
+    simulation_state['shared'] = shared
+    simulation_state['control'] = write_fd
+    simulation_state['process'] = pid
+    print(f"Started shared simulation process {pid} publishing to {shared.name}")
+
+def stop_shared_simulation():
+    """Stop the simulation process and free the shared buffer"""
+    pid = simulation_state['process']
+    if pid is None:
+        return
+
+    # The process exits once every copy of the pipe's write end is closed
+    os.close(simulation_state['control'])
+    deadline = time.perf_counter() + 5
+    try:
+        while os.waitpid(pid, os.WNOHANG) == (0, 0):
+            if time.perf_counter() > deadline:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                break
+            time.sleep(0.05)
+    except ChildProcessError:
+        pass  # Already reaped (gunicorn's master reaps every child)
+
+    simulation_state['shared'].close()
+    simulation_state['shared'].unlink()
+    simulation_state['process'] = None
+    if not POLICY_FILE and os.path.exists(simulation_state['policy_file']):
+        os.remove(simulation_state['policy_file'])
+    if not HISTORY_DIR:
+        shutil.rmtree(simulation_state['history_dir'], ignore_errors=True)
+
+def run_shared_simulation(shared, control_fd):
+    """Body of the simulation process: step, publish, and apply control actions"""
+    from simulation import SimulationWorker
+
+    simulation_state['shared'] = shared
+    init_pygame()
+    initialize_simulation()
+
+    worker = SimulationWorker(simulation_state['simulation'], dt=1.0 / STEPS_PER_SECOND,
+                              max_steps_per_second=STEPS_PER_SECOND, on_step=publish)
+    with worker.lock:
+        publish(worker.simulation)
+    worker.start()
+
+    # One action per line; EOF means the master and all workers are gone
+    with os.fdopen(control_fd) as control:
+        for line in control:
+            action = line.strip()
+            if action in MEMORY_ACTIONS:
+                apply_memory_action(action)
+            else:
+                apply_control(worker, action)
+
+    worker.stop()
+
+def send_control(action):
+    """Forward a /api/control (or /api/memory) action to the simulation process"""
+    if action in CONTROL_ACTIONS or action in MEMORY_ACTIONS:
+        # Writes this short are atomic on a pipe, so workers can't interleave
+        os.write(simulation_state['control'], f"{action}\n".encode())
+
+def status_response(stats):
+    """The fields /api/status reports"""
+    return {
+        'tick': stats['tick'],
+        'generation': stats['generation'],
+        'best_fitness': stats['best_fitness'],
+        'alive_count': stats['alive_count'],
+        'stuck_count': stats['stuck_count'],
+        'time': stats['time'],
+        'paused': stats['paused'],
+        'ticks_saved': stats['ticks_saved']
+    }
+
+def apply_control(worker, action):
+    """Apply a /api/control action to a running simulation"""
+    with worker.lock:
+        simulation = worker.simulation
+        if action == 'pause':
+            simulation.paused = True
+        elif action == 'resume':
+            simulation.paused = False
+        elif action == 'reset':
+            simulation.reset()
+        elif action == 'next_generation':
+            simulation.next_generation()
+        else:
+            return
+
+        # Publish even while paused so readers see the change
+        simulation_state['revision'] += 1
+        publish(simulation)
+
+def publish(simulation):
+    """Render the frame and publish it with the status, versioned by tick and control revision"""
+    get_memory_monitor().check()
+    store_frame(simulation)
+    tick = simulation.tick
+    revision = simulation_state['revision']
+    status = json.dumps(status_response(simulation.stats())).encode()
+    frame = json.dumps({'frame': simulation_state['last_frame'], 'tick': tick}).encode()
+    pixels = simulation_state['last_pixels']
+
+    if SHARED_SIMULATION:
+        # The memory report rides along for /api/memory in the workers, refreshed once a second
+        if time.monotonic() >= memory_state['next_report']:
+            memory_state['report'] = json.dumps(memory_report()).encode()
+            memory_state['next_report'] = time.monotonic() + 1.0
+        simulation_state['shared'].publish(tick, revision, status, frame, pixels, memory_state['report'])
+    else:
+        with published_condition:
+            simulation_state['published'] = (tick, revision, status, frame, pixels)
+            published_condition.notify_all()
+
+def read_published(count=None):
+    """(tick, revision, status, frame, pixels): JSON bodies and the raw RGB
+    frame, or None before the first publish. count limits how many parts are
+    copied out of shared memory."""
+    if SHARED_SIMULATION:
+        return simulation_state['shared'].read(count)
+    return simulation_state['published']
+
+def wait_for_update(since, timeout, count=None):
+    """Wait until the published tick differs from the client's, or a control
+    action changes the state. Returns the latest publish, or None on timeout
+    (at once while paused)"""
+    deadline = time.perf_counter() + timeout
+    published = read_published(count)
+    revision = published[1] if published else None
+    if published is not None and published[0] == since and json.loads(published[2])['paused']:
+        # Paused: nothing changes until a control action, so don't hold a thread
         return None
-    
+
+    while published is None or (published[0] == since and published[1] == revision):
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return None
+        if SHARED_SIMULATION:
+            # No cross-process condition to wait on; check twice a tick
+            time.sleep(min(remaining, 0.5 / STEPS_PER_SECOND))
+        else:
+            with published_condition:
+                if simulation_state['published'] is published:
+                    published_condition.wait(remaining)
+        published = read_published(count)
+    return published
+
+def versioned_response(part):
+    """Serve the published status (part 2) or frame (part 3) with tick-based
+    ETag, Cache-Control and ?since=<tick> long-polling"""
+    published = read_versioned(part - 1)
+    if not isinstance(published, tuple):
+        return published
+    return versioned(Response(published[part], mimetype='application/json'), published)
+
+def read_versioned(count):
+    """The latest publish, after waiting for ?since=<tick> if given; otherwise
+    the 503/204 response to return instead"""
+    since = request.args.get('since', type=int)
+    if since is None:
+        published = read_published(count)
+        if published is None:
+            return jsonify({'error': 'Simulation starting'}), 503
+    else:
+        published = None
+        if long_poll_slots.acquire(blocking=False):
+            try:
+                published = wait_for_update(since, LONG_POLL_TIMEOUT, count)
+            finally:
+                long_poll_slots.release()
+        if published is None:
+            # Nothing newer yet (e.g. paused), or every slot is taken; the
+            # client polls again after Retry-After
+            response = Response(status=204)
+            response.cache_control.no_store = True
+            response.headers['Retry-After'] = '1'
+            return response
+    return published
+
+def versioned(response, published, suffix=''):
+    """Add tick headers, ETag and Cache-Control; answers If-None-Match with 304"""
+    tick, revision = published[0], published[1]
+    response.headers['X-Simulation-Tick'] = str(tick)
+    response.set_etag(f"{tick}-{revision}{suffix}")
+    response.cache_control.public = True
+    response.cache_control.max_age = 0
+    response.cache_control.s_maxage = CACHE_MAX_AGE
+    return response.make_conditional(request)
+
+def get_memory_monitor():
+    """This process's MemoryMonitor, created on first use after any fork"""
+    pid = os.getpid()
+    if memory_state['pid'] == pid:
+        return memory_state['monitor']
+
+    with memory_lock:
+        if memory_state['pid'] != pid:
+            from memory_monitor import MemoryMonitor, nbytes, array_bytes
+
+            def replay_bytes():
+                recorder = simulation_state['simulation'] and simulation_state['simulation'].recorder
+                player = replay_state['player']
+                return array_bytes(recorder) + (array_bytes(player.reader) + nbytes(player.reader.cached_chunk)
+                                                if player else 0)
+
+            def policy_bytes():
+                weights = policy_state['server'] and policy_state['server'].weights
+                return weights.genome.nbytes if weights else 0
+
+            monitor = MemoryMonitor(int(MEMORY_BUDGET_MB * 2**20) or None)
+            monitor.register('population', lambda: simulation_state['simulation'].population.memory_bytes()
+                             if simulation_state['simulation'] else 0)
+            monitor.register('food', lambda: simulation_state['simulation'].foods.nbytes
+                             if simulation_state['simulation'] else 0)
+            monitor.register('frames', lambda: nbytes(simulation_state['last_frame']) +
+                             nbytes(simulation_state['last_pixels']) + nbytes(simulation_state['published']) +
+                             (nbytes(simulation_state['shared'].cached) if simulation_state['shared'] else 0))
+            monitor.register('frame_cache', lambda: nbytes(frame_quality_state['encoder'].encoded)
+                             if frame_quality_state['encoder'] else 0)
+            monitor.register('replay', replay_bytes)
+            monitor.register('policy', policy_bytes)
+            monitor.register('history', lambda: simulation_state['simulation'].history.nbytes
+                             if simulation_state['simulation'] else 0)
+            monitor.on_level_change = apply_memory_level
+            memory_state['monitor'] = monitor
+            memory_state['pid'] = pid
+    return memory_state['monitor']
+
+def apply_memory_level(level):
+    """Drop what can be rebuilt when the memory level rises; the frame tier cap
+    and half-size frames follow the level where frames are made"""
+    encoder = frame_quality_state['encoder']
+    if level > 0 and encoder is not None:
+        with encoder.lock:
+            encoder.encoded = {}
+    if level > 0 and replay_state['player'] is not None:
+        replay_state['player'].reader.cached_chunk = None
+        replay_state['player'].reader.cached_offset = None
+
+def apply_memory_action(action):
+    """Start or stop tracemalloc, or take a snapshot for the next report"""
+    monitor = get_memory_monitor()
+    if action == 'trace_start':
+        monitor.start_tracing()
+    elif action == 'trace_stop':
+        monitor.stop_tracing()
+        memory_state['snapshot'] = None
+    elif action == 'memory_snapshot':
+        memory_state['snapshot'] = monitor.snapshot()
+
+    # Make the shared simulation process publish a fresh report
+    memory_state['next_report'] = 0.0
+
+def memory_report():
+    report = get_memory_monitor().report()
+    if memory_state['snapshot'] is not None:
+        report['snapshot'] = memory_state['snapshot']
+    return report
+
+def memory_response():
+    """This process's memory report, plus the simulation process's in shared
+    mode. ?trace=start|stop toggles tracemalloc, ?snapshot=1 adds the top
+    allocation sites and their growth since the previous snapshot."""
+    trace = request.args.get('trace')
+    if trace in ('start', 'stop'):
+        apply_memory_action(f"trace_{trace}")
+        if SHARED_SIMULATION:
+            send_control(f"trace_{trace}")
+    if request.args.get('snapshot') == '1':
+        apply_memory_action('memory_snapshot')
+        if SHARED_SIMULATION:
+            send_control('memory_snapshot')
+
+    result = {'process': memory_report()}
+    if SHARED_SIMULATION:
+        published = read_published()
+        # The simulation's snapshot shows up once it has published again
+        result['simulation'] = json.loads(published[5]) if published and len(published) > 5 else None
+    return jsonify(result)
+
+def get_frame_quality():
+    """The tier encoder and client registry, created on first use"""
+    with startup_lock:
+        if frame_quality_state['encoder'] is None:
+            from frame_quality import TierEncoder, ClientRegistry
+            frame_quality_state['encoder'] = TierEncoder(SCREEN_WIDTH, SCREEN_HEIGHT)
+            frame_quality_state['clients'] = ClientRegistry()
+    return frame_quality_state['encoder'], frame_quality_state['clients']
+
+def adaptive_frame_response():
+    """JPEG frame at the quality tier that suits this client's width, frame
+    rate, byte budget and measured throughput; X-Frame-Interval tells it how
+    long to wait before the next one"""
+    from frame_quality import TIERS
+    encoder, clients = get_frame_quality()
+
+    client = clients.get(request.args.get('client') or request.remote_addr)
+    client.update_limits(request.args.get('width', type=int),
+                         max(1, request.args.get('fps', 10, type=int)),
+                         request.args.get('budget', type=int))
+    # The client's timing of its previous fetch: bytes received in ms milliseconds
+    received = request.args.get('rx', type=int)
+    milliseconds = request.args.get('ms', type=float)
+    if received and milliseconds:
+        client.record_send(received, milliseconds / 1000)
+    tier, interval = client.choose(encoder)
+    # Near the memory budget, cap the quality (smaller images to scale and encode)
+    level = get_memory_monitor().level
+    if level >= REDUCED_MEMORY:
+        tier = max(tier, len(TIERS) - 1 if level >= MINIMAL_MEMORY else len(TIERS) - 3)
+
+    published = read_versioned(3)
+    if not isinstance(published, tuple):
+        return published
+
+    data = encoder.encode((published[0], published[1]), published[4], tier)
+    response = Response(data, mimetype='image/jpeg')
+    response.headers['X-Frame-Tier'] = TIERS[tier][0]
+    response.headers['X-Frame-Interval'] = str(round(interval * 1000))
+    # Vary by tier, so a shared cache never hands one client's tier to another
+    return versioned(response, published, f"-{TIERS[tier][0]}")
+
+def get_policy():
+    """The champion PolicyServer and MicroBatcher, created on first use. In
+    shared mode the server reloads the file the simulation process writes."""
+    with policy_lock:
+        if policy_state['server'] is None:
+            from policy import PolicyServer, MicroBatcher
+            path = simulation_state['policy_file'] if SHARED_SIMULATION else None
+            policy_state['server'] = PolicyServer(path)
+            policy_state['batcher'] = MicroBatcher(POLICY_BATCH_WINDOW_MS / 1000)
+    return policy_state['server'], policy_state['batcher']
+
+def policy_response():
+    """Actions for a batch of observations from the champion's brain"""
+    import numpy as np
+    server, batcher = get_policy()
+    weights = server.current()
+    if weights is None:
+        return jsonify({'error': 'No champion yet; one is chosen when the first generation ends'}), 503
+    if request.method == 'GET':
+        return jsonify(weights.describe())
+
+    # Raw float32 rows in, one action byte per row out; or the same as JSON
+    n_inputs = weights.layer_sizes[0]
+    binary = request.mimetype == 'application/octet-stream'
+    try:
+        if binary:
+            observations = np.frombuffer(request.get_data(), dtype='<f4').reshape(-1, n_inputs)
+        else:
+            body = request.get_json(silent=True) or {}
+            observations = np.asarray(body.get('observations'), dtype=np.float32).reshape(-1, n_inputs)
+    except (TypeError, ValueError):
+        return jsonify({'error': f"Expected observations as rows of {n_inputs} numbers"}), 400
+
+    outputs = batcher.run(weights, observations)
+    actions = outputs.argmax(axis=1).astype(np.uint8)
+    if binary:
+        response = Response(actions.tobytes(), mimetype='application/octet-stream')
+    else:
+        result = {'actions': actions.tolist()}
+        if request.args.get('outputs') == '1':
+            result['outputs'] = outputs.tolist()
+        response = jsonify(result)
+    response.headers['X-Policy-Generation'] = str(weights.generation)
+    return response
+
+def policy_export_response():
+    """The champion as an .npz file; policy.load_policy() reads it back"""
+    server, _ = get_policy()
+    weights = server.current()
+    if weights is None:
+        return jsonify({'error': 'No champion yet'}), 404
+    buffer = io.BytesIO()
+    weights.save(buffer)
+    response = Response(buffer.getvalue(), mimetype='application/octet-stream')
+    response.headers['Content-Disposition'] = f"attachment; filename=policy-gen{weights.generation}.npz"
+    return response
+
+def history_response():
+    """Downsampled per-generation metrics: ?from=&to= select rows (recorded
+    generations, counted from 0 across resets), ?points= caps the samples
+    per metric and ?metrics=best_fitness,mean_fitness picks the metrics"""
+    if SHARED_SIMULATION:
+        # The simulation process appends to the history files; read them
+        if simulation_state['history_reader'] is None:
+            from history import MetricsHistory
+            simulation_state['history_reader'] = MetricsHistory(directory=simulation_state['history_dir'],
+                                                                readonly=True)
+        history = simulation_state['history_reader']
+    else:
+        history = simulation_state['simulation'].history
+
+    metrics = request.args.get('metrics')
+    try:
+        result = history.series(request.args.get('from', 0, type=int), request.args.get('to', type=int),
+                                min(request.args.get('points', HISTORY_POINTS, type=int), 10 * HISTORY_POINTS),
+                                metrics.split(',') if metrics else None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+def draw_simulation(environment, population, foods, nn_visualizer):
+    """Draw the simulation (or a replayed copy of it) onto a new surface"""
+    pygame = init_pygame()
+    from camera import Camera, Minimap, draw_world
+
     # Create a surface for rendering
     surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
     surface.fill(BACKGROUND_COLOR)
-    
-    # Draw environment
-    simulation_state['environment'].draw(surface)
-    
-    # Draw food
-    for food in simulation_state['foods']:
-        food.draw(surface)
-    
-    # Draw agents
-    for agent in simulation_state['population'].agents:
-        if agent.alive:
-            agent.draw(surface)
-    
-    # Get best agent for neural network visualization
-    best_agent = simulation_state['population'].get_best_agent()
+
+    # Draw environment, food and agents; only what is in view of a world
+    # larger than the frame, centred on the best agent
+    best_agent = population.get_best_agent()
+    camera = None
+    if environment.width > SIMULATION_WIDTH or environment.height > SIMULATION_HEIGHT:
+        camera = Camera(SIMULATION_WIDTH, SIMULATION_HEIGHT, environment.width, environment.height)
+        if best_agent:
+            camera.follow(best_agent.position_x, best_agent.position_y, smoothing=1.0)
+    draw_world(surface, environment, population, foods, camera, BACKGROUND_COLOR)
+    if camera is not None:
+        minimap = Minimap(MINIMAP_WIDTH, environment.width, environment.height)
+        minimap.draw(surface, (SIMULATION_WIDTH - MINIMAP_WIDTH - 10, 10), foods, population, camera)
+
+    # Neural network of the best agent
     if best_agent:
-        simulation_state['nn_visualizer'].update(best_agent.brain, best_agent.last_inputs, best_agent.last_outputs)
-        simulation_state['nn_visualizer'].draw(surface)
-    
-    # Convert to bytes
-    pygame.image.save(surface, "temp_simulation.png")
-    
-    # Convert to base64
-    with open("temp_simulation.png", "rb") as f:
-        img_data = f.read()
-    
-    return base64.b64encode(img_data).decode()
-
-def simulation_thread():
-    """Background thread for running the simulation"""
-    while simulation_state['running']:
-        try:
-            if not simulation_state['paused']:
-                run_simulation_step()
-                # Render and store the frame
-                simulation_state['last_frame'] = render_simulation()
-            time.sleep(1.0 / 60.0)  # 60 FPS
-        except Exception as e:
-            print(f"Simulation error: {e}")
-            time.sleep(0.1)  # Brief pause on error
-
-# Initialize simulation first
-initialize_simulation()
-
-# Start simulation thread
-simulation_thread = threading.Thread(target=simulation_thread, daemon=True)
-simulation_thread.start()
-
-# Give simulation time to start
-time.sleep(0.5)
-
-@app.route('/')
-def index():
-    """Main page"""
-    return render_template('index.html')
-
-@app.route('/api/status')
-def get_status():
-    """Get current simulation status"""
-    return jsonify({
-        'generation': simulation_state['generation'],
-        'best_fitness': simulation_state['best_fitness'],
-        'alive_count': simulation_state['stats']['alive_count'],
-        'stuck_count': simulation_state['stats']['stuck_count'],
-        'time': simulation_state['generation_time'],
-        'paused': simulation_state['paused']
-    })
-
-@app.route('/api/frame')
-def get_frame():
-    """Get current simulation frame"""
-    if simulation_state['last_frame']:
-        return jsonify({'frame': simulation_state['last_frame']})
-    return jsonify({'frame': None})
-
-@app.route('/api/control', methods=['POST'])
-def control_simulation():
-    """Control the simulation"""
-    action = request.json.get('action')
-    
-    if action == 'pause':
-        simulation_state['paused'] = True
-    elif action == 'resume':
-        simulation_state['paused'] = False
-    elif action == 'reset':
-        initialize_simulation()
-    elif action == 'next_generation':
-        next_generation()
-    
-    return jsonify({'status': 'success'})
+        nn_visualizer.update(best_agent.brain, best_agent.last_inputs, best_agent.last_outputs)
+        nn_visualizer.draw(surface)
+
+    return surface
+
+def encode_png(surface):
+    """Base64 PNG, encoded in memory so concurrent renders don't share a temp file"""
+    pygame = init_pygame()
+    buffer = io.BytesIO()
+    pygame.image.save(surface, buffer, "frame.png")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+def render_simulation(environment, population, foods, nn_visualizer):
+    """Render the simulation (or a replayed copy of it) to a base64 PNG"""
+    return encode_png(draw_simulation(environment, population, foods, nn_visualizer))
+
+def store_frame(simulation):
+    """Render and store the frame after each simulation step, as PNG and as
+    raw RGB pixels for the quality tiers"""
+    pygame = init_pygame()
+    surface = draw_simulation(simulation.environment, simulation.population, simulation.foods,
+                              simulation_state['nn_visualizer'])
+    simulation_state['last_pixels'] = pygame.image.tobytes(surface, 'RGB')
+    if get_memory_monitor().level >= MINIMAL_MEMORY:
+        # Over most of the memory budget: a quarter of the PNG pixels
+        surface = pygame.transform.scale(surface, (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
+    simulation_state['last_frame'] = encode_png(surface)
+
+# Replay playback, shared by all requests
+replay_state = {
+    'player': None,
+    'lock': threading.Lock()
+}
+
+def get_replay_player():
+    """Open the replay log lazily and pick up ticks recorded since the last request"""
+    if replay_state['player'] is None:
+        from environment import Environment
+        from neural_network_visualizer import NeuralNetworkVisualizer
+        from replay import ReplayReader, ReplayPlayer
+
+        reader = ReplayReader(REPLAY_FILE)
+        replay_state['player'] = ReplayPlayer(reader, Environment(reader.metadata['width'],
+                                                                  reader.metadata['height']))
+        replay_state['nn_visualizer'] = NeuralNetworkVisualizer(SIMULATION_WIDTH + 20, 20, 260, 300)
+    replay_state['player'].reader.refresh()
+    return replay_state['player']
+
+def create_app():
+    """Build the Flask app. Nothing heavy happens here; see ensure_simulation_started()"""
+    app = Flask(__name__)
+
+    @app.before_request
+    def start_simulation():
+        # Lazy initialization on the first request that needs the simulation
+        if request.endpoint != 'health':
+            ensure_simulation_started()
+        get_memory_monitor().check()
+
+    @app.route('/')
+    def index():
+        """Main page"""
+        return render_template('index.html')
+
+    @app.route('/api/health')
+    def health():
+        """Liveness and cold-start timings; never starts the simulation"""
+        return jsonify({
+            'status': 'ok',
+            'pid': os.getpid(),
+            'simulation_started': simulation_state['pid'] == os.getpid(),
+            'shared_simulation': SHARED_SIMULATION,
+            'startup': simulation_state['startup']
+        })
+
+    @app.route('/api/status')
+    def get_status():
+        """Get current simulation status"""
+        return versioned_response(2)
+
+    @app.route('/api/frame')
+    def get_frame():
+        """Get current simulation frame"""
+        return versioned_response(3)
+
+    @app.route('/api/frame/image')
+    def get_frame_image():
+        """Current frame as a JPEG sized for the client:
+        ?width=<display px>&fps=<max frame rate>&budget=<bytes per second>&client=<id>,
+        and &rx=<bytes>&ms=<duration> of the previous frame's fetch as the client timed it"""
+        return adaptive_frame_response()
+
+    @app.route('/api/replay')
+    def get_replay_index():
+        """List recorded generations and their tick counts"""
+        if not REPLAY_FILE or not os.path.exists(REPLAY_FILE):
+            return jsonify({'generations': []})
+
+        with replay_state['lock']:
+            reader = get_replay_player().reader
+            generations = [{'generation': gen, 'ticks': reader.tick_count(gen)} for gen in reader.generations]
+        return jsonify({'generations': generations})
+
+    @app.route('/api/replay/frame')
+    def get_replay_frame():
+        """Render a recorded tick; clients seek by generation/tick and choose their own speed"""
+        if not REPLAY_FILE or not os.path.exists(REPLAY_FILE):
+            return jsonify({'error': 'No replay recorded'}), 404
+
+        generation = request.args.get('generation', type=int)
+        tick = request.args.get('tick', 0, type=int)
+
+        with replay_state['lock']:
+            player = get_replay_player()
+            if generation is None:
+                generation = player.reader.generations[0] if player.reader.generations else 0
+            try:
+                player.seek(generation, tick)
+            except KeyError as e:
+                return jsonify({'error': str(e)}), 404
+            frame = render_simulation(player.environment, player.population, player.foods,
+                                      replay_state['nn_visualizer'])
+
+        return jsonify({
+            'frame': frame,
+            'generation': generation,
+            'tick': tick,
+            'ticks': player.reader.tick_count(generation)
+        })
+
+    @app.route('/api/policy', methods=['GET', 'POST'])
+    def policy():
+        """GET: the champion being served. POST: its actions (0 left, 1 right,
+        2 forward) for {"observations": [[distance, angle, energy], ...]}, or
+        for a raw little-endian float32 body sent as application/octet-stream.
+        Inputs are scaled like the simulation's: distance / vision radius
+        (1 when no food is seen), angle / half the vision angle, energy / 100."""
+        return policy_response()
+
+    @app.route('/api/policy/export')
+    def export_policy():
+        """Download the champion brain"""
+        return policy_export_response()
+
+    @app.route('/api/history')
+    def history():
+        """Per-generation best/mean/median fitness, alive counts, food eaten,
+        ticks per second and step time, downsampled for charts"""
+        return history_response()
+
+    @app.route('/api/memory')
+    def memory():
+        """Memory usage per process and subsystem, the budget level, and
+        tracemalloc snapshots on demand (?trace=start|stop, ?snapshot=1)"""
+        return memory_response()
+
+    @app.route('/api/control', methods=['POST'])
+    def control_simulation():
+        """Control the simulation"""
+        action = request.json.get('action')
+        if SHARED_SIMULATION:
+            send_control(action)
+        else:
+            apply_control(simulation_state['worker'], action)
+
+        return jsonify({'status': 'success'})
+
+    return app
+
+app = create_app()
+simulation_state['startup']['app_import_ms'] = (time.perf_counter() - MODULE_START) * 1000
 
 if __name__ == '__main__':
-    import os
+    if SHARED_SIMULATION:
+        start_shared_simulation()
     port = int(os.environ.get('PORT', 8000))
-    app.run(debug=False, host='0.0.0.0', port=port)
+    try:
+        app.run(debug=False, host='0.0.0.0', port=port)
+    finally:
+        stop_shared_simulation()
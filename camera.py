@@ -0,0 +1,180 @@
+"""
+Viewing a world larger than the screen.
+
+Camera maps the world onto a view of view_width x view_height pixels: it
+pans, zooms around a point and can follow a target such as the best agent.
+draw_world() draws only the agents and food in the camera's view, found
+through spatial grids (see spatial.py), straight into the view at the
+camera's zoom, so the drawing work grows with what is visible rather than
+with the world's size. Zoomed out below DENSITY_ZOOM, where sprites would
+be a pixel or two, the view is a density image instead. Minimap renders the
+whole world as such an image, small, with the camera's view outlined.
+"""
+import numpy as np
+from agent import Agent
+from food import Food
+from food_field import PARKED
+from spatial import UniformGrid
+
+CULL_CELL = 128  # World units per cell of the agent culling grid
+DENSITY_ZOOM = 0.3  # Below this zoom the view is drawn as a density image
+
+
+class Camera:
+    """Centre and zoom (screen pixels per world unit) of a view of the world"""
+    def __init__(self, view_width, view_height, world_width, world_height, zoom=1.0, max_zoom=4.0):
+        self.view_width = view_width
+        self.view_height = view_height
+        self.world_width = world_width
+        self.world_height = world_height
+        # Zoomed all the way out the whole world fits the view
+        self.min_zoom = min(1.0, view_width / world_width, view_height / world_height)
+        self.max_zoom = max_zoom
+        self.zoom = min(max(zoom, self.min_zoom), max_zoom)
+        self.center_x = world_width / 2
+        self.center_y = world_height / 2
+        self.following = True
+        self.clamp()
+
+    def view_rect(self):
+        """(left, top, right, bottom) of the view in world coordinates"""
+        half_width = self.view_width / (2 * self.zoom)
+        half_height = self.view_height / (2 * self.zoom)
+        return (self.center_x - half_width, self.center_y - half_height,
+                self.center_x + half_width, self.center_y + half_height)
+
+    def clamp(self):
+        """Keep the view inside the world, or centred on it when it is smaller"""
+        for axis, view, world in (('center_x', self.view_width, self.world_width),
+                                  ('center_y', self.view_height, self.world_height)):
+            half = view / (2 * self.zoom)
+            if 2 * half >= world:
+                setattr(self, axis, world / 2)
+            else:
+                setattr(self, axis, min(max(getattr(self, axis), half), world - half))
+
+    def pan(self, dx, dy):
+        """Move the view by (dx, dy) screen pixels; stops following"""
+        self.center_x += dx / self.zoom
+        self.center_y += dy / self.zoom
+        self.following = False
+        self.clamp()
+
+    def zoom_by(self, factor, anchor=None):
+        """Zoom in (factor > 1) or out, keeping the world point under the
+        anchor screen position (default the view centre) in place"""
+        anchor_x, anchor_y = anchor or (self.view_width / 2, self.view_height / 2)
+        left, top, _, _ = self.view_rect()
+        world_x = left + anchor_x / self.zoom
+        world_y = top + anchor_y / self.zoom
+        self.zoom = min(max(self.zoom * factor, self.min_zoom), self.max_zoom)
+        self.center_x = world_x + (self.view_width / 2 - anchor_x) / self.zoom
+        self.center_y = world_y + (self.view_height / 2 - anchor_y) / self.zoom
+        self.clamp()
+
+    def follow(self, x, y, smoothing=0.15):
+        """Move part of the way (all of it with smoothing=1) towards a target"""
+        self.center_x += (x - self.center_x) * smoothing
+        self.center_y += (y - self.center_y) * smoothing
+        self.clamp()
+
+
+def visible_agents(population, left, top, right, bottom):
+    """Indices of living agents whose vision cone may reach into the rectangle"""
+    x, y, alive = population.positions()
+    margin = Agent.vision_radius
+    grid = UniformGrid(x, y, CULL_CELL, population.environment.width, population.environment.height)
+    candidates = grid.in_rect(left - margin, top - margin, right + margin, bottom + margin)
+    inside = (alive[candidates] & (x[candidates] >= left - margin) & (x[candidates] <= right + margin) &
+              (y[candidates] >= top - margin) & (y[candidates] <= bottom + margin))
+    return np.sort(candidates[inside])
+
+
+def density_image(width, height, left, top, scale, foods, population):
+    """(height, width, 3) RGB image of the world from (left, top) at scale
+    pixels per world unit: food density in red, living agents in green"""
+    image = np.zeros((height * width, 3), dtype=np.uint8)
+
+    def pixels(x, y):
+        # Flat pixel index of each position inside the image
+        column = np.floor((x - left) * scale).astype(np.int64)
+        row = np.floor((y - top) * scale).astype(np.int64)
+        inside = (column >= 0) & (column < width) & (row >= 0) & (row < height)
+        return row[inside] * width + column[inside]
+
+    x = foods.x[:len(foods)]
+    y = foods.y[:len(foods)]
+    out = x != PARKED
+    # One bincount instead of a draw call per item
+    counts = np.bincount(pixels(x[out], y[out]), minlength=width * height)
+    image[:, 0] = np.where(counts > 0, np.minimum(255, 90 + 55 * counts), 0)
+
+    agent_x, agent_y, alive = population.positions()
+    image[pixels(agent_x[alive], agent_y[alive])] = (60, 230, 60)
+    return image.reshape(height, width, 3)
+
+
+def draw_world(surface, environment, population, foods, camera=None, background=(0, 0, 0)):
+    """Draw the environment, food and living agents onto surface. With a
+    camera only its view is drawn, into the top-left view_width x
+    view_height pixels at its zoom; without one the world is drawn 1:1 from
+    the origin."""
+    import pygame
+
+    if camera is None:
+        environment.draw(surface)
+        foods.draw(surface)
+        for agent in population.agents:
+            if agent.alive:
+                agent.draw(surface)
+        return
+
+    left, top, right, bottom = camera.view_rect()
+    target = surface.subsurface((0, 0, camera.view_width, camera.view_height))
+    target.fill(background)
+    offset = (left, top)
+    zoom = camera.zoom
+
+    if zoom < DENSITY_ZOOM:
+        image = density_image(camera.view_width, camera.view_height, left, top, zoom, foods, population)
+        # surfarray wants (width, height, 3)
+        target.blit(pygame.surfarray.make_surface(image.swapaxes(0, 1)), (0, 0))
+        environment.draw(target, offset, zoom)
+        return
+
+    environment.draw(target, offset, zoom)
+    margin = Food.radius * 2
+    foods.draw(target, foods.in_rect(left - margin, top - margin, right + margin, bottom + margin), offset, zoom)
+    for index in visible_agents(population, left, top, right, bottom).tolist():
+        population.agents[index].draw(target, offset, zoom)
+
+
+class Minimap:
+    """The whole world downsampled to width pixels across: food density in
+    red, agents in green and the camera's view as a white outline"""
+    border_color = (120, 120, 120)
+    view_color = (230, 230, 230)
+
+    def __init__(self, width, world_width, world_height):
+        self.width = width
+        self.height = max(1, round(width * world_height / world_width))
+        self.scale = width / world_width
+
+    def render(self, foods, population, camera=None):
+        import pygame
+
+        image = density_image(self.width, self.height, 0, 0, self.scale, foods, population)
+        # surfarray wants (width, height, 3)
+        minimap = pygame.surfarray.make_surface(image.swapaxes(0, 1))
+        if camera is not None:
+            left, top, right, bottom = camera.view_rect()
+            pygame.draw.rect(minimap, self.view_color,
+                             (int(left * self.scale), int(top * self.scale),
+                              max(2, int((right - left) * self.scale)), max(2, int((bottom - top) * self.scale))), 1)
+        return minimap
+
+    def draw(self, surface, position, foods, population, camera=None):
+        import pygame
+        surface.blit(self.render(foods, population, camera), position)
+        pygame.draw.rect(surface, self.border_color, (position[0] - 1, position[1] - 1,
+                                                      self.width + 2, self.height + 2), 1)
@@ -0,0 +1,384 @@
+"""
+Distributed fitness evaluation: a coordinator that evolves one Population
+and workers, on any number of machines, that pull batches of genomes over
+HTTP, simulate them headlessly and push back their fitness.
+
+    python distributed.py coordinator --port 8765 --population-size 400 --batch-size 50
+    python distributed.py worker --coordinator http://<host>:8765      (one per core, on every node)
+    python distributed.py coordinator --local-workers 4                  (workers on this machine)
+    python distributed.py coordinator --precision float32 --genome-encoding int8
+
+Protocol (all bodies are raw little-endian float32, no pickling):
+    GET  /config             episode settings as JSON
+    POST /lease              a batch of genomes, one row each; headers X-Batch,
+                             X-Shape (rows,genome length), X-Seed, X-Lease-Seconds,
+                             X-Genome-Encoding. With --genome-encoding int8 the body
+                             is the float32 scales followed by int8 genomes, a
+                             quarter of the bytes (see precision.encode()).
+                             204 when every batch is leased, 410 when the run is over
+    POST /result/<batch>     the batch's fitness vector; 409 if it is no longer wanted
+
+A batch not returned within --lease-timeout seconds is handed out again,
+so a worker that dies only delays its batch. The first result for a batch
+wins; late duplicates are ignored. Each batch is simulated as one arena
+(its agents share the food), seeded from the coordinator.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process
+
+WIDTH = 900
+HEIGHT = 600
+DT = 1.0 / 60.0
+
+
+def evaluate(genomes, layer_sizes, settings, seed):
+    """Fitness of each genome after one headless episode with all of them in one arena"""
+    import numpy as np
+    from environment import Environment
+    from food_field import FoodField
+    from neural_network import NeuralNetwork
+    from population import Population
+
+    random.seed(seed)
+    np.random.seed(seed)
+
+    environment = Environment(settings['width'], settings['height'])
+    population = Population(len(genomes), environment, backend=settings['backend'], sync_agents=False,
+                            arenas=settings['arenas'], arena_fitness=settings['arena_fitness'],
+                            interactions=settings.get('interactions', ()),
+                            precision=settings.get('precision', 'float64'))
+    for agent, genome in zip(population.agents, genomes):
+        agent.brain = NeuralNetwork.from_genome(layer_sizes, genome, population.dtype)
+    population.reset_stats()
+
+    foods = FoodField(settings['food_count'], environment.width, environment.height, arenas=population.arenas,
+                      **settings.get('food_dynamics', {}))
+    elapsed = 0.0
+    ticks = 0
+    while population.alive_count > 0 and elapsed <= settings['generation_timeout']:
+        foods.update(DT)
+        population.step(foods, DT)
+        elapsed += DT
+        ticks += 1
+    return np.array(population.get_fitnesses(), dtype='<f4'), ticks
+
+
+class Coordinator:
+    """Hands out the current generation's genomes in leased batches and
+    evolves the population once every batch has a result"""
+    def __init__(self, population, batch_size, lease_timeout, generations, settings, seed=0):
+        self.population = population
+        self.batch_size = batch_size
+        self.lease_timeout = lease_timeout
+        self.generations = generations
+        self.settings = settings
+        self.seed = seed
+        self.layer_sizes = population.agents[0].brain.layer_sizes
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+
+        self.generation = 0
+        self.champion = (float('-inf'), None)  # fitness, genome
+        self.start_generation()
+
+    def start_generation(self):
+        import numpy as np
+        size = len(self.population.agents)
+        self.generation += 1
+        self.genomes = self.population.get_genomes(range(size))
+        self.batches = [(start, min(start + self.batch_size, size)) for start in range(0, size, self.batch_size)]
+        self.pending = deque(range(len(self.batches)))
+        self.leases = {}  # batch index -> deadline
+        self.done = set()
+        self.fitnesses = np.zeros(size, dtype=np.float32)
+        self.redispatched = 0
+        self.ticks = 0
+        self.started = time.perf_counter()
+
+    def lease(self):
+        """(batch id, genomes, seed), or None while every batch is out"""
+        with self.lock:
+            now = time.monotonic()
+            for index, deadline in list(self.leases.items()):
+                if deadline < now:
+                    # Presumed lost: give it to the next worker that asks
+                    del self.leases[index]
+                    self.pending.append(index)
+                    self.redispatched += 1
+            if not self.pending:
+                return None
+            index = self.pending.popleft()
+            self.leases[index] = now + self.lease_timeout
+            start, end = self.batches[index]
+            seed = self.seed * 1_000_003 + self.generation * 1009 + index
+            return f"{self.generation}-{index}", self.genomes[start:end], seed
+
+    def submit(self, batch_id, fitnesses, ticks=0):
+        """Record a batch's fitness; False if the batch is stale or malformed"""
+        with self.lock:
+            generation, index = (int(part) for part in batch_id.split('-'))
+            if generation != self.generation or index in self.done or not 0 <= index < len(self.batches):
+                return False
+            start, end = self.batches[index]
+            if len(fitnesses) != end - start:
+                return False
+
+            self.fitnesses[start:end] = fitnesses
+            self.done.add(index)
+            self.leases.pop(index, None)
+            if index in self.pending:
+                self.pending.remove(index)
+            self.ticks += ticks * (end - start)
+            if len(self.done) == len(self.batches):
+                self.end_generation()
+            return True
+
+    def end_generation(self):
+        seconds = time.perf_counter() - self.started
+        best = int(self.fitnesses.argmax())
+        if self.fitnesses[best] > self.champion[0]:
+            self.champion = (float(self.fitnesses[best]), self.genomes[best].copy())
+        print(f"Generation {self.generation:3d}: best {self.fitnesses.max():.0f}, "
+              f"mean {self.fitnesses.mean():.1f}, {len(self.batches)} batches "
+              f"({self.redispatched} re-dispatched), {seconds:.1f}s, "
+              f"{self.ticks / seconds if seconds > 0 else 0:.0f} agent-ticks/s")
+
+        if self.generation >= self.generations:
+            self.finished.set()
+            return
+        self.population.evolve(self.fitnesses.tolist())
+        self.start_generation()
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    coordinator = None  # Set on the subclass made by serve()
+
+    def do_GET(self):
+        if self.path == '/config':
+            body = dict(self.coordinator.settings, layer_sizes=self.coordinator.layer_sizes)
+            self.reply(200, json.dumps(body).encode(), 'application/json')
+        else:
+            self.reply(404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        coordinator = self.coordinator
+
+        if self.path == '/lease':
+            from precision import encode
+            if coordinator.finished.is_set():
+                return self.reply(410)
+            batch = coordinator.lease()
+            if batch is None:
+                return self.reply(204)
+            batch_id, genomes, seed = batch
+            encoding = coordinator.settings.get('genome_encoding', 'float32')
+            self.reply(200, encode(genomes, coordinator.layer_sizes, encoding), headers={
+                'X-Batch': batch_id,
+                'X-Shape': f"{genomes.shape[0]},{genomes.shape[1]}",
+                'X-Seed': str(seed),
+                'X-Lease-Seconds': str(coordinator.lease_timeout),
+                'X-Genome-Encoding': encoding
+            })
+        elif self.path.startswith('/result/'):
+            import numpy as np
+            fitnesses = np.frombuffer(body, dtype='<f4')
+            ticks = int(self.headers.get('X-Ticks', 0))
+            try:
+                accepted = coordinator.submit(self.path[len('/result/'):], fitnesses, ticks)
+            except ValueError:
+                accepted = False
+            self.reply(200 if accepted else 409)
+        else:
+            self.reply(404)
+
+    def reply(self, status, body=b'', content_type='application/octet-stream', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # One line per request would drown the generation log
+
+
+def serve(coordinator, port):
+    """Start the HTTP server on a background thread"""
+    handler = type('Handler', (CoordinatorHandler,), {'coordinator': coordinator})
+    server = ThreadingHTTPServer(('0.0.0.0', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_worker(url, retry_seconds=30):
+    """Pull, simulate and push batches until the coordinator says the run is
+    over, or can't be reached for retry_seconds"""
+    import numpy as np
+    from precision import decode
+
+    url = url.rstrip('/')
+    settings = None
+    last_contact = time.monotonic()
+    evaluated = 0
+    while True:
+        try:
+            if settings is None:
+                with urllib.request.urlopen(f"{url}/config", timeout=10) as response:
+                    settings = json.loads(response.read())
+
+            request = urllib.request.Request(f"{url}/lease", data=b'', method='POST')
+            with urllib.request.urlopen(request, timeout=10) as response:
+                if response.status == 204:
+                    last_contact = time.monotonic()
+                    time.sleep(0.2)
+                    continue
+                batch_id = response.headers['X-Batch']
+                shape = tuple(int(part) for part in response.headers['X-Shape'].split(','))
+                seed = int(response.headers['X-Seed'])
+                encoding = response.headers.get('X-Genome-Encoding', 'float32')
+                genomes = decode(response.read(), shape, settings['layer_sizes'], encoding)
+            last_contact = time.monotonic()
+
+            fitnesses, ticks = evaluate(genomes, settings['layer_sizes'], settings, seed)
+            request = urllib.request.Request(f"{url}/result/{batch_id}", data=fitnesses.tobytes(), method='POST',
+                                             headers={'X-Ticks': str(ticks)})
+            try:
+                urllib.request.urlopen(request, timeout=10).close()
+            except urllib.error.HTTPError as e:
+                if e.code != 409:  # 409: someone else finished it first
+                    raise
+            evaluated += len(genomes)
+        except urllib.error.HTTPError as e:
+            if e.code == 410:
+                break
+            raise
+        except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+            if time.monotonic() - last_contact > retry_seconds:
+                print(f"Worker {os.getpid()}: coordinator unreachable ({e}), exiting")
+                break
+            time.sleep(1)
+    print(f"Worker {os.getpid()} done after evaluating {evaluated} genomes")
+
+
+def run_coordinator(args):
+    import numpy as np
+    from environment import Environment
+    from population import Population
+
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    settings = {
+        'width': WIDTH,
+        'height': HEIGHT,
+        'food_count': args.food_count,
+        'generation_timeout': args.generation_timeout,
+        'backend': args.backend,
+        'arenas': args.arenas,
+        'arena_fitness': args.arena_fitness,
+        'food_dynamics': args.food_dynamics,
+        'precision': args.precision,
+        'genome_encoding': args.genome_encoding
+    }
+    # The coordinator never steps its population, it only evolves it
+    population = Population(args.population_size, Environment(WIDTH, HEIGHT), backend='python',
+                            elite_count=args.elite_count, interactions=args.interactions,
+                            precision=args.precision)
+    # Workers need the interactions the genomes were shaped for (sense adds inputs)
+    settings['interactions'] = sorted(population.interactions)
+    coordinator = Coordinator(population, args.batch_size, args.lease_timeout, args.generations, settings,
+                              args.seed)
+    server = serve(coordinator, args.port)
+    print(f"Coordinator on port {args.port}: {args.population_size} genomes in batches of {args.batch_size}, "
+          f"{args.generations} generations")
+
+    workers = [Process(target=run_worker, args=(f"http://127.0.0.1:{args.port}",), daemon=True)
+               for _ in range(args.local_workers)]
+    for worker in workers:
+        worker.start()
+
+    start = time.perf_counter()
+    try:
+        coordinator.finished.wait()
+    except KeyboardInterrupt:
+        pass
+    # Keep answering 410 briefly so workers learn the run is over
+    time.sleep(1)
+    server.shutdown()
+    for worker in workers:
+        worker.join(timeout=5)
+    print(f"Best fitness {coordinator.champion[0]:.0f} in {time.perf_counter() - start:.1f}s")
+
+    if args.save_champion and coordinator.champion[1] is not None:
+        from policy import PolicyWeights, save_policy
+        save_policy(args.save_champion, PolicyWeights(coordinator.layer_sizes, coordinator.champion[1],
+                                                       coordinator.generation, coordinator.champion[0]),
+                    args.genome_encoding)
+        print(f"Saved the champion to {args.save_champion}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distributed fitness evaluation")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    coordinator = commands.add_parser('coordinator', help="Evolve a population, serving its genomes to workers")
+    coordinator.add_argument('--port', type=int, default=8765)
+    coordinator.add_argument('--population-size', type=int, default=200)
+    coordinator.add_argument('--batch-size', type=int, default=50, help="Genomes per lease (one arena)")
+    coordinator.add_argument('--generations', type=int, default=20)
+    coordinator.add_argument('--lease-timeout', type=float, default=60, help="Seconds before a batch is re-sent")
+    coordinator.add_argument('--elite-count', type=int, default=1)
+    coordinator.add_argument('--food-count', type=int, default=20)
+    coordinator.add_argument('--food-dynamics', default='', help="Food spawn and regrowth spec (see food_field.py)")
+    coordinator.add_argument('--generation-timeout', type=float, default=45)
+    coordinator.add_argument('--arenas', type=int, default=1, help="Episodes per genome (see Population)")
+    coordinator.add_argument('--arena-fitness', choices=('mean', 'min'), default='mean')
+    coordinator.add_argument('--backend', default='numpy', help="Step backend the workers use")
+    coordinator.add_argument('--interactions', help="Agent-agent interactions, e.g. separation,sense "
+                             "(default: AGENT_INTERACTIONS; see interactions.py)")
+    coordinator.add_argument('--precision', choices=('float64', 'float32'), default='float64',
+                             help="Brain weight dtype the workers simulate in (see precision.py)")
+    coordinator.add_argument('--genome-encoding', choices=('float32', 'int8'), default='float32',
+                             help="How leased genomes and the saved champion are stored; int8 quantizes "
+                             "them per tensor")
+    coordinator.add_argument('--local-workers', type=int, default=0, help="Workers to start on this machine")
+    coordinator.add_argument('--seed', type=int, default=0)
+    coordinator.add_argument('--save-champion', metavar='PATH', help="Save the best brain seen as a policy file")
+
+    worker = commands.add_parser('worker', help="Evaluate batches for a coordinator")
+    worker.add_argument('--coordinator', default='http://127.0.0.1:8765')
+    worker.add_argument('--retry-seconds', type=float, default=30,
+                        help="Give up after the coordinator is unreachable this long")
+
+    args = parser.parse_args(argv)
+    if args.command == 'coordinator':
+        try:
+            from food_field import parse_dynamics
+            from interactions import parse_interactions
+            args.food_dynamics = parse_dynamics(args.food_dynamics)
+            if args.interactions is not None:
+                args.interactions = parse_interactions(args.interactions)
+        except ValueError as e:
+            parser.error(str(e))
+        run_coordinator(args)
+    else:
+        run_worker(args.coordinator, args.retry_seconds)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,8 +7,9 @@ class Environment:
         self.border_color = (80, 80, 80)
         self.border_width = 2
     
-    def draw(self, screen):
-        # Draw border around the environment
+    def draw(self, screen, offset=(0, 0), scale=1.0):
+        # Draw border around the environment; offset is the world position at the
+        # screen's origin, scale the screen pixels per world unit
         pygame.draw.rect(screen, self.border_color, 
-                        (0, 0, self.width, self.height), 
+                        (-offset[0] * scale, -offset[1] * scale, self.width * scale, self.height * scale), 
                         self.border_width)
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+Export recorded generations to MP4, GIF or WebP.
+
+Frames are rendered off-screen from a replay log (see replay.py) through
+the same Agent.draw / Food.draw / NeuralNetworkVisualizer.draw path as the
+live simulation, in a process pool, and streamed to the encoder in order.
+
+    python export.py run.replay demo.mp4 --generations 1 50 900 --step 2
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+from multiprocessing import Pool
+
+BACKGROUND_COLOR = (30, 30, 30)
+INFO_WIDTH = 300
+
+# Per-process rendering state, set up once by init_worker
+worker_state = {}
+
+
+def init_worker(replay_path, scale):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    from environment import Environment
+    from neural_network_visualizer import NeuralNetworkVisualizer
+    from replay import ReplayReader, ReplayPlayer
+
+    pygame.font.init()
+    reader = ReplayReader(replay_path)
+    width = reader.metadata['width']
+    height = reader.metadata['height']
+
+    worker_state['pygame'] = pygame
+    worker_state['player'] = ReplayPlayer(reader, Environment(width, height))
+    worker_state['nn_visualizer'] = NeuralNetworkVisualizer(width + 20, 20, INFO_WIDTH - 40, 300)
+    worker_state['surface'] = pygame.Surface((width + INFO_WIDTH, height))
+    worker_state['size'] = frame_size(width, height, scale)
+
+
+def frame_size(width, height, scale):
+    """Output size, rounded down to even numbers for yuv420p encoders"""
+    out_width = int((width + INFO_WIDTH) * scale) // 2 * 2
+    out_height = int(height * scale) // 2 * 2
+    return out_width, out_height
+
+
+def render_frame(task):
+    """Render one (generation, tick) and return raw RGB bytes"""
+    generation, tick = task
+    pygame = worker_state['pygame']
+    player = worker_state['player']
+    nn_visualizer = worker_state['nn_visualizer']
+    surface = worker_state['surface']
+
+    player.seek(generation, tick)
+    surface.fill(BACKGROUND_COLOR)
+    player.environment.draw(surface)
+
+    player.foods.draw(surface)
+
+    for agent in player.population.agents:
+        if agent.alive:
+            agent.draw(surface)
+
+    best_agent = player.population.get_best_agent()
+    if best_agent:
+        nn_visualizer.update(best_agent.brain, best_agent.last_inputs, best_agent.last_outputs)
+        nn_visualizer.draw(surface)
+
+    output = surface
+    if output.get_size() != worker_state['size']:
+        output = pygame.transform.smoothscale(surface, worker_state['size'])
+    return pygame.image.tobytes(output, 'RGB')
+
+
+def render_frames(replay_path, tasks, scale, workers, window=64):
+    """Yield rendered frames in order, keeping at most `window` frames in flight"""
+    with Pool(workers, initializer=init_worker, initargs=(replay_path, scale)) as pool:
+        for start in range(0, len(tasks), window):
+            batch = tasks[start:start + window]
+            # Contiguous ticks per worker keep its decoded chunk cache warm
+            chunksize = max(1, len(batch) // (workers * 2))
+            for frame in pool.imap(render_frame, batch, chunksize=chunksize):
+                yield frame
+
+
+def encode_ffmpeg(frames, size, fps, output, ffmpeg):
+    command = [
+        ffmpeg, '-y', '-loglevel', 'error',
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{size[0]}x{size[1]}', '-r', str(fps),
+        '-i', '-',
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+        output
+    ]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    count = 0
+    try:
+        for frame in frames:
+            process.stdin.write(frame)
+            count += 1
+    finally:
+        process.stdin.close()
+        process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with status {process.returncode}")
+    return count
+
+
+def encode_pillow(frames, size, fps, output):
+    """Encode an animated GIF or WebP. Frames are handed to Pillow lazily;
+    note that Pillow's GIF writer still keeps the palettized frames it has
+    seen, while the WebP writer encodes them incrementally."""
+    from PIL import Image
+
+    count = 0
+
+    def images():
+        nonlocal count
+        for frame in frames:
+            count += 1
+            yield Image.frombytes('RGB', size, frame)
+
+    images = images()
+    first = next(images, None)
+    if first is None:
+        return 0
+    first.save(output, save_all=True, append_images=images,
+               duration=int(1000 / fps), loop=0)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export recorded generations to video")
+    parser.add_argument('replay', help="Replay log recorded with REPLAY_FILE")
+    parser.add_argument('output', help="Output file (.mp4, .gif or .webp)")
+    parser.add_argument('--generations', type=int, nargs='+', help="Generations to export (default: all)")
+    parser.add_argument('--step', type=int, default=1, help="Export every Nth tick")
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--scale', type=float, default=1.0, help="Output scale factor")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    from replay import ReplayReader
+
+    reader = ReplayReader(args.replay)
+    generations = args.generations or reader.generations
+    missing = [gen for gen in generations if gen not in reader.chunks]
+    if missing:
+        parser.error(f"Generations not in replay: {missing}")
+
+    tasks = [(gen, tick) for gen in generations for tick in range(0, reader.tick_count(gen), args.step)]
+    size = frame_size(reader.metadata['width'], reader.metadata['height'], args.scale)
+    reader.close()
+
+    extension = os.path.splitext(args.output)[1].lower()
+    frames = render_frames(args.replay, tasks, args.scale, args.workers)
+
+    if extension == '.mp4':
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            parser.error("MP4 export needs an ffmpeg binary on PATH; use .gif or .webp instead")
+        count = encode_ffmpeg(frames, size, args.fps, args.output, ffmpeg)
+    elif extension in ('.gif', '.webp'):
+        count = encode_pillow(frames, size, args.fps, args.output)
+    else:
+        parser.error(f"Unsupported output format: {extension}")
+
+    print(f"Wrote {count} frames ({size[0]}x{size[1]}) to {args.output}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,16 @@
 import pygame
 
 class Food:
+    # Appearance is shared by all food items
+    radius = 5
+    color = (200, 30, 30)
+    glow_color = (200, 50, 50, 100)
+    
+    __slots__ = ('position_x', 'position_y')
+    
     def __init__(self, x, y):
         self.position_x = x
         self.position_y = y
-        self.radius = 5
-        self.color = (200, 30, 30)
-        self.glow_color = (200, 50, 50, 100)
     
     def draw(self, screen):
         
@@ -0,0 +1,277 @@
+"""
+All food of a world as NumPy arrays, with configurable dynamics.
+
+FoodField holds count items per arena, arena-major like kernels.BatchState,
+in flat x/y arrays that the batched step kernels read and update in place.
+Eaten items are replaced from a pre-drawn pool of spawn positions, which is
+refilled in blocks rather than drawing a random position per meal. An item
+that has to wait before it regrows is parked far outside the world, where
+no agent can see or reach it. Dynamics are set with a comma-separated spec
+(FOOD_DYNAMICS env var in app.py / main.py, --food-dynamics in sweep.py):
+
+    patchy           spawn in clusters (patches=5 of them, patch_spread=40 px)
+    regrow=3         eaten food reappears after 3 seconds instead of at once
+    depletion=0.2    each meal makes its patch 20% less likely to be picked
+    recovery=0.05    share of the lost patch richness regained per second
+    drift=20         food wanders at 20 px/s, bouncing off the walls
+
+e.g. FOOD_DYNAMICS=patchy,regrow=2,depletion=0.3. Without a spec food
+respawns at once, uniformly at random, as it always has.
+"""
+import numpy as np
+from food import Food
+from spatial import UniformGrid
+
+MARGIN = 30  # Food keeps this far from the walls
+PARKED = -1e9  # Position of food waiting to regrow: out of every agent's reach
+CULL_CELL = 128  # World units per cell of the grid in_rect() uses
+
+# Spec names -> (FoodField argument, type)
+DYNAMICS = {
+    'patchy': ('distribution', str),
+    'patches': ('patches', int),
+    'patch_spread': ('patch_spread', float),
+    'regrow': ('regrow_time', float),
+    'depletion': ('depletion', float),
+    'recovery': ('recovery', float),
+    'drift': ('drift_speed', float)
+}
+
+
+def parse_dynamics(spec):
+    """'patchy,regrow=3' -> {'distribution': 'patchy', 'regrow_time': 3.0}"""
+    options = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, value = item.partition('=')
+        if name not in DYNAMICS:
+            raise ValueError(f"Unknown food dynamics {name!r}; choose from {', '.join(DYNAMICS)}")
+        argument, kind = DYNAMICS[name]
+        if name == 'patchy':
+            options[argument] = 'patchy'
+        elif not value:
+            raise ValueError(f"Food dynamics {name!r} needs a value, e.g. {name}=1")
+        else:
+            options[argument] = kind(value)
+    return options
+
+
+class FoodField:
+    """count food items in each of arenas arenas. Arena 0 (the first count
+    entries) is the one drawn; len(), indexing and iteration cover it."""
+    def __init__(self, count, width, height, arenas=1, distribution='uniform', patches=5, patch_spread=40.0,
+                 regrow_time=0.0, depletion=0.0, recovery=0.05, drift_speed=0.0, pool_block=1024):
+        if distribution not in ('uniform', 'patchy'):
+            raise ValueError(f"Unknown food distribution {distribution!r}, expected 'uniform' or 'patchy'")
+        self.count = count
+        self.width = width
+        self.height = height
+        self.arenas = arenas
+        self.distribution = distribution
+        self.patch_spread = patch_spread
+        self.regrow_time = regrow_time
+        self.depletion = depletion
+        self.recovery = recovery
+        self.drift_speed = drift_speed
+        self.pool_block = pool_block
+
+        total = count * arenas
+        self.x = np.zeros(total)
+        self.y = np.zeros(total)
+        self.timer = np.zeros(total)  # Seconds until a parked item regrows
+        self.patch = np.zeros(total, dtype=np.int64)  # Patch each item spawned in
+        self.vx = np.zeros(total)
+        self.vy = np.zeros(total)
+
+        # Patch centres and how likely each is to be picked (shared by all arenas)
+        self.patch_count = patches if distribution == 'patchy' else 1
+        self.patch_x = np.zeros(self.patch_count)
+        self.patch_y = np.zeros(self.patch_count)
+        self.richness = np.ones(self.patch_count)
+
+        # Pre-drawn spawns: x, y, patch, heading; cursor is the next unused one
+        self.pool = (np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64), np.zeros(0))
+        self.cursor = 0
+        self.respawn_size = 1  # Length of the last respawn_pool() slice
+
+        # Bumped whenever positions change, so in_rect() can reuse its grid
+        self.version = 0
+        self.grid = None
+        self.grid_version = -1
+        self.reset()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        """Snapshot of arena 0's item index as a Food"""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return Food(self.x[index], self.y[index])
+
+    def __iter__(self):
+        return iter(self.items())
+
+    @property
+    def nbytes(self):
+        arrays = (self.x, self.y, self.timer, self.patch, self.vx, self.vy) + self.pool
+        return sum(array.nbytes for array in arrays)
+
+    def reset(self):
+        """New patches and a fresh layout, for a new generation"""
+        if self.distribution == 'patchy':
+            self.patch_x = np.random.uniform(MARGIN, self.width - MARGIN, self.patch_count)
+            self.patch_y = np.random.uniform(MARGIN, self.height - MARGIN, self.patch_count)
+        self.richness[:] = 1.0
+        self.pool = tuple(array[:0] for array in self.pool)  # Drawn for the old patches
+        self.cursor = 0
+        self.timer[:] = 0
+        self.spawn(np.arange(len(self.x)))
+
+    def items(self):
+        """Arena 0's food that is out (not waiting to regrow), as Food snapshots"""
+        return [Food(x, y) for x, y in zip(self.x[:self.count].tolist(), self.y[:self.count].tolist())
+                if x != PARKED]
+
+    def positions(self):
+        """(count, 2) positions of arena 0, parked items included"""
+        return np.column_stack((self.x[:self.count], self.y[:self.count]))
+
+    def set_positions(self, positions):
+        """Overwrite arena 0's positions (from a replay frame)"""
+        self.x[:self.count] = positions[:, 0]
+        self.y[:self.count] = positions[:, 1]
+        self.version += 1
+
+    def in_rect(self, left, top, right, bottom):
+        """Indices of arena 0's food inside a rectangle, looked up in a grid
+        that is only rebuilt after the food has changed"""
+        x = self.x[:self.count]
+        y = self.y[:self.count]
+        if self.grid_version != self.version:
+            self.grid = UniformGrid(x, y, CULL_CELL, self.width, self.height)
+            self.grid_version = self.version
+        candidates = self.grid.in_rect(left, top, right, bottom)
+        inside = ((x[candidates] >= left) & (x[candidates] <= right) &
+                  (y[candidates] >= top) & (y[candidates] <= bottom))
+        return np.sort(candidates[inside])
+
+    def draw_pool(self, size):
+        """size spawns: a patch by richness, then a position in it"""
+        if self.distribution == 'patchy':
+            patch = np.random.choice(self.patch_count, size, p=self.richness / self.richness.sum())
+            x = self.patch_x[patch] + np.random.normal(0, self.patch_spread, size)
+            y = self.patch_y[patch] + np.random.normal(0, self.patch_spread, size)
+            x = np.clip(x, MARGIN, self.width - MARGIN).round()
+            y = np.clip(y, MARGIN, self.height - MARGIN).round()
+        else:
+            patch = np.zeros(size, dtype=np.int64)
+            x = np.random.randint(MARGIN, self.width - MARGIN + 1, size).astype(np.float64)
+            y = np.random.randint(MARGIN, self.height - MARGIN + 1, size).astype(np.float64)
+        heading = np.random.uniform(0, 2 * np.pi, size)
+        return x, y, patch, heading
+
+    def reserve(self, size):
+        """Make sure size unused spawns are in the pool, drawing a new block if not"""
+        if len(self.pool[0]) - self.cursor >= size:
+            return
+        fresh = self.draw_pool(max(self.pool_block, size))
+        self.pool = tuple(np.concatenate((old[self.cursor:], new)) for old, new in zip(self.pool, fresh))
+        self.cursor = 0
+
+    def take(self, size):
+        """The next size spawns, marking them used"""
+        self.reserve(size)
+        spawns = tuple(array[self.cursor:self.cursor + size] for array in self.pool)
+        self.cursor += size
+        return spawns
+
+    def spawn(self, indices):
+        """Put items out at the next spawn positions"""
+        x, y, patch, heading = self.take(len(indices))
+        self.x[indices] = x
+        self.y[indices] = y
+        self.patch[indices] = patch
+        self.vx[indices] = np.cos(heading) * self.drift_speed
+        self.vy[indices] = np.sin(heading) * self.drift_speed
+        self.version += 1
+
+    def respawn_pool(self, size):
+        """Positions the step kernels move the next eaten items to, in meal
+        order (the kernels wrap around after size meals). Items that have to
+        regrow are parked instead."""
+        self.respawn_size = max(size, 1)
+        if self.regrow_time > 0:
+            return np.full(size, PARKED), np.full(size, PARKED)
+        self.reserve(size)
+        return self.pool[0][self.cursor:self.cursor + size], self.pool[1][self.cursor:self.cursor + size]
+
+    def consume(self, eaten):
+        """Book-keeping after the kernels moved the eaten items (an index array
+        in meal order) to the respawn pool positions"""
+        if len(eaten) == 0:
+            return
+        self.version += 1
+        if self.depletion > 0:
+            np.multiply.at(self.richness, self.patch[eaten], 1 - self.depletion)
+            np.maximum(self.richness, 1e-6, out=self.richness)
+        if self.regrow_time > 0:
+            self.timer[eaten] = self.regrow_time
+            return
+
+        # Respawned items take on the patch and heading of the spawn they used
+        pool_index = self.cursor + np.arange(len(eaten)) % self.respawn_size
+        self.patch[eaten] = self.pool[2][pool_index]
+        self.vx[eaten] = np.cos(self.pool[3][pool_index]) * self.drift_speed
+        self.vy[eaten] = np.sin(self.pool[3][pool_index]) * self.drift_speed
+        self.cursor += min(len(eaten), self.respawn_size)
+
+    def update(self, dt):
+        """Regrow, recover and move food; once per step, before the agents act"""
+        if self.regrow_time > 0:
+            waiting = np.flatnonzero(self.timer > 0)
+            if len(waiting):
+                self.timer[waiting] -= dt
+                self.spawn(waiting[self.timer[waiting] <= 0])
+
+        if self.depletion > 0 and self.recovery > 0:
+            self.richness += (1 - self.richness) * min(1.0, self.recovery * dt)
+
+        if self.drift_speed > 0:
+            self.version += 1
+            out = self.x != PARKED
+            self.x[out] += self.vx[out] * dt
+            self.y[out] += self.vy[out] * dt
+            for position, velocity, limit in ((self.x, self.vx, self.width), (self.y, self.vy, self.height)):
+                low = out & (position < MARGIN)
+                high = out & (position > limit - MARGIN)
+                position[low] = 2 * MARGIN - position[low]
+                position[high] = 2 * (limit - MARGIN) - position[high]
+                velocity[low | high] *= -1
+
+    def draw(self, surface, visible=None, offset=(0, 0), scale=1.0):
+        """Draw arena 0's food that is out, in one blits() call; visible
+        optionally limits it to those indices, offset is the world position
+        drawn at the surface's origin and scale the pixels per world unit"""
+        sprite = food_sprite(max(1, round(Food.radius * scale)))
+        half = sprite.get_width() // 2
+        indices = np.arange(self.count) if visible is None else visible
+        indices = indices[self.x[indices] != PARKED]
+        x = ((self.x[indices] - offset[0]) * scale - half).astype(np.int64).tolist()
+        y = ((self.y[indices] - offset[1]) * scale - half).astype(np.int64).tolist()
+        surface.blits([(sprite, position) for position in zip(x, y)], doreturn=False)
+
+
+_sprites = {}
+
+
+def food_sprite(radius=Food.radius):
+    """Glow and body of one food item drawn at radius pixels, rendered once
+    per radius and reused for every blit"""
+    if radius not in _sprites:
+        import pygame
+        size = radius * 4
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, Food.glow_color, (size // 2, size // 2), radius * 2)
+        pygame.draw.circle(sprite, Food.color, (size // 2, size // 2), radius)
+        _sprites[radius] = sprite
+    return _sprites[radius]
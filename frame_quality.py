@@ -0,0 +1,132 @@
+import io
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+# Quality tiers, best first: (name, width, JPEG quality). Every client on a
+# tier gets the same bytes, so each frame is encoded at most once per tier.
+TIERS = [
+    ('full', 900, 85),
+    ('high', 720, 75),
+    ('medium', 540, 65),
+    ('low', 360, 50),
+    ('minimal', 240, 35)
+]
+
+class TierEncoder:
+    """Scales and JPEG-encodes frames per quality tier, caching the result for the current frame"""
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.lock = threading.Lock()
+        self.version = None
+        self.encoded = {}  # tier index -> bytes, for self.version only
+        self.tier_locks = [threading.Lock() for _ in TIERS]
+
+        # Size of the last encode per tier; a first guess until one has been made
+        self.sizes = [tier_width * tier_width * height // width // 8 for _, tier_width, _ in TIERS]
+
+    def expected_size(self, tier):
+        return self.sizes[tier]
+
+    def encode(self, version, pixels, tier):
+        """JPEG bytes for the frame with this version at this tier; pixels is raw RGB"""
+        with self.tier_locks[tier]:
+            with self.lock:
+                if version != self.version:
+                    self.version = version
+                    self.encoded = {}
+                data = self.encoded.get(tier)
+            if data is not None:
+                return data
+
+            _, tier_width, quality = TIERS[tier]
+            image = Image.frombuffer('RGB', (self.width, self.height), pixels, 'raw', 'RGB', 0, 1)
+            if tier_width < self.width:
+                image = image.resize((tier_width, round(self.height * tier_width / self.width)),
+                                     Image.BILINEAR)
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=quality)
+            data = buffer.getvalue()
+
+            with self.lock:
+                self.sizes[tier] = len(data)
+                if version == self.version:
+                    self.encoded[tier] = data
+            return data
+
+class ClientQuality:
+    """One viewer's limits (display width, frame rate, bytes per second) and
+    its throughput, from the fetch times the viewer reports (the server only
+    sees its socket buffer fill, not the bytes arrive)"""
+    def __init__(self, width=None, max_fps=10, byte_budget=None):
+        self.width = width
+        self.max_fps = max_fps
+        self.byte_budget = byte_budget
+        self.throughput = None  # bytes per second, smoothed
+        self.tier = None
+
+    def update_limits(self, width, max_fps, byte_budget):
+        self.width = width
+        self.max_fps = max_fps
+        self.byte_budget = byte_budget
+
+    def record_send(self, size, seconds):
+        """Fold one frame fetch the client measured into the throughput estimate"""
+        if seconds <= 0:
+            return
+        sample = size / seconds
+        if self.throughput is None:
+            self.throughput = sample
+        else:
+            self.throughput = 0.8 * self.throughput + 0.2 * sample
+
+    def choose(self, encoder):
+        """Pick (tier, frame interval in seconds): the best tier that fits the
+        width and fits the byte rate at max_fps, else the smallest tier at a
+        lower frame rate"""
+        # Largest tier no wider than the display, or the smallest one
+        first = len(TIERS) - 1
+        for tier, (_, tier_width, _) in enumerate(TIERS):
+            if self.width is None or tier_width <= self.width:
+                first = tier
+                break
+
+        rates = [rate for rate in (self.byte_budget, self.throughput) if rate]
+        available = min(rates) if rates else None
+
+        if available is None:
+            self.tier = first
+            return first, 1.0 / self.max_fps
+
+        for tier in range(first, len(TIERS)):
+            needed = encoder.expected_size(tier) * self.max_fps
+            # Only step up when there is clear headroom, so the tier doesn't flap
+            if self.tier is not None and tier < self.tier:
+                needed *= 1.25
+            if needed <= available:
+                self.tier = tier
+                return tier, 1.0 / self.max_fps
+
+        # Even the smallest tier is too big at max_fps: skip frames instead
+        self.tier = len(TIERS) - 1
+        return self.tier, encoder.expected_size(self.tier) / available
+
+class ClientRegistry:
+    """ClientQuality per client id; the least recently seen are dropped past max_clients"""
+    def __init__(self, max_clients=1000):
+        self.max_clients = max_clients
+        self.clients = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, client_id):
+        with self.lock:
+            client = self.clients.get(client_id)
+            if client is None:
+                client = ClientQuality()
+                self.clients[client_id] = client
+                if len(self.clients) > self.max_clients:
+                    self.clients.popitem(last=False)
+            else:
+                self.clients.move_to_end(client_id)
+            return client
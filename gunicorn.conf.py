@@ -0,0 +1,28 @@
+import os
+
+# Gunicorn settings for app.py (gunicorn -c gunicorn.conf.py app:app)
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Importing app.py is cheap and starts no threads, so it can be preloaded
+# in the master and shared copy-on-write by the workers
+preload_app = True
+
+def on_starting(server):
+    # SHARED_SIMULATION=1: fork the one simulation process before the master
+    # installs its signal handlers and before any worker forks, so every
+    # worker inherits the shared buffer and control pipe
+    from app import SHARED_SIMULATION, start_shared_simulation
+    if SHARED_SIMULATION:
+        start_shared_simulation()
+
+def on_exit(server):
+    from app import stop_shared_simulation
+    stop_shared_simulation()
+
+def post_fork(server, worker):
+    # Threads don't survive fork: start each worker's simulation after it
+    # (in shared mode the worker only reads the inherited buffer)
+    from app import ensure_simulation_started
+    ensure_simulation_started()
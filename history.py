@@ -0,0 +1,283 @@
+"""
+Per-generation metrics history with downsampled range queries.
+
+MetricsHistory keeps one row of METRICS per finished generation, stored by
+column. The latest capacity rows are held in memory as a ring buffer; with
+a directory every row is also appended to one raw float64 file per metric,
+so a long run keeps its whole history on disk while memory stays bounded,
+and other processes (the gunicorn workers in shared mode) can read it.
+Rows are numbered from 0 in the order they were recorded, across resets.
+
+series() returns a range of rows with each metric downsampled to at most
+points samples by Largest-Triangle-Three-Buckets (lttb()), which keeps the
+peaks and dips that plain striding would skip, so a chart of a million
+generations only transfers and draws a few hundred points. Long ranges of
+an on-disk history are downsampled from summary levels instead of every
+row: level i keeps the lowest and highest row of each metric in every block
+of LEVEL_BLOCK * LEVEL_FACTOR**i rows, built incrementally as rows arrive,
+so a query's cost depends on points rather than on the length of the run.
+"""
+import os
+import threading
+import time
+import numpy as np
+
+METRICS = ('generation', 'tick', 'best_fitness', 'mean_fitness', 'median_fitness', 'alive_count',
+           'alive_mean', 'food_eaten', 'ticks', 'ticks_per_sec', 'step_ms')
+ROW_BYTES = 8  # Per metric file
+LEVEL_BLOCK = 64  # Rows per block of the finest summary level
+LEVEL_FACTOR = 4  # Blocks of one level per block of the next
+LEVEL_READ_ROWS = LEVEL_BLOCK * 4096  # Rows read at once while building the finest level
+
+
+def lttb(x, y, points):
+    """(series, points) indices of the samples Largest-Triangle-Three-Buckets
+    keeps of each row of y over x (shared, or one row per series); the first
+    and last samples always stay"""
+    y = np.atleast_2d(y)
+    x = np.broadcast_to(x, y.shape)
+    count = y.shape[1]
+    if count <= points:
+        return np.tile(np.arange(count), (len(y), 1))
+    if points < 3:
+        return np.tile(np.linspace(0, count - 1, points).round().astype(np.int64), (len(y), 1))
+
+    # points - 2 buckets between the first and last sample; each picks the
+    # sample forming the largest triangle with the previous pick and the
+    # average of the next bucket (the last sample after the last bucket)
+    edges = (np.arange(points - 1) * ((count - 2) / (points - 2))).astype(np.int64) + 1
+    edges[-1] = count - 1
+    sizes = np.diff(edges)
+    sum_x = np.concatenate((np.zeros((len(y), 1)), np.cumsum(x, axis=1)), axis=1)
+    sum_y = np.concatenate((np.zeros((len(y), 1)), np.cumsum(y, axis=1)), axis=1)
+    next_x = np.concatenate((((sum_x[:, edges[1:]] - sum_x[:, edges[:-1]]) / sizes)[:, 1:], x[:, -1:]), axis=1)
+    next_y = np.concatenate((((sum_y[:, edges[1:]] - sum_y[:, edges[:-1]]) / sizes)[:, 1:], y[:, -1:]), axis=1)
+
+    chosen = np.empty((len(y), points), dtype=np.int64)
+    chosen[:, 0] = 0
+    chosen[:, -1] = count - 1
+    rows = np.arange(len(y))
+    previous = np.zeros(len(y), dtype=np.int64)
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        previous_x = x[rows, previous][:, None]
+        previous_y = y[rows, previous][:, None]
+        area = np.abs((previous_x - next_x[:, bucket:bucket + 1]) * (y[:, start:end] - previous_y) -
+                      (previous_x - x[:, start:end]) * (next_y[:, bucket:bucket + 1] - previous_y))
+        previous = start + np.argmax(area, axis=1)
+        chosen[:, bucket + 1] = previous
+    return chosen
+
+
+def block_extremes(rows, values, size):
+    """Rows and values of the lowest and highest value of each metric in
+    every run of size columns, two per block in row order"""
+    rows = rows.reshape(len(rows), -1, size)
+    values = values.reshape(len(values), -1, size)
+    low = values.argmin(axis=2)
+    high = values.argmax(axis=2)
+    high[low == high] = size - 1  # A flat block: keep both of its ends
+    pick = np.sort(np.stack((low, high), axis=2), axis=2)
+    return (np.take_along_axis(rows, pick, axis=2).reshape(len(rows), -1),
+            np.take_along_axis(values, pick, axis=2).reshape(len(values), -1))
+
+
+class MetricsHistory:
+    """Generation metrics of one simulation. A Simulation with a history calls
+    start_generation(), record_tick() every step and end_generation() before
+    evolving. One thread writes; others may call series() meanwhile, since a
+    row is only counted once it is fully stored. readonly=True opens another
+    process's directory to query it."""
+    def __init__(self, capacity=4096, directory=None, readonly=False):
+        self.capacity = capacity
+        self.directory = directory
+        self.readonly = readonly
+        self.ring = np.zeros((len(METRICS), 0 if readonly else capacity))
+        self.count = 0
+        self.files = None
+        # Summary level i: [rows summarised, (metrics, 2 * blocks) rows, values]
+        self.levels = []
+        self.levels_lock = threading.Lock()
+        if directory is not None:
+            self.open()
+        self.start_generation()
+
+    @property
+    def nbytes(self):
+        return self.ring.nbytes + sum(rows.nbytes + values.nbytes for _, rows, values in self.levels)
+
+    def path(self, name):
+        return os.path.join(self.directory, f"{name}.f64")
+
+    def rows_on_disk(self):
+        """Rows every metric file holds in full"""
+        sizes = [os.path.getsize(self.path(name)) if os.path.exists(self.path(name)) else 0 for name in METRICS]
+        return min(sizes) // ROW_BYTES
+
+    def open(self):
+        """Continue the history in directory: drop a partly written last row and
+        load the latest rows into the ring"""
+        if self.readonly:
+            self.count = self.rows_on_disk()
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.count = self.rows_on_disk()
+        self.files = []
+        for name in METRICS:
+            handle = open(self.path(name), 'ab')
+            handle.truncate(self.count * ROW_BYTES)
+            self.files.append(handle)
+        start = max(0, self.count - self.capacity)
+        if self.count > start:
+            self.ring[:, np.arange(start, self.count) % self.capacity] = self.read_disk(start, self.count)
+
+    def close(self):
+        for handle in self.files or ():
+            handle.close()
+        self.files = None
+
+    def start_generation(self):
+        self.generation_start = time.perf_counter()
+        self.ticks = 0
+        self.alive_total = 0
+        self.step_seconds = 0.0
+
+    def record_tick(self, alive_count, step_seconds):
+        self.ticks += 1
+        self.alive_total += alive_count
+        self.step_seconds += step_seconds
+
+    def end_generation(self, simulation):
+        """Append the row of the generation that just ended"""
+        population = simulation.population
+        fitnesses = np.asarray(population.get_fitnesses(), dtype=np.float64)
+        if len(fitnesses) == 0:
+            fitnesses = np.zeros(1)
+        ticks = max(self.ticks, 1)
+        wall_time = time.perf_counter() - self.generation_start
+        self.append({
+            'generation': simulation.generation,
+            'tick': simulation.tick,
+            'best_fitness': fitnesses.max(),
+            'mean_fitness': fitnesses.mean(),
+            'median_fitness': np.median(fitnesses),
+            'alive_count': population.alive_count,
+            'alive_mean': self.alive_total / ticks,
+            'food_eaten': population.food_eaten,
+            'ticks': self.ticks,
+            'ticks_per_sec': self.ticks / wall_time if wall_time > 0 else 0.0,
+            'step_ms': self.step_seconds / ticks * 1000
+        })
+        self.start_generation()
+
+    def append(self, row):
+        """Store a row (a dict of METRICS values); it counts once stored everywhere"""
+        values = np.array([row[name] for name in METRICS], dtype=np.float64)
+        self.ring[:, self.count % self.capacity] = values
+        for handle, value in zip(self.files or (), values):
+            handle.write(value.astype('<f8').tobytes())
+            handle.flush()
+        self.count += 1
+
+    def read_disk(self, start, end, names=METRICS):
+        return np.array([np.fromfile(self.path(name), dtype='<f8', count=end - start, offset=start * ROW_BYTES)
+                         for name in names]).reshape(len(names), end - start)
+
+    def rows(self, start, end, names=METRICS):
+        """(len(names), end - start) values of rows start..end-1, from memory
+        when the ring still holds them"""
+        if start >= self.count - min(self.count, self.capacity) and not self.readonly:
+            columns = [METRICS.index(name) for name in names]
+            return self.ring[np.ix_(columns, np.arange(start, end) % self.capacity)]
+        if self.directory is None:
+            raise ValueError(f"Rows before {self.count - self.capacity} are no longer kept")
+        return self.read_disk(start, end, names)
+
+    def level(self, index):
+        """Summary level index, brought up to date with the complete blocks
+        recorded so far"""
+        while len(self.levels) <= index:
+            self.levels.append([0, np.zeros((len(METRICS), 0), dtype=np.int64), np.zeros((len(METRICS), 0))])
+        built, rows, values = self.levels[index]
+        block = LEVEL_BLOCK * LEVEL_FACTOR ** index
+        complete = self.count // block * block
+        if complete <= built:
+            return self.levels[index]
+
+        if index == 0:
+            parts = []
+            for first in range(built, complete, LEVEL_READ_ROWS):
+                last = min(first + LEVEL_READ_ROWS, complete)
+                new_values = self.rows(first, last)
+                new_rows = np.broadcast_to(np.arange(first, last), new_values.shape)
+                parts.append(block_extremes(new_rows, new_values, block))
+        else:
+            # Each block of this level is LEVEL_FACTOR blocks of the finer one
+            _, finer_rows, finer_values = self.level(index - 1)
+            first = 2 * built // (block // LEVEL_FACTOR)
+            last = 2 * complete // (block // LEVEL_FACTOR)
+            parts = [block_extremes(finer_rows[:, first:last], finer_values[:, first:last], 2 * LEVEL_FACTOR)]
+        self.levels[index] = [complete, np.concatenate([rows] + [part[0] for part in parts], axis=1),
+                              np.concatenate([values] + [part[1] for part in parts], axis=1)]
+        return self.levels[index]
+
+    def candidates(self, start, end, index):
+        """(metrics, n) rows and values standing in for rows start..end-1: the
+        extremes of the level index blocks inside the range, and finer levels
+        (down to every row) for the partial blocks at either end"""
+        if index < 0:
+            values = self.rows(start, end)
+            return np.broadcast_to(np.arange(start, end), values.shape), values
+        block = LEVEL_BLOCK * LEVEL_FACTOR ** index
+        first = -(-start // block) * block
+        last = end // block * block
+        if last <= first:
+            return self.candidates(start, end, index - 1)
+
+        _, rows, values = self.level(index)
+        head = self.candidates(start, first, index - 1)
+        tail = self.candidates(last, end, index - 1)
+        middle = slice(2 * first // block, 2 * last // block)
+        return (np.concatenate((head[0], rows[:, middle], tail[0]), axis=1),
+                np.concatenate((head[1], values[:, middle], tail[1]), axis=1))
+
+    def series(self, start=0, end=None, points=500, names=None):
+        """Rows start..end-1 (default all) with each metric downsampled to at
+        most points samples: {'from', 'to', 'rows', 'series': {name: [[row, value], ...]}}"""
+        if self.readonly:
+            self.count = self.rows_on_disk()
+        names = tuple(names or METRICS)
+        for name in names:
+            if name not in METRICS:
+                raise ValueError(f"Unknown metric {name!r}; choose from {', '.join(METRICS)}")
+        # The ring's rows are all that is left without a directory
+        first = 0 if self.directory is not None else max(0, self.count - self.capacity)
+        start = min(max(start, first), self.count)
+        end = self.count if end is None else min(max(end, start), self.count)
+
+        points = max(points, 0)
+        # Coarsest summary level with at least points blocks in the range
+        level = -1
+        if self.directory is not None and points >= 3:
+            while (end - start) // (LEVEL_BLOCK * LEVEL_FACTOR ** (level + 1)) >= points:
+                level += 1
+
+        if level < 0:
+            values = self.rows(start, end, names)
+            rows = np.broadcast_to(np.arange(start, end), values.shape)
+        else:
+            # The first and last rows always stay, so keep them out of the blocks
+            with self.levels_lock:
+                rows, values = self.candidates(start + 1, end - 1, level)
+            columns = [METRICS.index(name) for name in names]
+            ends = self.rows(start, start + 1, names), self.rows(end - 1, end, names)
+            rows = np.concatenate((np.full((len(names), 1), start), rows[columns], np.full((len(names), 1), end - 1)),
+                                  axis=1)
+            values = np.concatenate((ends[0], values[columns], ends[1]), axis=1)
+
+        chosen = lttb(rows.astype(np.float64), values, points)
+        series = {}
+        for i, name in enumerate(names):
+            picked = chosen[i]
+            series[name] = [list(pair) for pair in zip(rows[i, picked].tolist(), values[i, picked].tolist())]
+        return {'from': start, 'to': end, 'rows': self.count, 'series': series}
@@ -0,0 +1,90 @@
+"""
+Agent-agent interactions: separation and sensing the nearest other agent.
+
+By default agents are blind to each other and overlap freely. Two optional
+interactions (AGENT_INTERACTIONS env var, --interactions in sweep.py) change
+that:
+
+    separation   overlapping agents are pushed apart, so crowds spread out
+                 and agents can block each other's way to food
+    sense        two extra brain inputs: distance and bearing of the nearest
+                 other living agent within the vision radius (any direction)
+
+e.g. AGENT_INTERACTIONS=separation,sense. Both are answered from one
+spatial.UniformGrid over the living agents, built once per tick (O(n)), with
+each agent only measuring the agents in the cells around it; agents in
+different arenas never interact.
+"""
+import math
+import numpy as np
+from spatial import UniformGrid, nearest_per_query
+
+INTERACTIONS = ('separation', 'sense')
+SENSE_INPUTS = 2  # Brain inputs added by 'sense'
+
+
+def parse_interactions(spec):
+    """'separation,sense' -> {'separation', 'sense'}; a collection of names
+    is checked and passed through"""
+    parts = spec.split(',') if isinstance(spec, str) else (spec or ())
+    interactions = set(filter(None, (part.strip() for part in parts)))
+    for name in interactions:
+        if name not in INTERACTIONS:
+            raise ValueError(f"Unknown agent interaction {name!r}; choose from {', '.join(INTERACTIONS)}")
+    return interactions
+
+
+def interact(x, y, direction, alive, arena, arenas, radius, vision_radius, width, height,
+             separation=False, sense=None):
+    """Apply one tick of interactions to the entries' positions (in place).
+    With sense, an (entries, 2) array, its rows of living agents get the
+    normalized distance (1 when nobody is in range) and bearing relative to
+    the heading, in [-1, 1], of the nearest other agent."""
+    live = np.flatnonzero(alive)
+    if sense is not None:
+        sense[:, 0] = 1.0
+        sense[:, 1] = 0.0
+    if len(live) < 2:
+        return
+
+    # One grid for both queries, its cells as large as the furthest reach
+    reach = vision_radius if sense is not None else 2 * radius
+    live_x = x[live]
+    live_y = y[live]
+    group = arena[live]
+    grid = UniformGrid(live_x, live_y, reach, width, height, group=group, groups=arenas)
+    query, other = grid.neighbours(live_x, live_y, reach, group=group)
+    distinct = query != other
+    query, other = query[distinct], other[distinct]
+
+    if separation:
+        dx = live_x[query] - live_x[other]
+        dy = live_y[query] - live_y[other]
+        distance = np.sqrt(dx*dx + dy*dy)
+        touching = np.flatnonzero(distance < 2 * radius)
+        if len(touching):
+            dx, dy, distance = dx[touching], dy[touching], distance[touching]
+            # Agents on the same spot separate along x, the lower index to the left
+            same = distance == 0
+            dx = np.where(same, np.where(query[touching] < other[touching], -1.0, 1.0), dx)
+            distance = np.where(same, 1.0, distance)
+            # Both agents of a pair see each other, so each moves half the overlap
+            push = (2 * radius - np.where(same, 0.0, distance)) / 2 / distance
+            live_x = live_x + np.bincount(query[touching], dx * push, minlength=len(live))
+            live_y = live_y + np.bincount(query[touching], dy * push, minlength=len(live))
+            np.clip(live_x, radius, width - radius, out=live_x)
+            np.clip(live_y, radius, height - radius, out=live_y)
+            x[live] = live_x
+            y[live] = live_y
+
+    if sense is not None:
+        dx = live_x[other] - live_x[query]
+        dy = live_y[other] - live_y[query]
+        distance = np.sqrt(dx*dx + dy*dy)
+        near = np.flatnonzero(distance <= vision_radius)
+        query, other, dx, dy, distance = query[near], other[near], dx[near], dy[near], distance[near]
+        nearest = nearest_per_query(query, other, distance)
+        rows = live[query[nearest]]
+        bearing = (np.arctan2(dy[nearest], dx[nearest]) - direction[rows] + math.pi) % (2 * math.pi) - math.pi
+        sense[rows, 0] = distance[nearest] / vision_radius
+        sense[rows, 1] = bearing / math.pi
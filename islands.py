@@ -0,0 +1,215 @@
+"""
+Island-model evolution: several populations evolving in parallel processes.
+
+Each island is a headless Simulation with its own arena, running in its own
+worker process. Every --interval generations the islands pause, send their
+--migrants best genomes to the coordinator as raw float32 arrays over a
+pipe (or int8 with per-tensor scales, --genome-encoding int8; see
+precision.py), and receive migrants from other islands, which replace the last
+non-elite children of the island's new generation (children are unranked, so
+these are arbitrary ones, never the elites). Migrants move along a ring
+(island i sends to i + 1) or to a random other island. The coordinator prints the global best fitness after
+each exchange and can save the best brain seen (see policy.py).
+
+    python islands.py --islands 4 --population-size 50 --interval 5 --epochs 10
+    python islands.py --islands 8 --topology random --migrants 3 --save-champion best.npz
+    python islands.py --migrants 20 --genome-encoding int8
+    python islands.py --arenas 3 --precision float32 --interactions separation,sense
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from multiprocessing import Pipe, Process
+
+WIDTH = 900
+HEIGHT = 600
+DT = 1.0 / 60.0
+
+TOPOLOGIES = ('ring', 'random')
+
+
+def run_island(index, conn, options):
+    """Worker process body: evolve, and trade migrants with the coordinator
+    after every interval generations until told to stop"""
+    import numpy as np
+    from food_field import parse_dynamics
+    from precision import decode, encode
+    from simulation import Simulation
+    from termination import Termination, parse_policies
+
+    random.seed(options['seed'] * 1000 + index)
+    np.random.seed(options['seed'] * 1000 + index)
+
+    simulation = Simulation(WIDTH, HEIGHT, options['population_size'], options['food_count'],
+                            options['generation_timeout'],
+                            population_options={'backend': options['backend'], 'sync_agents': False,
+                                                'arenas': options['arenas'], 'precision': options['precision'],
+                                                'interactions': options['interactions']},
+                            termination=Termination(parse_policies(options['termination'])),
+                            food_options=parse_dynamics(options['food_dynamics']))
+
+    # Best genome this island has seen, sent along with each report
+    state = {'generations': 0, 'bests': [], 'emigrants': None, 'best': (float('-inf'), None)}
+
+    def generation_end(simulation):
+        # Runs before evolve(), while the ending generation's fitness is known
+        fitnesses = simulation.population.get_fitnesses()
+        state['generations'] += 1
+        state['bests'].append(max(fitnesses))
+        if max(fitnesses) > state['best'][0]:
+            best = int(np.argmax(fitnesses))
+            state['best'] = (fitnesses[best], simulation.population.get_genomes([best])[0])
+        if state['generations'] % options['interval'] == 0:
+            ranking = np.argsort(fitnesses, kind='stable')[::-1][:options['migrants']]
+            state['emigrants'] = ([fitnesses[i] for i in ranking], simulation.population.get_genomes(ranking))
+
+    simulation.on_generation_end = generation_end
+    started = time.perf_counter()
+    while True:
+        simulation.step(DT)
+        if state['emigrants'] is None:
+            continue
+
+        fitnesses, genomes = state['emigrants']
+        state['emigrants'] = None
+        layer_sizes = simulation.population.agents[0].brain.layer_sizes
+        conn.send((index, state['bests'], simulation.tick, time.perf_counter() - started, state['best'][0],
+                   genomes.shape, layer_sizes))
+        conn.send_bytes(encode(genomes, layer_sizes, options['genome_encoding']))
+        conn.send_bytes(state['best'][1])
+        state['bests'] = []
+
+        message = conn.recv()
+        if message is None:
+            break
+        immigrants = decode(conn.recv_bytes(), message, layer_sizes, options['genome_encoding'])
+        simulation.population.add_immigrants(immigrants)
+    conn.close()
+
+
+def migration_targets(count, topology, rng):
+    """Destination island for each island's migrants"""
+    if count < 2:
+        return list(range(count))
+    if topology == 'ring':
+        return [(i + 1) % count for i in range(count)]
+    return [rng.choice([j for j in range(count) if j != i]) for i in range(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evolve several populations in parallel with migration")
+    parser.add_argument('--islands', type=int, default=os.cpu_count())
+    parser.add_argument('--population-size', type=int, default=50, help="Agents per island")
+    parser.add_argument('--food-count', type=int, default=20)
+    parser.add_argument('--generation-timeout', type=float, default=45)
+    parser.add_argument('--interval', type=int, default=5, help="Generations between migrations")
+    parser.add_argument('--migrants', type=int, default=2, help="Genomes each island sends per migration")
+    parser.add_argument('--topology', choices=TOPOLOGIES, default='ring')
+    parser.add_argument('--epochs', type=int, default=10, help="Migrations to run")
+    parser.add_argument('--termination', default='', help="Early generation-end policies (see termination.py)")
+    parser.add_argument('--food-dynamics', default='', help="Food spawn and regrowth spec (see food_field.py)")
+    parser.add_argument('--backend', default='numpy', help="Population step backend (python, numpy, numba)")
+    parser.add_argument('--arenas', type=int, default=1, help="Episodes per genome (see Population)")
+    parser.add_argument('--interactions', help="Agent-agent interactions, e.g. separation,sense "
+                        "(default: AGENT_INTERACTIONS; see interactions.py)")
+    parser.add_argument('--precision', choices=('float64', 'float32'), default='float64',
+                        help="Brain weight dtype the islands simulate in (see precision.py)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save-champion', metavar='PATH', help="Save the best brain seen as a policy file")
+    parser.add_argument('--genome-encoding', choices=('float32', 'int8'), default='float32',
+                        help="How migrants and the saved champion are stored; int8 quantizes them per tensor")
+    args = parser.parse_args(argv)
+
+    try:
+        from food_field import parse_dynamics
+        from interactions import parse_interactions
+        from termination import parse_policies
+        parse_policies(args.termination)
+        parse_dynamics(args.food_dynamics)
+        if args.interactions is not None:
+            args.interactions = parse_interactions(args.interactions)
+        if args.arenas < 1:
+            raise ValueError(f"arenas must be at least 1, got {args.arenas}")
+    except ValueError as e:
+        parser.error(str(e))
+
+    import numpy as np
+    from precision import decode, encode
+
+    options = {name: getattr(args, name) for name in ('population_size', 'food_count', 'generation_timeout',
+                                                       'interval', 'migrants', 'termination', 'food_dynamics',
+                                                       'backend', 'arenas', 'interactions', 'precision',
+                                                       'seed', 'genome_encoding')}
+    connections = []
+    processes = []
+    for index in range(args.islands):
+        parent, child = Pipe()
+        process = Process(target=run_island, args=(index, child, options), daemon=True)
+        process.start()
+        child.close()
+        connections.append(parent)
+        processes.append(process)
+    print(f"Running {args.islands} islands x {args.population_size} agents, migrating {args.migrants} "
+          f"genomes every {args.interval} generations over a {args.topology} topology")
+
+    rng = random.Random(args.seed)
+    champion = (float('-inf'), None, None)  # fitness, island, genome
+    layer_sizes = None
+    start = time.perf_counter()
+    try:
+        for epoch in range(1, args.epochs + 1):
+            reports = []
+            for conn in connections:
+                index, bests, ticks, seconds, best, shape, layer_sizes = conn.recv()
+                genomes = decode(conn.recv_bytes(), shape, layer_sizes, args.genome_encoding)
+                best_genome = np.frombuffer(conn.recv_bytes(), dtype=np.float32)
+                reports.append((bests, ticks, seconds, genomes))
+                if best > champion[0]:
+                    champion = (best, index, best_genome)
+
+            generation = epoch * args.interval
+            island_bests = [max(bests) for bests, *_ in reports]
+            ticks = sum(ticks for _, ticks, *_ in reports)
+            print(f"Epoch {epoch:3d} (generation {generation}): best this epoch {max(island_bests):.0f}, "
+                  f"best ever {champion[0]:.0f} (island {champion[1]}), "
+                  f"{ticks / (time.perf_counter() - start):.0f} ticks/s")
+            print(f"    islands: {' '.join(f'{best:.0f}' for best in island_bests)}")
+
+            if epoch == args.epochs:
+                break
+
+            # Route every island's migrants, then release the islands
+            incoming = [[] for _ in connections]
+            for source, target in enumerate(migration_targets(len(connections), args.topology, rng)):
+                if target != source:
+                    incoming[target].append(reports[source][3])
+            for conn, arrays in zip(connections, incoming):
+                immigrants = np.concatenate(arrays) if arrays else np.zeros((0, reports[0][3].shape[1]),
+                                                                            dtype=np.float32)
+                conn.send(immigrants.shape)
+                conn.send_bytes(encode(immigrants, layer_sizes, args.genome_encoding))
+    finally:
+        for conn in connections:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    print(f"Global best fitness {champion[0]:.0f} from island {champion[1]} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    if args.save_champion and champion[2] is not None:
+        from policy import PolicyWeights, save_policy
+        save_policy(args.save_champion, PolicyWeights(layer_sizes, champion[2], args.epochs * args.interval,
+                                                       champion[0]), args.genome_encoding)
+        print(f"Saved the champion to {args.save_champion}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
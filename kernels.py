@@ -0,0 +1,521 @@
+import math
+import numpy as np
+from spatial import UniformGrid, nearest_per_query
+
+# Optional dependency: the "numba" backend is only available when Numba imports
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BACKENDS = ('python', 'numpy', 'numba')
+
+# Brain inputs every agent has (food distance, food angle, energy); inputs
+# after these come from BatchState.sense (see interactions.py)
+BASE_INPUTS = 3
+
+# From this many food items per arena the NumPy step finds food through a
+# uniform grid (cells a quarter of the vision radius) instead of measuring
+# every agent-food pair; both give the same results
+GRID_MIN_FOOD = 256
+GRID_CELLS_PER_VISION = 4
+
+
+def numba_available():
+    return numba is not None
+
+
+def resolve_backend(backend):
+    """Validate a backend name, falling back from numba to numpy when it is not installed"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown simulation backend {backend!r}, expected one of {BACKENDS}")
+    if backend == 'numba' and not numba_available():
+        print("Numba is not installed, using the numpy backend")
+        return 'numpy'
+    return backend
+
+
+class StepParams:
+    """Constants of one step, shared by all agents"""
+    def __init__(self, agent_cls, food_radius, width, height, dt, energy_gain):
+        self.speed = agent_cls.speed
+        self.turn_rate = agent_cls.turn_rate
+        self.radius = agent_cls.radius
+        self.vision_radius = agent_cls.vision_radius
+        self.vision_angle = agent_cls.vision_angle
+        self.food_radius = food_radius
+        self.width = width
+        self.height = height
+        self.dt = dt
+        self.energy_gain = energy_gain
+
+
+class BatchState:
+    """Structure-of-arrays copy of a population, used by the batched backends.
+
+    With arenas > 1 every agent is simulated once per arena: the per-agent
+    arrays hold arenas * len(agents) entries, arena-major (entry m * N + n is
+    agent n in arena m), and food arrays passed to the step functions hold
+    each arena's food in turn. Arena 0 is the one the Agent objects show.
+    brain_inputs, when given, is checked against the brains' input layer."""
+    def __init__(self, agents, arenas=1, brain_inputs=None):
+        count = len(agents)
+        self.arenas = arenas
+        self.agent_count = count
+        state = np.array([(a.position_x, a.position_y, a.direction, a.energy, a.food_eaten, a.alive, a.is_stuck)
+                          for a in agents], dtype=np.float64).reshape(count, 7)
+        state = np.tile(state, (arenas, 1))
+        self.x = state[:, 0].copy()
+        self.y = state[:, 1].copy()
+        self.direction = state[:, 2].copy()
+        self.energy = state[:, 3].copy()
+        self.food_eaten = state[:, 4].astype(np.int64)
+        self.alive = state[:, 5] > 0
+        self.is_stuck = state[:, 6] > 0
+
+        # Brains are fixed for a generation, so they are stacked once
+        layer_sizes = agents[0].brain.layer_sizes if agents else [0]
+        if agents and brain_inputs is not None and layer_sizes[0] != brain_inputs:
+            # e.g. genomes evolved with other interactions: their inputs would be silently wrong
+            raise ValueError(f"Brains take {layer_sizes[0]} inputs, but this population provides {brain_inputs}")
+        self.layer_sizes = np.array(layer_sizes, dtype=np.int64)
+        dtype = agents[0].brain.dtype if agents else np.float64
+        self.genomes = np.array([a.brain.get_genome(dtype) for a in agents], dtype=dtype).reshape(count, -1)
+
+        # Per-layer (weights, biases) views into the genomes for the NumPy path
+        self.layers = []
+        offset = 0
+        for i in range(1, len(layer_sizes)):
+            n_in, n_out = layer_sizes[i-1], layer_sizes[i]
+            weights = self.genomes[:, offset:offset + n_in * n_out].reshape(count, n_in, n_out)
+            offset += n_in * n_out
+            biases = self.genomes[:, offset:offset + n_out]
+            offset += n_out
+            self.layers.append((weights, biases))
+
+        # Row of genomes each entry uses
+        self.genome_index = np.tile(np.arange(count), arenas)
+
+        # For visualization; target is an index into the entry's own arena's food
+        self.inputs = np.zeros((count * arenas, layer_sizes[0]))
+        self.outputs = np.zeros((count * arenas, layer_sizes[-1]))
+        self.target = np.full(count * arenas, -1, dtype=np.int64)
+
+        # Extra brain inputs, filled in before each step (see interactions.py)
+        self.sense = np.zeros((count * arenas, max(0, layer_sizes[0] - BASE_INPUTS)))
+
+        # Agent and food of each meal in a compiled step, grown as needed
+        self.meal_buffer = np.empty((2, 0), dtype=np.int64)
+
+    def per_arena(self, values):
+        """(arenas, agents) view of a per-entry array"""
+        return values.reshape(self.arenas, self.agent_count)
+
+
+def draw_randoms(count):
+    """Pre-draw the per-agent random numbers of one step, so both batched
+    backends consume exactly the same values (respawn positions come from
+    the FoodField's pool)"""
+    return np.random.random((3, count))
+
+
+def food_grid(state, food_x, food_y, params):
+    """Grid over every arena's food, or None when brute force is cheaper"""
+    food_count = len(food_x) // state.arenas
+    if food_count < GRID_MIN_FOOD:
+        return None
+    return UniformGrid(food_x, food_y, params.vision_radius / GRID_CELLS_PER_VISION, params.width, params.height,
+                       group=np.arange(len(food_x)) // food_count, groups=state.arenas)
+
+
+def nearest_visible_food(grid, x, y, direction, arena, food_x, food_y, params):
+    """Closest food in each agent's vision cone from the grid's candidates,
+    ties going to the lower food index like argmin over all food.
+    Returns found, global food index, distance and angle per agent."""
+    query, food = grid.neighbours(x, y, params.vision_radius, group=arena)
+    dx = food_x[food] - x[query]
+    dy = food_y[food] - y[query]
+    distance = np.sqrt(dx*dx + dy*dy)
+    near = np.flatnonzero(distance <= params.vision_radius)
+    query, food, dx, dy, distance = query[near], food[near], dx[near], dy[near], distance[near]
+    angle_diff = (np.arctan2(dy, dx) - direction[query] + math.pi) % (2 * math.pi) - math.pi
+    visible = np.flatnonzero(np.abs(angle_diff) <= params.vision_angle / 2)
+    query, food, distance, angle_diff = query[visible], food[visible], distance[visible], angle_diff[visible]
+
+    found = np.zeros(len(x), dtype=bool)
+    closest = np.zeros(len(x), dtype=np.int64)
+    closest_distance = np.zeros(len(x))
+    closest_angle = np.zeros(len(x))
+    if len(query) == 0:
+        return found, closest, closest_distance, closest_angle
+
+    # Pairs come grouped by agent, each food at most once per agent
+    first = nearest_per_query(query, food, distance)
+    rows = query[first]
+    found[rows] = True
+    closest[rows] = food[first]
+    closest_distance[rows] = distance[first]
+    closest_angle[rows] = angle_diff[first]
+    return found, closest, closest_distance, closest_angle
+
+
+def step_numpy(state, food_x, food_y, randoms, params):
+    """One fused step (perception, brain, action, movement, eating) with NumPy.
+    Returns the indices of agents that ate and of the food they ate (into
+    food_x), one entry per meal."""
+    uniform, pool_x, pool_y = randoms
+    food_count = len(food_x) // state.arenas
+
+    # Lose energy over time
+    index = np.flatnonzero(state.alive)
+    state.energy[index] -= 0.1 * params.dt * 60
+    starved = state.energy[index] <= 0
+    state.alive[index[starved]] = False
+    index = index[~starved]
+    state.target[:] = -1
+    if len(index) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    x = state.x[index]
+    y = state.y[index]
+    direction = state.direction[index]
+    energy = state.energy[index]
+    rows = np.arange(len(index))
+
+    # Find closest food in vision cone
+    half_angle = params.vision_angle / 2
+    found = np.zeros(len(index), dtype=bool)
+    closest_distance = np.zeros(len(index))
+    closest_angle = np.zeros(len(index))
+    closest = np.zeros(len(index), dtype=np.int64)  # Index into food_x
+    # Each agent only sees the food of its own arena
+    arena = index // state.agent_count
+    grid = food_grid(state, food_x, food_y, params)
+    if grid is not None:
+        found, closest, closest_distance, closest_angle = nearest_visible_food(grid, x, y, direction, arena,
+                                                                               food_x, food_y, params)
+    elif food_count:
+        arena_x = food_x.reshape(state.arenas, food_count)[arena]
+        arena_y = food_y.reshape(state.arenas, food_count)[arena]
+        dx = arena_x - x[:, None]
+        dy = arena_y - y[:, None]
+        distance = np.sqrt(dx*dx + dy*dy)
+        angle_diff = (np.arctan2(dy, dx) - direction[:, None] + math.pi) % (2 * math.pi) - math.pi
+        visible = (distance <= params.vision_radius) & (np.abs(angle_diff) <= half_angle)
+        masked = np.where(visible, distance, np.inf)
+        local = np.argmin(masked, axis=1)
+        found = masked[rows, local] < np.inf
+        closest_distance = distance[rows, local]
+        closest_angle = angle_diff[rows, local]
+        closest = arena * food_count + local
+    state.target[index[found]] = closest[found] - arena[found] * food_count
+
+    # Prepare neural network inputs
+    normalized_distance = np.where(found, closest_distance / params.vision_radius, 1.0)
+    inputs = np.column_stack((normalized_distance,
+                              np.where(found, closest_angle / half_angle, 0.0),
+                              energy / 100, state.sense[index]))
+    state.inputs[index] = inputs
+
+    # Forward pass for all living agents at once, multiplying in the genome
+    # dtype; the sigmoid runs in float64 (one rounding, like the Numba loop)
+    dtype = state.genomes.dtype
+    a = inputs.astype(dtype, copy=False)
+    genome = state.genome_index[index]
+    for weights, biases in state.layers:
+        z = np.einsum('ni,nio->no', a, weights[genome]) + biases[genome]
+        a = (1.0 / (1.0 + np.exp(-z.astype(np.float64, copy=False)))).astype(dtype, copy=False)
+    outputs = a
+    state.outputs[index] = outputs
+    outputs = outputs.astype(np.float64)
+
+    # Stronger food pull and random turns when stuck
+    stuck = state.is_stuck[index]
+    food_pull_modifier = np.where(stuck, 3.0, 1.0)
+    jolt = stuck & (uniform[0, index] < 0.1)
+    direction = np.where(jolt, direction + (uniform[1, index] * math.pi - math.pi / 2), direction)
+
+    # Pull toward visible food
+    pull_strength = np.where(found, 0.5 * (1.0 - normalized_distance) * food_pull_modifier, 0.0)
+    outputs[:, 0] += np.where(closest_angle < 0, pull_strength, 0.0)
+    outputs[:, 1] += np.where(closest_angle < 0, 0.0, pull_strength)
+    outputs[:, 2] += pull_strength * 0.7
+
+    # Determine action based on highest output; always be moving now and then
+    action = np.argmax(outputs, axis=1)
+    action[uniform[2, index] < 0.05] = 2
+
+    direction = np.where(action == 0, direction - params.turn_rate * params.dt, direction)
+    direction = np.where(action == 1, direction + params.turn_rate * params.dt, direction)
+
+    # Move forward with wall bounces
+    moving = action == 2
+    move_distance = params.speed * params.dt
+    new_x = x + np.cos(direction) * move_distance
+    new_y = y + np.sin(direction) * move_distance
+    low_x = new_x < params.radius
+    high_x = ~low_x & (new_x > params.width - params.radius)
+    new_x = np.where(low_x, params.radius + 1, np.where(high_x, params.width - params.radius - 1, new_x))
+    direction = np.where(moving & (low_x | high_x), math.pi - direction, direction)
+    low_y = new_y < params.radius
+    high_y = ~low_y & (new_y > params.height - params.radius)
+    new_y = np.where(low_y, params.radius + 1, np.where(high_y, params.height - params.radius - 1, new_y))
+    direction = np.where(moving & (low_y | high_y), -direction, direction)
+
+    # Direct pull toward visible food
+    pull = np.where(found, 0.25 * (1.0 - normalized_distance) * food_pull_modifier, 0.0)
+    if food_count:
+        new_x += pull * (food_x[closest] - x)
+        new_y += pull * (food_y[closest] - y)
+
+    state.x[index] = np.where(moving, new_x, x)
+    state.y[index] = np.where(moving, new_y, y)
+    state.direction[index] = direction % (2 * math.pi)
+
+    return eat_numpy(state, index, food_x, food_y, pool_x, pool_y, params, grid)
+
+
+def eat_numpy(state, index, food_x, food_y, pool_x, pool_y, params, grid=None):
+    """Resolve meals in agent order; food respawns before later agents are checked.
+    Returns the agents that ate and the food they ate, one entry per meal."""
+    meals = []
+    eaten = []
+    food_count = len(food_x) // state.arenas
+    if food_count == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    x = state.x[index]
+    y = state.y[index]
+    arena = index // state.agent_count
+    # Rows are in arena order; ends[row] is one past the last row of that row's arena
+    ends = np.searchsorted(arena, arena, side='right')
+    reach = params.radius + params.food_radius
+
+    # Column c of a row stands for food base[row] + column_food[c]: every food
+    # of the row's arena, or (with a grid) only food some agent is touching,
+    # the only food that can be eaten or respawned this step
+    if grid is None:
+        base = arena * food_count
+        column_food = np.arange(food_count)
+        foods = base[:, None] + column_food
+        hits = np.sqrt((food_x[foods] - x[:, None])**2 + (food_y[foods] - y[:, None])**2) < reach
+    else:
+        query, food = grid.neighbours(x, y, reach, group=arena)
+        touching = np.sqrt((food_x[food] - x[query])**2 + (food_y[food] - y[query])**2) < reach
+        base = np.zeros(len(index), dtype=np.int64)
+        column_food = np.unique(food[touching])
+        hits = ((column_food // food_count)[None, :] == arena[:, None]) & (
+            np.sqrt((food_x[column_food] - x[:, None])**2 + (food_y[column_food] - y[:, None])**2) < reach)
+
+    row = -1
+    used = 0
+    while True:
+        remaining = np.flatnonzero(hits[row + 1:].any(axis=1))
+        if len(remaining) == 0:
+            break
+        row += 1 + remaining[0]
+        agent = index[row]
+        for column in np.flatnonzero(hits[row]):
+            food = base[row] + column_food[column]
+            state.energy[agent] += params.energy_gain
+            state.food_eaten[agent] += 1
+            meals.append(agent)
+            eaten.append(food)
+
+            # Respawn and recheck this food against the agents of the arena not yet processed
+            food_x[food] = pool_x[used % len(pool_x)]
+            food_y[food] = pool_y[used % len(pool_y)]
+            used += 1
+            later = slice(row + 1, ends[row])
+            hits[later, column] = np.sqrt((food_x[food] - x[later])**2 + (food_y[food] - y[later])**2) < reach
+
+    return np.array(meals, dtype=np.int64), np.array(eaten, dtype=np.int64)
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _step_numba(x, y, direction, energy, food_eaten, alive, is_stuck, genomes, layer_sizes,
+                    genome_index, sense, inputs_out, outputs_out, target, food_x, food_y, food_count, agent_count,
+                    uniform, pool_x, pool_y, speed, turn_rate, radius, vision_radius, vision_angle, food_radius,
+                    width, height, dt, energy_gain, meals, eaten):
+        half_angle = vision_angle / 2
+        two_pi = 2 * math.pi
+        max_width = 0
+        for i in range(len(layer_sizes)):
+            max_width = max(max_width, layer_sizes[i])
+        a = np.empty(max_width, dtype=genomes.dtype)
+        z = np.empty(max_width, dtype=genomes.dtype)
+        n_out = layer_sizes[len(layer_sizes) - 1]
+        outputs = np.empty(n_out)
+
+        for n in range(len(x)):
+            target[n] = -1
+            if not alive[n]:
+                continue
+
+            # Lose energy over time
+            energy[n] -= 0.1 * dt * 60
+            if energy[n] <= 0:
+                alive[n] = False
+                continue
+
+            # Find closest food in vision cone, among the food of this agent's arena
+            first_food = (n // agent_count) * food_count
+            genome = genome_index[n]
+            closest = -1
+            closest_distance = np.inf
+            closest_angle = 0.0
+            for f in range(first_food, first_food + food_count):
+                dx = food_x[f] - x[n]
+                if abs(dx) > vision_radius:
+                    continue  # Cheap reject; the distance can only be larger
+                dy = food_y[f] - y[n]
+                distance = math.sqrt(dx*dx + dy*dy)
+                if distance > vision_radius:
+                    continue
+                angle_diff = (math.atan2(dy, dx) - direction[n] + math.pi) % two_pi - math.pi
+                if abs(angle_diff) <= half_angle and distance < closest_distance:
+                    closest_distance = distance
+                    closest = f
+                    closest_angle = angle_diff
+            target[n] = closest - first_food if closest >= 0 else -1
+
+            # Prepare neural network inputs
+            if closest >= 0:
+                normalized_distance = closest_distance / vision_radius
+                a[0] = normalized_distance
+                a[1] = closest_angle / half_angle
+            else:
+                normalized_distance = 1.0
+                a[0] = 1.0
+                a[1] = 0.0
+            a[2] = energy[n] / 100
+            for i in range(sense.shape[1]):
+                a[3 + i] = sense[n, i]
+            for i in range(layer_sizes[0]):
+                inputs_out[n, i] = a[i]
+
+            # Forward pass over the flat genome
+            offset = 0
+            for layer in range(1, len(layer_sizes)):
+                n_in = layer_sizes[layer - 1]
+                width_out = layer_sizes[layer]
+                bias_offset = offset + n_in * width_out
+                for o in range(width_out):
+                    # Sums are kept in the genome dtype, like einsum's
+                    z[o] = 0
+                    for i in range(n_in):
+                        z[o] += a[i] * genomes[genome, offset + i * width_out + o]
+                    z[o] = 1.0 / (1.0 + math.exp(-float(z[o] + genomes[genome, bias_offset + o])))
+                for o in range(width_out):
+                    a[o] = z[o]
+                offset = bias_offset + width_out
+            for o in range(n_out):
+                outputs_out[n, o] = a[o]
+                outputs[o] = a[o]
+
+            # Stronger food pull and random turns when stuck
+            food_pull_modifier = 1.0
+            heading = direction[n]
+            if is_stuck[n]:
+                food_pull_modifier = 3.0
+                if uniform[0, n] < 0.1:
+                    heading += uniform[1, n] * math.pi - math.pi / 2
+
+            if closest >= 0:
+                pull_strength = 0.5 * (1.0 - normalized_distance) * food_pull_modifier
+                if closest_angle < 0:
+                    outputs[0] += pull_strength
+                else:
+                    outputs[1] += pull_strength
+                outputs[2] += pull_strength * 0.7
+
+            # Determine action based on highest output (first maximum, like argmax)
+            action = 0
+            for o in range(1, n_out):
+                if outputs[o] > outputs[action]:
+                    action = o
+            if uniform[2, n] < 0.05:
+                action = 2
+
+            if action == 0:
+                heading -= turn_rate * dt
+            elif action == 1:
+                heading += turn_rate * dt
+            elif action == 2:
+                move_distance = speed * dt
+                new_x = x[n] + math.cos(heading) * move_distance
+                new_y = y[n] + math.sin(heading) * move_distance
+
+                if new_x < radius:
+                    new_x = radius + 1
+                    heading = math.pi - heading
+                elif new_x > width - radius:
+                    new_x = width - radius - 1
+                    heading = math.pi - heading
+
+                if new_y < radius:
+                    new_y = radius + 1
+                    heading = -heading
+                elif new_y > height - radius:
+                    new_y = height - radius - 1
+                    heading = -heading
+
+                if closest >= 0:
+                    pull = 0.25 * (1.0 - normalized_distance) * food_pull_modifier
+                    new_x += pull * (food_x[closest] - x[n])
+                    new_y += pull * (food_y[closest] - y[n])
+
+                x[n] = new_x
+                y[n] = new_y
+
+            direction[n] = heading % two_pi
+
+        # Resolve meals in agent order
+        reach = radius + food_radius
+        meal_count = 0
+        for n in range(len(x)):
+            if not alive[n]:
+                continue
+            first_food = (n // agent_count) * food_count
+            for f in range(first_food, first_food + food_count):
+                dx = food_x[f] - x[n]
+                if abs(dx) >= reach:
+                    continue
+                dy = food_y[f] - y[n]
+                if math.sqrt(dx*dx + dy*dy) < reach:
+                    energy[n] += energy_gain
+                    food_eaten[n] += 1
+                    food_x[f] = pool_x[meal_count % len(pool_x)]
+                    food_y[f] = pool_y[meal_count % len(pool_y)]
+                    meals[meal_count] = n
+                    eaten[meal_count] = f
+                    meal_count += 1
+        return meal_count
+
+
+def step_numba(state, food_x, food_y, randoms, params):
+    """One fused step compiled with Numba; same inputs and results as step_numpy.
+    Food is found by brute force with a cheap bounding-box reject, which the
+    compiled loop gets through fast enough for large food fields too."""
+    uniform, pool_x, pool_y = randoms
+    # Each agent eats each food of its arena at most once a step, so this
+    # many entries always fit every meal
+    worst_case = len(state.x) * (len(food_x) // state.arenas)
+    if state.meal_buffer.shape[1] < worst_case:
+        state.meal_buffer = np.empty((2, worst_case), dtype=np.int64)
+    meals, eaten = state.meal_buffer
+    meal_count = _step_numba(
+        state.x, state.y, state.direction, state.energy, state.food_eaten, state.alive, state.is_stuck,
+        state.genomes, state.layer_sizes, state.genome_index, state.sense, state.inputs, state.outputs,
+        state.target, food_x, food_y, len(food_x) // state.arenas, state.agent_count, uniform, pool_x, pool_y,
+        float(params.speed), float(params.turn_rate), float(params.radius), float(params.vision_radius),
+        float(params.vision_angle), float(params.food_radius), float(params.width), float(params.height),
+        float(params.dt), float(params.energy_gain), meals, eaten)
+    return meals[:meal_count].copy(), eaten[:meal_count].copy()
+
+
+STEP_FUNCTIONS = {
+    'numpy': step_numpy,
+    'numba': step_numba,
+}
@@ -1,13 +1,14 @@
 import pygame
 import sys
-import random
-import math
-import numpy as np
-from agent import Agent
-from food import Food
-from environment import Environment
-from population import Population
+import os
+from simulation import Simulation
+from camera import Camera, Minimap
 from neural_network_visualizer import NeuralNetworkVisualizer
+from text_cache import TextCache
+from replay import ReplayRecorder
+from history import MetricsHistory
+from termination import Termination, parse_policies
+from food_field import parse_dynamics
 
 # Initialize Pygame
 pygame.init()
@@ -19,6 +20,11 @@ SIMULATION_WIDTH = 900
 SIMULATION_HEIGHT = 800
 INFO_WIDTH = 300
 INFO_HEIGHT = 800
+# The world can be larger than the view; the camera then scrolls over it
+WORLD_WIDTH = int(os.environ.get('WORLD_WIDTH', SIMULATION_WIDTH))
+WORLD_HEIGHT = int(os.environ.get('WORLD_HEIGHT', SIMULATION_HEIGHT))
+MINIMAP_WIDTH = 200
+PAN_SPEED = 600  # Screen pixels per second
 BACKGROUND_COLOR = (30, 30, 30)
 TEXT_COLOR = (200, 200, 200)
 
@@ -27,22 +33,15 @@ screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Neural Network Evolution Simulation")
 clock = pygame.time.Clock()
 font = pygame.font.SysFont(None, 24)
+text_cache = TextCache(font)
 
-# Create environment
-environment = Environment(SIMULATION_WIDTH, SIMULATION_HEIGHT)
-
-# Initialize population
-population_size = 50
-population = Population(population_size, environment)
-
-# Create food
-food_count = 20
-foods = []
-for _ in range(food_count):
-    # Ensure food isn't placed too close to the edges
-    x = random.randint(30, SIMULATION_WIDTH-30)
-    y = random.randint(30, SIMULATION_HEIGHT-30)
-    foods.append(Food(x, y))
+# Create the world: 50 agents, 20 food, 45 s generations; set TERMINATION
+# (e.g. alive=0.2,idle=5, see termination.py) to end generations earlier and
+# FOOD_DYNAMICS (e.g. patchy,regrow=2, see food_field.py) for other food
+termination = Termination(parse_policies(os.environ.get('TERMINATION', '')))
+simulation = Simulation(WORLD_WIDTH, WORLD_HEIGHT, population_size=50, food_count=20,
+                        generation_timeout=45, termination=termination,
+                        food_options=parse_dynamics(os.environ.get('FOOD_DYNAMICS', '')))
 
 # Create neural network visualizer
 nn_visualizer = NeuralNetworkVisualizer(
@@ -52,16 +51,22 @@ nn_visualizer = NeuralNetworkVisualizer(
     300
 )
 
+# Optional replay recording (set REPLAY_FILE to enable)
+if os.environ.get('REPLAY_FILE'):
+    simulation.recorder = ReplayRecorder(os.environ['REPLAY_FILE'], WORLD_WIDTH, WORLD_HEIGHT)
+
+# Optional per-generation metrics log (set HISTORY_DIR; see history.py)
+if os.environ.get('HISTORY_DIR'):
+    simulation.history = MetricsHistory(directory=os.environ['HISTORY_DIR'])
+
+# View of the world, and a minimap of all of it in the view's top-right corner
+camera = Camera(SIMULATION_WIDTH, SIMULATION_HEIGHT, WORLD_WIDTH, WORLD_HEIGHT)
+minimap = Minimap(MINIMAP_WIDTH, WORLD_WIDTH, WORLD_HEIGHT)
+show_minimap = WORLD_WIDTH > SIMULATION_WIDTH or WORLD_HEIGHT > SIMULATION_HEIGHT
+
 # Game state
-paused = False
-generation = 1
 running = True
 
-# Stats
-best_fitness = 0
-generation_time = 0
-generation_timeout = 45  # seconds before forcing next generation
-
 def draw_info_panel():
     # Draw background for info panel
     pygame.draw.rect(screen, (40, 40, 40), 
@@ -73,61 +78,36 @@ def draw_info_panel():
                     (SIMULATION_WIDTH, SCREEN_HEIGHT), 3)
     
     # Draw stats
-    alive_count = sum(1 for agent in population.agents if agent.alive)
-    stuck_count = sum(1 for agent in population.agents if agent.alive and agent.is_stuck)
+    stats = simulation.stats()
     
-    stats = [
-        f"Generation: {generation}",
-        f"Best Fitness: {best_fitness:.1f}",
-        f"Agents Alive: {alive_count}/{population_size}",
-        f"Stuck Agents: {stuck_count}",
-        f"Time: {generation_time:.1f}s",
+    lines = [
+        f"Generation: {stats['generation']}",
+        f"Best Fitness: {stats['best_fitness']:.1f}",
+        f"Agents Alive: {stats['alive_count']}/{stats['population_size']}",
+        f"Stuck Agents: {stats['stuck_count']}",
+        f"Time: {stats['time']:.1f}s",
         f"FPS: {int(clock.get_fps())}",
+        f"Ticks Saved: {stats['ticks_saved']} ({stats['ticks_saved_fraction']:.0%})",
         "",
         "Controls:",
         "SPACE - Pause/Resume",
         "R - Reset simulation",
         "N - Next generation",
+        "Arrows - Pan, +/- or wheel - Zoom",
+        "F - Follow best, M - Minimap",
         "Q - Quit"
     ]
     
     y_offset = 320
-    for stat in stats:
-        text = font.render(stat, True, TEXT_COLOR)
+    for line in lines:
+        text = text_cache.render(line, TEXT_COLOR)
         screen.blit(text, (SIMULATION_WIDTH + 20, y_offset))
         y_offset += 30
 
-def reset_food():
-    """Reset all food to new random positions"""
-    for food in foods:
-        # Place food away from walls
-        food.position_x = random.randint(30, SIMULATION_WIDTH-30)
-        food.position_y = random.randint(30, SIMULATION_HEIGHT-30)
-
-def reset_simulation():
-    global generation, best_fitness, generation_time
-    generation = 1
-    best_fitness = 0
-    generation_time = 0
-    population.initialize_population()
-    reset_food()
-
-def next_generation():
-    global generation, generation_time
-    generation += 1
-    generation_time = 0
-    
-    # Evolve population
-    population.evolve()
-    reset_food()
-
 # Main game loop
 while running:
     dt = clock.tick(60) / 1000.0  # Delta time in seconds
     
-    if not paused:
-        generation_time += dt
-    
     # Process events
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
@@ -136,57 +116,47 @@ while running:
             if event.key == pygame.K_q:
                 running = False
             elif event.key == pygame.K_SPACE:
-                paused = not paused
+                simulation.paused = not simulation.paused
             elif event.key == pygame.K_r:
-                reset_simulation()
+                simulation.reset()
             elif event.key == pygame.K_n:
-                next_generation()
+                simulation.next_generation()
+            elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                camera.zoom_by(1.25)
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                camera.zoom_by(0.8)
+            elif event.key == pygame.K_f:
+                camera.following = not camera.following
+            elif event.key == pygame.K_m:
+                show_minimap = not show_minimap
+        elif event.type == pygame.MOUSEWHEEL:
+            mouse = pygame.mouse.get_pos()
+            if mouse[0] < SIMULATION_WIDTH:
+                camera.zoom_by(1.25 ** event.y, mouse)
+    
+    # Pan with the arrow keys
+    keys = pygame.key.get_pressed()
+    pan_x = (keys[pygame.K_RIGHT] - keys[pygame.K_LEFT]) * PAN_SPEED * dt
+    pan_y = (keys[pygame.K_DOWN] - keys[pygame.K_UP]) * PAN_SPEED * dt
+    if pan_x or pan_y:
+        camera.pan(pan_x, pan_y)
     
     # Clear screen
     screen.fill(BACKGROUND_COLOR)
     
-    # Update and draw all objects if not paused
-    if not paused:
-        # Update agents
-        population.update(foods, dt)
-        
-        # Check if agent eats food
-        for agent in population.agents:
-            if agent.alive:
-                for food in foods:
-                    if agent.check_food_collision(food):
-                        # Agent eats food
-                        agent.energy += 50
-                        agent.food_eaten += 1
-                        # Reset food position (away from walls)
-                        food.position_x = random.randint(30, SIMULATION_WIDTH-30)
-                        food.position_y = random.randint(30, SIMULATION_HEIGHT-30)
-        
-        # Update best fitness
-        current_best = max([agent.get_fitness() for agent in population.agents])
-        best_fitness = max(best_fitness, current_best)
-        
-        # Check if generation should end
-        all_dead = all(not agent.alive for agent in population.agents)
-        timeout = generation_time > generation_timeout
-        
-        if all_dead or timeout:
-            next_generation()
+    # Update agents, let them eat, and end the generation when it's done
+    simulation.step(dt)
     
-    # Draw environment
-    environment.draw(screen)
+    # Draw the environment, food and agents in view
+    best_agent = simulation.population.get_best_agent()
+    if camera.following and best_agent:
+        camera.follow(best_agent.position_x, best_agent.position_y)
+    simulation.draw(screen, camera, BACKGROUND_COLOR)
+    if show_minimap:
+        minimap.draw(screen, (SIMULATION_WIDTH - MINIMAP_WIDTH - 10, 10), simulation.foods, simulation.population,
+                     camera)
     
-    # Draw food
-    for food in foods:
-        food.draw(screen)
-    
-    # Draw agents
-    for agent in population.agents:
-        if agent.alive:
-            agent.draw(screen)
-    
-    # Get best agent for neural network visualization
-    best_agent = population.get_best_agent()
+    # Neural network of the best agent
     if best_agent:
         nn_visualizer.update(best_agent.brain, best_agent.last_inputs, best_agent.last_outputs)
         nn_visualizer.draw(screen)
@@ -197,6 +167,10 @@ while running:
     # Update display
     pygame.display.flip()
 
+# Finish the replay log
+if simulation.recorder:
+    simulation.recorder.close()
+
 # Quit Pygame
 pygame.quit()
 sys.exit()
\ No newline at end of file
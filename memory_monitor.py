@@ -0,0 +1,163 @@
+"""
+Memory accounting for long-running servers.
+
+MemoryMonitor tracks one process: its resident set size, byte counters for
+the subsystems registered with it, tracemalloc snapshots on demand, and a
+degradation level derived from an optional budget. Between DEGRADE_AT and
+SHED_AT of the budget the level is REDUCED, above SHED_AT it is MINIMAL;
+the owner decides what each level gives up (app.py drops frame caches and
+render quality).
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+NORMAL, REDUCED, MINIMAL = 0, 1, 2
+LEVEL_NAMES = ('normal', 'reduced', 'minimal')
+
+DEGRADE_AT = 0.8
+SHED_AT = 0.9
+HYSTERESIS = 0.05  # A level is only left once usage drops this far below its threshold
+
+
+def process_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # No procfs (macOS): fall back to the peak, reported in bytes there
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def nbytes(value):
+    """Bytes held by a NumPy array, bytes/str, or a list/tuple/dict of them
+    (one level deep); other objects count as their shallow size"""
+    if value is None:
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(nbytes(item) for item in value
+                                          if isinstance(item, (np.ndarray, bytes, bytearray, str)))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(nbytes(item) for item in value.values()
+                                          if isinstance(item, (np.ndarray, bytes, bytearray, str)))
+    return sys.getsizeof(value)
+
+
+def array_bytes(obj):
+    """Bytes of the arrays, buffers and lists of arrays an object holds as attributes"""
+    if obj is None:
+        return 0
+    attributes = vars(obj).values() if hasattr(obj, '__dict__') else ()
+    return sum(nbytes(value) for value in attributes
+               if isinstance(value, (np.ndarray, bytes, bytearray, list, tuple)))
+
+
+class MemoryMonitor:
+    """Per-process memory report and budget"""
+    def __init__(self, budget=None, check_interval=1.0):
+        self.budget = budget  # bytes, or None for no budget
+        self.check_interval = check_interval
+        self.counters = {}
+        self.level = NORMAL
+        self.rss = 0
+        self.peak_rss = 0
+        self.next_check = 0.0
+        self.on_level_change = None  # Called with the new level
+        self.previous_snapshot = None
+
+    def register(self, name, count):
+        """Add a subsystem; count() returns the bytes it currently holds"""
+        self.counters[name] = count
+
+    def check(self):
+        """Sample RSS and update the level, at most every check_interval
+        seconds; cheap enough to call on every step or request"""
+        now = time.monotonic()
+        if now < self.next_check:
+            return self.level
+        self.next_check = now + self.check_interval
+
+        self.rss = process_rss()
+        self.peak_rss = max(self.peak_rss, self.rss)
+        level = self.level_for(self.rss)
+        if level != self.level:
+            print(f"Memory {self.rss / 2**20:.0f} MiB of {self.budget / 2**20:.0f} MiB budget: "
+                  f"{LEVEL_NAMES[self.level]} -> {LEVEL_NAMES[level]}")
+            self.level = level
+            if level > NORMAL:
+                gc.collect()
+            if self.on_level_change:
+                self.on_level_change(level)
+        return self.level
+
+    def level_for(self, rss):
+        if not self.budget:
+            return NORMAL
+        usage = rss / self.budget
+        level = NORMAL
+        for threshold, candidate in ((DEGRADE_AT, REDUCED), (SHED_AT, MINIMAL)):
+            # Entering needs the threshold; staying needs a bit less
+            if usage >= threshold or (self.level >= candidate and usage >= threshold - HYSTERESIS):
+                level = candidate
+        return level
+
+    def subsystems(self):
+        sizes = {}
+        for name, count in self.counters.items():
+            try:
+                sizes[name] = int(count())
+            except Exception as e:  # A subsystem mid-update shouldn't break the report
+                sizes[name] = f"unavailable: {e}"
+        return sizes
+
+    def start_tracing(self, frames=1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self.previous_snapshot = None
+
+    def stop_tracing(self):
+        tracemalloc.stop()
+        self.previous_snapshot = None
+
+    def snapshot(self, limit=15):
+        """Largest allocation sites now, and the biggest growth since the
+        previous snapshot; None unless tracing"""
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        result = {'top': [{'site': str(stat.traceback), 'bytes': stat.size, 'count': stat.count}
+                          for stat in snapshot.statistics('lineno')[:limit]]}
+        if self.previous_snapshot is not None:
+            result['growth'] = [{'site': str(stat.traceback), 'bytes': stat.size_diff, 'count': stat.count_diff}
+                                for stat in snapshot.compare_to(self.previous_snapshot, 'lineno')[:limit]]
+        self.previous_snapshot = snapshot
+        return result
+
+    def report(self):
+        self.next_check = 0.0
+        self.check()
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        return {
+            'pid': os.getpid(),
+            'rss': self.rss,
+            'peak_rss': self.peak_rss,
+            'budget': self.budget,
+            'level': LEVEL_NAMES[self.level],
+            'subsystems': self.subsystems(),
+            'gc_counts': gc.get_count(),
+            'tracing': tracemalloc.is_tracing(),
+            'traced': traced,
+            'traced_peak': traced_peak
+        }
@@ -0,0 +1,49 @@
+"""
+Report how many bytes each Agent and Food takes.
+
+    python memory_report.py --agents 100000 --food 10000
+"""
+import argparse
+import gc
+import tracemalloc
+from environment import Environment
+from food import Food
+from population import Population
+
+
+def measure(build):
+    """Bytes allocated (and still held) by build()"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure memory per agent and food item")
+    parser.add_argument('--agents', type=int, default=10000)
+    parser.add_argument('--food', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    environment = Environment(900, 600)
+
+    population, population_bytes = measure(lambda: Population(args.agents, environment))
+    brain_bytes = measure(lambda: [agent.brain.copy() for agent in population.agents])[1]
+    foods, food_bytes = measure(lambda: [Food(0, 0) for _ in range(args.food)])
+
+    # Agent state includes the population's per-agent buffers (e.g. stuck detection history)
+    agent_bytes = population_bytes - brain_bytes
+    print(f"Agents: {args.agents}")
+    print(f"  total        {population_bytes / 2**20:10.1f} MiB  {population_bytes / args.agents:8.0f} B/agent")
+    print(f"  brains       {brain_bytes / 2**20:10.1f} MiB  {brain_bytes / args.agents:8.0f} B/agent")
+    print(f"  agent state  {agent_bytes / 2**20:10.1f} MiB  {agent_bytes / args.agents:8.0f} B/agent")
+    print(f"Food: {args.food}")
+    print(f"  total        {food_bytes / 2**20:10.1f} MiB  {food_bytes / args.food:8.0f} B/food")
+
+
+if __name__ == '__main__':
+    main()
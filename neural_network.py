@@ -2,44 +2,101 @@ import numpy as np
 import copy
 
 class NeuralNetwork:
-    def __init__(self, layer_sizes):
+    # Brains are the bulk of a large population: no __dict__, and activation
+    # buffers only once forward() has run (most brains never need them)
+    __slots__ = ('layer_sizes', 'num_layers', 'dtype', 'weights', 'biases', 'last_activations')
+    
+    def __init__(self, layer_sizes, dtype=np.float64):
         self.layer_sizes = layer_sizes
         self.num_layers = len(layer_sizes)
+        # Weights are stored and multiplied in dtype (float32 halves the memory)
+        self.dtype = np.dtype(dtype)
         
         # Initialize weights and biases
         self.weights = []
         self.biases = []
         
         for i in range(1, self.num_layers):
-            # Initialize weights with small random values
-            w = np.random.randn(self.layer_sizes[i-1], self.layer_sizes[i]) * 0.1
+            # Initialize weights with small random values (the same draws in every dtype)
+            w = (np.random.randn(self.layer_sizes[i-1], self.layer_sizes[i]) * 0.1).astype(self.dtype, copy=False)
             self.weights.append(w)
             
             # Initialize biases with zeros
-            b = np.zeros((1, self.layer_sizes[i]))
+            b = np.zeros((1, self.layer_sizes[i]), dtype=self.dtype)
             self.biases.append(b)
         
-        # For visualization
-        self.activations = [np.zeros(size) for size in layer_sizes]
+        self.last_activations = None
+    
+    @property
+    def activations(self):
+        """Activations of every layer from the last forward pass, for visualization"""
+        if self.last_activations is None:
+            return [np.zeros(size) for size in self.layer_sizes]
+        return self.last_activations
     
     def forward(self, inputs):
         """
         Forward pass through the neural network
         """
         # Convert inputs to numpy array
-        a = np.array(inputs).reshape(1, -1)
-        self.activations[0] = a.flatten()
+        a = np.array(inputs, dtype=self.dtype).reshape(1, -1)
+        activations = [a.flatten()]
         
         for i in range(self.num_layers - 1):
             # Calculate z = a*w + b
             z = np.dot(a, self.weights[i]) + self.biases[i]
             
-            # Apply sigmoid activation function
-            a = self.sigmoid(z)
-            self.activations[i+1] = a.flatten()
+            # Apply sigmoid activation function (in float64, like the batched kernels)
+            a = self.sigmoid(z.astype(np.float64, copy=False)).astype(self.dtype, copy=False)
+            activations.append(a.flatten())
         
+        self.last_activations = activations
         return a.flatten()
     
+    @classmethod
+    def from_genome(cls, layer_sizes, genome, dtype=np.float64):
+        """
+        Build a network from a flat genome (see get_genome)
+        """
+        network = cls.__new__(cls)
+        network.layer_sizes = list(layer_sizes)
+        network.num_layers = len(layer_sizes)
+        network.dtype = np.dtype(dtype)
+        network.weights = [np.zeros((layer_sizes[i-1], layer_sizes[i]), dtype=network.dtype)
+                           for i in range(1, network.num_layers)]
+        network.biases = [np.zeros((1, layer_sizes[i]), dtype=network.dtype) for i in range(1, network.num_layers)]
+        network.last_activations = None
+        network.set_genome(genome)
+        return network
+    
+    def get_genome(self, dtype=np.float32):
+        """
+        Flatten all weights and biases into a single 1-D array
+        """
+        parts = []
+        for w, b in zip(self.weights, self.biases):
+            parts.append(w.ravel())
+            parts.append(b.ravel())
+        return np.concatenate(parts).astype(dtype)
+    
+    def set_genome(self, genome):
+        """
+        Load weights and biases from a flat genome
+        """
+        genome = np.asarray(genome)
+        offset = 0
+        for i in range(len(self.weights)):
+            size = self.weights[i].size
+            self.weights[i] = genome[offset:offset + size].reshape(self.weights[i].shape).astype(self.dtype)
+            offset += size
+            
+            size = self.biases[i].size
+            self.biases[i] = genome[offset:offset + size].reshape(self.biases[i].shape).astype(self.dtype)
+            offset += size
+        
+        if offset != genome.size:
+            raise ValueError(f"Genome has {genome.size} values, expected {offset}")
+    
     def sigmoid(self, x):
         return 1.0 / (1.0 + np.exp(-x))
     
@@ -51,18 +108,19 @@ class NeuralNetwork:
     
     def mutate(self, mutation_rate=0.1, mutation_scale=0.2):
         """
-        Randomly mutate the weights and biases
+        Randomly mutate the weights and biases; the noise is added in the
+        network's dtype, so float32 weights never round-trip through float64
         """
         for i in range(len(self.weights)):
             # Mutate weights
             mutation_mask = np.random.random(self.weights[i].shape) < mutation_rate
             mutation = np.random.randn(*self.weights[i].shape) * mutation_scale
-            self.weights[i] += mutation * mutation_mask
+            self.weights[i] += (mutation * mutation_mask).astype(self.dtype, copy=False)
             
             # Mutate biases
             mutation_mask = np.random.random(self.biases[i].shape) < mutation_rate
             mutation = np.random.randn(*self.biases[i].shape) * mutation_scale
-            self.biases[i] += mutation * mutation_mask
+            self.biases[i] += (mutation * mutation_mask).astype(self.dtype, copy=False)
     
     def crossover(self, other):
         """
@@ -1,5 +1,6 @@
 import pygame
 import numpy as np
+from text_cache import TextCache
 
 class NeuralNetworkVisualizer:
     def __init__(self, x, y, width, height):
@@ -24,8 +25,19 @@ class NeuralNetworkVisualizer:
         self.h_margin = 40
         self.v_margin = 30
         
-        # Font for labels
+        # Fonts are looked up once; rendered text is cached by string
         self.font = pygame.font.SysFont(None, 18)
+        self.title_font = pygame.font.SysFont(None, 24)
+        self.text_cache = TextCache(self.font)
+        self.title = self.title_font.render("Neural Network (Best Agent)", True, self.text_color)
+        
+        # Node layout, computed once per topology
+        self.layout_key = None
+        self.layer_positions = []
+        
+        # Pre-rendered connection layer, rebuilt only when the drawn weights change
+        self.connection_surface = None
+        self.connection_key = None
         
         # For animation
         self.target_weights = []
@@ -72,65 +84,82 @@ class NeuralNetworkVisualizer:
         for i in range(len(self.current_weights)):
             self.current_weights[i] = self.current_weights[i] * 0.3 + self.target_weights[i] * 0.7
     
-    def draw(self, screen):
-        """Draw the neural network visualization"""
-        # Draw background
-        pygame.draw.rect(screen, self.bg_color, 
-                        (self.x, self.y, self.width, self.height))
-        
-        # Draw title
-        title_font = pygame.font.SysFont(None, 24)
-        title = title_font.render("Neural Network (Best Agent)", True, self.text_color)
-        screen.blit(title, (self.x + (self.width - title.get_width()) // 2, self.y + 5))
-        
-        # Check if we have valid data
-        if not self.current_activations or not self.current_weights:
-            return
-        
-        # Calculate positions for each node
+    def compute_layout(self, layer_sizes):
+        """Calculate node positions for each layer, relative to the panel origin"""
         layer_positions = []
-        max_nodes = max(len(a) for a in self.current_activations)
-        layer_count = len(self.current_activations)
+        layer_count = len(layer_sizes)
         
         # Calculate horizontal spacing
         h_spacing = (self.width - 2 * self.h_margin) / (layer_count - 1) if layer_count > 1 else 0
         
-        for i, layer in enumerate(self.current_activations):
+        for i, layer_size in enumerate(layer_sizes):
             nodes = []
-            layer_size = len(layer)
             
             # Calculate vertical spacing for this layer
             v_spacing = (self.height - 2 * self.v_margin) / (layer_size - 1) if layer_size > 1 else 0
             
             for j in range(layer_size):
-                x = self.x + self.h_margin + i * h_spacing
-                y = self.y + self.v_margin + j * v_spacing
+                x = self.h_margin + i * h_spacing
+                y = self.v_margin + j * v_spacing
                 if layer_size == 1:
                     # Center single nodes vertically
-                    y = self.y + self.height // 2
+                    y = self.height // 2
                 nodes.append((x, y))
             
             layer_positions.append(nodes)
         
-        # Draw connections (weights) between layers
-        for i in range(len(self.current_weights)):
-            for j in range(self.current_activations[i].size):
-                for k in range(self.current_activations[i+1].size):
-                    weight = self.current_weights[i][j, k]
-                    
-                    # Determine color based on weight sign
-                    if weight > 0:
+        return layer_positions
+    
+    def render_connections(self, layer_positions, colors, thicknesses):
+        """Pre-render all connections (weights) between layers to one surface"""
+        surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        
+        for i in range(len(colors)):
+            for j in range(len(layer_positions[i])):
+                for k in range(len(layer_positions[i+1])):
+                    if colors[i][j, k]:
                         color = self.positive_weight_color
                     else:
                         color = self.negative_weight_color
                     
-                    # Determine thickness based on weight magnitude
-                    thickness = min(self.max_weight_thickness, max(1, abs(int(weight * 3))))
-                    
-                    # Draw the connection
                     start_pos = layer_positions[i][j]
                     end_pos = layer_positions[i+1][k]
-                    pygame.draw.line(screen, color, start_pos, end_pos, thickness)
+                    pygame.draw.line(surface, color, start_pos, end_pos, int(thicknesses[i][j, k]))
+        
+        return surface
+    
+    def draw(self, screen):
+        """Draw the neural network visualization"""
+        # Draw background
+        pygame.draw.rect(screen, self.bg_color, 
+                        (self.x, self.y, self.width, self.height))
+        
+        # Draw title
+        screen.blit(self.title, (self.x + (self.width - self.title.get_width()) // 2, self.y + 5))
+        
+        # Check if we have valid data
+        if not self.current_activations or not self.current_weights:
+            return
+        
+        # Recompute node positions only when the topology changes
+        layer_sizes = tuple(a.size for a in self.current_activations)
+        if layer_sizes != self.layout_key:
+            self.layer_positions = self.compute_layout(layer_sizes)
+            self.layout_key = layer_sizes
+            self.connection_key = None
+        
+        # Color is picked by weight sign and thickness by magnitude, so the
+        # connection layer only needs redrawing when either of those changes
+        # (a new best agent or a new generation, once the easing has settled)
+        colors = [w > 0 for w in self.current_weights]
+        thicknesses = [np.clip(np.abs((w * 3).astype(int)), 1, self.max_weight_thickness)
+                       for w in self.current_weights]
+        connection_key = b"".join(c.tobytes() + t.tobytes() for c, t in zip(colors, thicknesses))
+        if connection_key != self.connection_key:
+            self.connection_surface = self.render_connections(self.layer_positions, colors, thicknesses)
+            self.connection_key = connection_key
+        
+        screen.blit(self.connection_surface, (self.x, self.y))
         
         # Draw nodes
         for i, layer in enumerate(self.current_activations):
@@ -142,23 +171,24 @@ class NeuralNetworkVisualizer:
                 color = (color_r, color_g, color_b)
                 
                 # Draw the node
-                pos = layer_positions[i][j]
+                node_x, node_y = self.layer_positions[i][j]
+                pos = (self.x + node_x, self.y + node_y)
                 pygame.draw.circle(screen, color, pos, self.node_radius)
                 
                 # Draw node outline
                 pygame.draw.circle(screen, (120, 120, 120), pos, self.node_radius, 1)
                 
-                # Draw activation value text
-                text = self.font.render(f"{activation:.2f}", True, (240, 240, 240))
+                # Draw activation value text (cached by its rounded string)
+                text = self.text_cache.render(f"{activation:.2f}", (240, 240, 240))
                 text_rect = text.get_rect(center=pos)
                 screen.blit(text, text_rect)
                 
                 # Add labels for input and output layers
                 if i == 0:  # Input layer
                     if j < len(self.input_labels):
-                        label = self.font.render(self.input_labels[j], True, self.text_color)
+                        label = self.text_cache.render(self.input_labels[j], self.text_color)
                         screen.blit(label, (pos[0] - label.get_width() - 5, pos[1] - 8))
                 elif i == len(self.current_activations) - 1:  # Output layer
                     if j < len(self.output_labels):
-                        label = self.font.render(self.output_labels[j], True, self.text_color)
-                        screen.blit(label, (pos[0] + self.node_radius + 5, pos[1] - 8))
\ No newline at end of file
+                        label = self.text_cache.render(self.output_labels[j], self.text_color)
+                        screen.blit(label, (pos[0] + self.node_radius + 5, pos[1] - 8))
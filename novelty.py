@@ -0,0 +1,175 @@
+"""
+Novelty search: reward agents for behaving differently, not only for eating.
+
+Each agent's behaviour is summarised by a descriptor in [0, 1]^4: where it
+ended up (x, y), how much of the world it covered (share of COVERAGE_BINS^2
+cells visited) and how much it ate (food / (food + 5)). Its novelty is the
+mean distance to the k nearest descriptors among the rest of the population
+and an archive of earlier behaviours. BehaviourArchive answers those
+queries from a uniform grid over the descriptor space, for the archive and
+for the generation being scored, so scoring stays fast as the archive grows
+to max_size entries and the population to hundreds of thousands.
+"""
+import itertools
+import numpy as np
+
+COVERAGE_BINS = 10
+DESCRIPTOR_SIZE = 4
+
+
+class BehaviourArchive:
+    """Descriptors in [0, 1]^dims with k-nearest-neighbour queries. Points are
+    kept sorted by grid cell, so a query looks up rings of cells around it
+    with searchsorted, widening until no unmeasured point can be nearer than
+    its k-th nearest. Small archives are measured by brute force."""
+    def __init__(self, dims=DESCRIPTOR_SIZE, max_size=100_000, bins=10, brute_force_below=2048):
+        self.dims = dims
+        self.max_size = max_size
+        self.bins = bins
+        self.brute_force_below = brute_force_below
+        self.points = np.empty((max_size, dims))
+        self.size = 0
+        self.strides = bins ** np.arange(dims, dtype=np.int64)
+        self.order = np.zeros(0, dtype=np.int64)  # Point indices sorted by cell
+        self.sorted_cells = np.zeros(0, dtype=np.int64)
+        self.rings = {}
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return self.points.nbytes + self.order.nbytes + self.sorted_cells.nbytes
+
+    def cells(self, points):
+        return np.clip((points * self.bins).astype(np.int64), 0, self.bins - 1)
+
+    def add(self, points, rng=np.random):
+        """Append descriptors; once full, they overwrite random older entries"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, self.dims)
+        room = min(len(points), self.max_size - self.size)
+        self.points[self.size:self.size + room] = points[:room]
+        self.size += room
+        if room < len(points):
+            self.points[rng.randint(0, self.size, len(points) - room)] = points[room:]
+
+        cell_ids = self.cells(self.points[:self.size]) @ self.strides
+        self.order = np.argsort(cell_ids, kind='stable')
+        self.sorted_cells = cell_ids[self.order]
+
+    def ring(self, cell, low, high, radius):
+        """Cells of the grid exactly radius cells (largest coordinate) from cell;
+        low and high bound the box they lie in"""
+        if 2 * radius + 1 < self.bins:
+            # Small rings: cached offsets, clipped to the grid
+            if radius not in self.rings:
+                axes = np.meshgrid(*[np.arange(-radius, radius + 1)] * self.dims, indexing='ij')
+                offsets = np.stack([axis.ravel() for axis in axes], axis=1)
+                self.rings[radius] = offsets[np.abs(offsets).max(axis=1) == radius]
+            cells = cell + self.rings[radius]
+            return cells[((cells >= 0) & (cells < self.bins)).all(axis=1)]
+
+        # Wide rings: the clipped box has fewer cells than the offsets
+        axes = np.meshgrid(*[np.arange(lo, hi + 1) for lo, hi in zip(low, high)], indexing='ij')
+        cells = np.stack([axis.ravel() for axis in axes], axis=1)
+        return cells[np.abs(cells - cell).max(axis=1) == radius]
+
+    def nearest(self, query, k):
+        """Distances from query to its k nearest archived descriptors, ascending"""
+        k = min(k, self.size)
+        if k == 0:
+            return np.zeros(0)
+        if self.size < self.brute_force_below:
+            return self.brute_force(query, k)
+
+        cell = self.cells(query[None, :])[0]
+        found = []
+        count = 0
+        # Widen until the bound holds; once the box reaches every edge of the
+        # grid all points are measured and it always does
+        for radius in itertools.count():
+            low = np.maximum(cell - radius, 0)
+            high = np.minimum(cell + radius, self.bins - 1)
+            ids = self.ring(cell, low, high, radius) @ self.strides
+            starts = np.searchsorted(self.sorted_cells, ids, side='left')
+            ends = np.searchsorted(self.sorted_cells, ids, side='right')
+            lengths = ends - starts
+            total = int(lengths.sum())
+            if total:
+                # Concatenate the [start, end) ranges without a Python loop
+                offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+                points = self.points[self.order[offsets]]
+                found.append(np.sqrt(((points - query) ** 2).sum(axis=1)))
+                count += total
+
+            # Every point not measured yet lies beyond a face of the box that
+            # isn't a grid edge, so at least the distance to that face away
+            if count >= k:
+                distances = np.concatenate(found)
+                nearest = np.partition(distances, k - 1)[:k]
+                gaps = np.concatenate(((query - low / self.bins)[low > 0],
+                                       ((high + 1) / self.bins - query)[high < self.bins - 1]))
+                if len(gaps) == 0 or nearest.max() <= gaps.min():
+                    return np.sort(nearest)
+
+    def brute_force(self, query, k):
+        distances = np.sqrt(((self.points[:self.size] - query) ** 2).sum(axis=1))
+        return np.sort(np.partition(distances, k - 1)[:k])
+
+
+class NoveltySearch:
+    """Behaviour tracking for one population and novelty scoring against a
+    shared archive. Call start_generation() when the agents change,
+    record() every tick, and score() at the end of the generation."""
+    def __init__(self, width, height, k=15, archive_per_generation=5, max_archive=100_000):
+        self.width = width
+        self.height = height
+        self.k = k
+        self.archive_per_generation = archive_per_generation
+        self.archive = BehaviourArchive(max_size=max_archive)
+        self.visited = np.zeros((0, COVERAGE_BINS * COVERAGE_BINS), dtype=bool)
+
+    def start_generation(self, entries):
+        self.visited = np.zeros((entries, COVERAGE_BINS * COVERAGE_BINS), dtype=bool)
+
+    def record(self, positions, alive):
+        """Mark the coverage cells the living agents are in; positions is (entries, 2)"""
+        cell_x = np.clip((positions[:, 0] * (COVERAGE_BINS / self.width)).astype(np.int64), 0, COVERAGE_BINS - 1)
+        cell_y = np.clip((positions[:, 1] * (COVERAGE_BINS / self.height)).astype(np.int64), 0, COVERAGE_BINS - 1)
+        rows = np.flatnonzero(alive)
+        self.visited[rows, cell_y[rows] * COVERAGE_BINS + cell_x[rows]] = True
+
+    def descriptors(self, x, y, food_eaten):
+        """(agents, 4) descriptors from final positions and food counts;
+        coverage comes from the first len(x) tracked entries"""
+        count = len(x)
+        food_eaten = np.asarray(food_eaten, dtype=np.float64)
+        return np.column_stack((
+            np.clip(np.asarray(x) / self.width, 0, 1),
+            np.clip(np.asarray(y) / self.height, 0, 1),
+            self.visited[:count].mean(axis=1) if count else np.zeros(0),
+            food_eaten / (food_eaten + 5)
+        ))
+
+    def score(self, descriptors):
+        """Novelty of each descriptor: mean distance to its k nearest among
+        the other descriptors and the archive. The most novel are archived."""
+        count = len(descriptors)
+        if count == 0:
+            return np.zeros(0)
+        # The generation's own descriptors get a grid too, rather than a
+        # count x count distance matrix; each one finds itself at distance 0
+        population = BehaviourArchive(self.archive.dims, max_size=count, bins=self.archive.bins,
+                                      brute_force_below=self.archive.brute_force_below)
+        population.add(descriptors)
+
+        novelty = np.zeros(count)
+        for i in range(count):
+            candidates = np.concatenate((population.nearest(descriptors[i], self.k + 1)[1:],
+                                         self.archive.nearest(descriptors[i], self.k)))
+            k = min(self.k, len(candidates))
+            novelty[i] = np.partition(candidates, k - 1)[:k].mean() if k else 0.0
+
+        most_novel = np.argsort(novelty, kind='stable')[::-1][:self.archive_per_generation]
+        self.archive.add(descriptors[most_novel])
+        return novelty
@@ -0,0 +1,239 @@
+"""
+Serve evolved brains outside the simulation.
+
+The best brain seen so far (the champion) is exported as an .npz file with
+its layer sizes and float32 genome, or an int8 one with per-tensor scales
+(encoding='int8', see precision.py); load_policy() turns either back into a
+NeuralNetwork. PolicyServer answers batches of [distance, angle, energy]
+observations with actions (0 turn left, 1 turn right, 2 move forward) from
+float32 weights that are swapped in whole when a new champion appears, and
+MicroBatcher merges concurrent requests into one forward pass.
+"""
+import os
+import threading
+import time
+import numpy as np
+from neural_network import NeuralNetwork
+from precision import dequantize, quantize
+
+ACTIONS = ('left', 'right', 'forward')
+
+
+def save_policy(path, weights, encoding='float32'):
+    """Write PolicyWeights to path, replacing it atomically"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        weights.save(f, encoding)
+    os.replace(temp_path, path)
+
+
+def load_policy(path):
+    """(NeuralNetwork, generation, fitness) from an exported policy file"""
+    weights = PolicyWeights.load(path)
+    return weights.network(), weights.generation, weights.fitness
+
+
+class PolicyWeights:
+    """Immutable float32 weights of one champion, ready for batched inference"""
+    def __init__(self, layer_sizes, genome, generation=0, fitness=0.0):
+        self.layer_sizes = [int(size) for size in layer_sizes]
+        self.generation = generation
+        self.fitness = fitness
+        genome = np.asarray(genome, dtype=np.float32)
+        self.genome = genome
+
+        self.layers = []
+        offset = 0
+        for n_in, n_out in zip(self.layer_sizes, self.layer_sizes[1:]):
+            weights = genome[offset:offset + n_in * n_out].reshape(n_in, n_out)
+            offset += n_in * n_out
+            biases = genome[offset:offset + n_out]
+            offset += n_out
+            self.layers.append((weights, biases))
+        if offset != genome.size:
+            raise ValueError(f"Genome has {genome.size} values, expected {offset}")
+
+    @classmethod
+    def from_network(cls, network, generation=0, fitness=0.0):
+        return cls(network.layer_sizes, network.get_genome(np.float32), generation, fitness)
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file) as data:
+            if 'scales' in data:
+                genome = dequantize(data['genome'][None, :], data['scales'][None, :], data['layer_sizes'])[0]
+            else:
+                genome = data['genome']
+            return cls(data['layer_sizes'], genome, int(data['generation']), float(data['fitness']))
+
+    def save(self, file, encoding='float32'):
+        """.npz with layer_sizes, the genome, generation and fitness; with
+        encoding='int8' the genome is int8 and scales holds a float32 scale
+        per weight and bias tensor"""
+        arrays = {'genome': self.genome}
+        if encoding == 'int8':
+            values, scales = quantize(self.genome, self.layer_sizes)
+            arrays = {'genome': values[0], 'scales': scales[0]}
+        elif encoding != 'float32':
+            raise ValueError(f"Unknown genome encoding {encoding!r}, expected 'float32' or 'int8'")
+        np.savez(file, layer_sizes=np.array(self.layer_sizes, dtype=np.int64), generation=self.generation,
+                 fitness=self.fitness, **arrays)
+
+    def network(self):
+        return NeuralNetwork.from_genome(self.layer_sizes, self.genome)
+
+    def forward(self, observations):
+        """Output activations for an (n, inputs) float32 array"""
+        a = observations
+        for weights, biases in self.layers:
+            a = a @ weights
+            a += biases
+            np.negative(a, out=a)
+            np.exp(a, out=a)
+            a += 1.0
+            np.reciprocal(a, out=a)
+        return a
+
+    def describe(self):
+        return {'generation': self.generation, 'fitness': self.fitness, 'layer_sizes': self.layer_sizes}
+
+
+class PolicyServer:
+    """The current champion's weights. set() swaps them in one assignment,
+    so a forward pass that already holds the old weights finishes with them.
+    With a path, a newer file written by another process is picked up,
+    checking its modification time at most every reload_interval seconds."""
+    def __init__(self, path=None, reload_interval=1.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.weights = None
+        self.loaded_mtime = None
+        self.next_check = 0.0
+        self.lock = threading.Lock()
+
+    def set(self, weights):
+        self.weights = weights
+
+    def current(self):
+        """The latest weights, or None before the first champion"""
+        if self.path is not None and time.monotonic() >= self.next_check:
+            with self.lock:
+                if time.monotonic() >= self.next_check:
+                    self.next_check = time.monotonic() + self.reload_interval
+                    self.reload()
+        return self.weights
+
+    def reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self.loaded_mtime:
+            self.weights = PolicyWeights.load(self.path)
+            self.loaded_mtime = mtime
+
+
+class ChampionTracker:
+    """Generation-end hook that keeps the fittest brain seen so far, saving it
+    to path (in the given encoding) and/or handing it to a PolicyServer
+    whenever it improves"""
+    def __init__(self, path=None, server=None, encoding='float32'):
+        self.path = path
+        self.server = server
+        self.encoding = encoding
+        self.fitness = None
+
+    def __call__(self, simulation):
+        population = simulation.population
+        fitnesses = population.get_fitnesses()
+        if not fitnesses:
+            return
+        best = int(np.argmax(fitnesses))
+        if self.fitness is not None and fitnesses[best] <= self.fitness:
+            return
+
+        self.fitness = float(fitnesses[best])
+        weights = PolicyWeights.from_network(population.agents[best].brain, simulation.generation, self.fitness)
+        if self.path:
+            save_policy(self.path, weights, self.encoding)
+        if self.server is not None:
+            self.server.set(weights)
+
+
+class MicroBatcher:
+    """Runs concurrent inference requests as one forward pass. The first
+    request to arrive while others are in flight waits up to window seconds
+    for more, then computes the whole batch for everyone; a request that
+    arrives alone is computed straight away."""
+    def __init__(self, window=0.002, max_batch=4096):
+        self.window = window
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.pending = []
+        self.pending_rows = 0
+        self.leading = False
+        self.in_flight = 0
+        self.full = threading.Event()
+
+    def run(self, weights, observations):
+        """Outputs for observations, computed with weights (or with the weights
+        of the batch this request joins)"""
+        request = _Request(observations)
+        with self.lock:
+            self.in_flight += 1
+            self.pending.append(request)
+            self.pending_rows += len(observations)
+            lead = not self.leading
+            if lead:
+                self.leading = True
+                self.full.clear()
+            elif self.pending_rows >= self.max_batch:
+                self.full.set()
+            others = self.in_flight > 1
+
+        try:
+            if not lead:
+                request.done.wait()
+            else:
+                if others:
+                    self.full.wait(self.window)
+                with self.lock:
+                    batch = self.pending
+                    self.pending = []
+                    self.pending_rows = 0
+                    self.leading = False
+                self.compute(weights, batch)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+        if request.error is not None:
+            raise request.error
+        return request.outputs
+
+    def compute(self, weights, batch):
+        try:
+            if len(batch) == 1:
+                batch[0].outputs = weights.forward(batch[0].observations)
+            else:
+                outputs = weights.forward(np.concatenate([request.observations for request in batch]))
+                offset = 0
+                for request in batch:
+                    request.outputs = outputs[offset:offset + len(request.observations)]
+                    offset += len(request.observations)
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        finally:
+            for request in batch:
+                request.done.set()
+
+
+class _Request:
+    __slots__ = ('observations', 'outputs', 'error', 'done')
+
+    def __init__(self, observations):
+        self.observations = observations
+        self.outputs = None
+        self.error = None
+        self.done = threading.Event()
@@ -1,11 +1,101 @@
+import heapq
+import os
 import random
+import sys
 import numpy as np
+import kernels
 from agent import Agent
+from interactions import SENSE_INPUTS, interact, parse_interactions
+from food import Food
+from neural_network import NeuralNetwork
+from novelty import NoveltySearch
+from precision import resolve_precision
+
+# 'python' steps each Agent object; 'numpy' and 'numba' run fused kernels over
+# structure-of-arrays state (see kernels.py). The batched backends pre-draw
+# their randoms, so numpy and numba give identical seeded runs, while 'python'
+# follows a different random sequence and diverges from them.
+DEFAULT_BACKEND = os.environ.get('SIMULATION_BACKEND', 'python')
+
+# Agent-agent interactions, e.g. AGENT_INTERACTIONS=separation,sense (see interactions.py)
+DEFAULT_INTERACTIONS = os.environ.get('AGENT_INTERACTIONS', '')
+
+# Brain weight precision, e.g. GENOME_PRECISION=float32 (see precision.py)
+DEFAULT_PRECISION = os.environ.get('GENOME_PRECISION', 'float64')
+
+# How per-arena fitnesses combine into one fitness per agent
+ARENA_FITNESS = {
+    'mean': np.mean,
+    'min': np.min
+}
+
+# What evolve() selects on: fitness, behavioural novelty (see novelty.py), or
+# a weighted mix of both
+OBJECTIVES = ('fitness', 'novelty', 'mixed')
 
 class Population:
-    def __init__(self, size, environment):
+    def __init__(self, size, environment, stuck_window=20, stuck_threshold=10, stuck_patience=5,
+                 backend=None, sync_agents=True, crossover_rate=0.7, mutation_rate=0.1,
+                 mutation_scale=0.2, elite_count=1, arenas=1, arena_fitness='mean',
+                 objective='fitness', novelty_weight=0.5, novelty_k=15, interactions=None,
+                 precision=None):
         self.size = size
         self.environment = environment
+        
+        # Evolution settings: chance a child mixes both parents, per-weight
+        # mutation chance and size, and how many of the best carry over unchanged
+        self.crossover_rate = crossover_rate
+        self.mutation_rate = mutation_rate
+        self.mutation_scale = mutation_scale
+        self.elite_count = elite_count
+        
+        # With a batched backend the arrays are the source of truth during a
+        # generation; sync_agents=False skips copying them back into the Agent
+        # objects every step (for headless runs, call sync_agents() when needed)
+        self.backend = kernels.resolve_backend(backend or DEFAULT_BACKEND)
+        self.sync_agents_each_step = sync_agents
+        self.batch = None
+        
+        # Multi-episode evaluation: every genome runs in arenas independent
+        # arenas (own start positions and food) stepped together, and its
+        # fitness is the mean or min over them. The FoodField passed to step()
+        # holds every arena's food; arena 0 is the one shown, the others only
+        # exist as arrays.
+        if arenas < 1:
+            raise ValueError(f"arenas must be at least 1, got {arenas}")
+        if arena_fitness not in ARENA_FITNESS:
+            raise ValueError(f"Unknown arena_fitness {arena_fitness!r}, expected one of {tuple(ARENA_FITNESS)}")
+        if arenas > 1 and self.backend == 'python':
+            print("Multiple arenas need a batched backend, using the numpy backend")
+            self.backend = 'numpy'
+        self.arenas = arenas
+        self.arena_fitness = arena_fitness
+        
+        # Novelty search keeps a behaviour archive across generations; in
+        # 'mixed' mode novelty_weight is the share of novelty in the score
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective {objective!r}, expected one of {OBJECTIVES}")
+        self.objective = objective
+        self.novelty_weight = novelty_weight
+        self.novelty = None
+        if objective != 'fitness':
+            self.novelty = NoveltySearch(environment.width, environment.height, k=novelty_k)
+        
+        # Separation and sensing of other agents; sensing adds brain inputs
+        self.interactions = parse_interactions(DEFAULT_INTERACTIONS if interactions is None else interactions)
+        self.brain_inputs = kernels.BASE_INPUTS + (SENSE_INPUTS if 'sense' in self.interactions else 0)
+        
+        # float32 brains halve the weight memory; forward passes and mutation
+        # stay in that dtype, and children inherit it from their parents
+        self.dtype = resolve_precision(precision or DEFAULT_PRECISION)
+        
+        # An agent is stuck once its positions over the last stuck_window ticks
+        # have stayed within stuck_threshold pixels (on both axes) for more
+        # than stuck_patience consecutive ticks
+        self.stuck_window = stuck_window
+        self.stuck_threshold = stuck_threshold
+        self.stuck_patience = stuck_patience
+        
         self.agents = []
         self.initialize_population()
     
@@ -17,28 +107,351 @@ class Population:
         for _ in range(self.size):
             x = random.uniform(margin, self.environment.width - margin)
             y = random.uniform(margin, self.environment.height - margin)
-            self.agents.append(Agent(x, y, self.environment))
+            self.agents.append(Agent(x, y, brain_inputs=self.brain_inputs, brain_dtype=self.dtype))
+        
+        self.reset_stats()
+    
+    def reset_stuck_tracking(self):
+        """Clear the position history ring buffer used for stuck detection"""
+        count = len(self.agents) * (self.arenas if self.backend != 'python' else 1)
+        # Stored window-major so the rolling min/max reduce over contiguous rows
+        self.position_history = np.zeros((self.stuck_window, count, 2))
+        self.history_head = 0
+        self.history_ticks = 0
+        self.stuck_counters = np.zeros(count, dtype=np.int32)
+        self.stuck_flags = np.zeros(count, dtype=bool)
+        self.stuck_flags[:len(self.agents)] = [agent.is_stuck for agent in self.agents]
+        
+        # The python backend fills these in update() as it moves the agents
+        self.agent_positions = np.array([(agent.position_x, agent.position_y) for agent in self.agents],
+                                        dtype=np.float64).reshape(len(self.agents), 2)
+        self.agent_alive = np.array([agent.alive for agent in self.agents], dtype=bool)
+    
+    def update_stuck(self):
+        """Record every agent's position and update is_stuck for all agents at once"""
+        count = len(self.agents)
+        if count == 0:
+            return
+        
+        if self.batch is not None:
+            positions = np.column_stack((self.batch.x, self.batch.y))
+            alive = self.batch.alive
+        else:
+            positions = self.agent_positions
+            alive = self.agent_alive
+        
+        if self.novelty is not None:
+            self.novelty.record(positions, alive)
+        
+        # Overwrite the oldest slot of the ring buffer
+        self.position_history[self.history_head] = positions
+        self.history_head = (self.history_head + 1) % self.stuck_window
+        self.history_ticks += 1
+        if self.history_ticks <= self.stuck_window:
+            return  # Not a full window yet
+        
+        # Check if position hasn't changed significantly over the window
+        extent = self.position_history.max(axis=0) - self.position_history.min(axis=0)
+        still = (extent < self.stuck_threshold).all(axis=1) & alive
+        self.stuck_counters = np.where(still, self.stuck_counters + 1, 0)
+        stuck = still & (self.stuck_counters > self.stuck_patience)
+        
+        # Only touch the agents whose state flipped
+        if self.batch is None:
+            for i in np.flatnonzero((stuck != self.stuck_flags) & alive):
+                self.agents[i].is_stuck = bool(stuck[i])
+        self.stuck_flags = np.where(alive, stuck, self.stuck_flags)
+        if self.batch is not None:
+            self.batch.is_stuck[:] = self.stuck_flags
+        self.stuck_count = int(np.count_nonzero(stuck))
+    
+    def reset_stats(self):
+        """Recompute the running statistics from scratch (after the agents are replaced)"""
+        self.alive_count = sum(1 for agent in self.agents if agent.alive)
+        self.stuck_count = sum(1 for agent in self.agents if agent.alive and agent.is_stuck)
+        self.max_fitness = max((agent.get_fitness() for agent in self.agents), default=0)
+        self.food_eaten = sum(agent.food_eaten for agent in self.agents)
+        
+        # Max-heap of (-fitness, index); entries for dead agents or outdated
+        # fitness are discarded lazily when they reach the top
+        self.best_heap = [(-agent.get_fitness(), i) for i, agent in enumerate(self.agents)]
+        heapq.heapify(self.best_heap)
+        
+        self.reset_stuck_tracking()
+        if self.novelty is not None:
+            self.novelty.start_generation(len(self.stuck_flags))
+        
+        # Batched backends work on arrays gathered once per generation
+        if self.backend != 'python':
+            self.batch = kernels.BatchState(self.agents, self.arenas, self.brain_inputs)
+            if self.arenas > 1:
+                self.scatter_arenas()
+    
+    def scatter_arenas(self):
+        """Give the agents in arenas 1.. their own random start positions and headings"""
+        count = len(self.agents) * (self.arenas - 1)
+        margin = 50
+        start = len(self.agents)
+        self.batch.x[start:] = np.random.uniform(margin, self.environment.width - margin, count)
+        self.batch.y[start:] = np.random.uniform(margin, self.environment.height - margin, count)
+        self.batch.direction[start:] = np.random.uniform(0, 2 * np.pi, count)
+    
+    def step(self, foods, dt, energy_gain=50):
+        """Advance every agent by one tick and let them eat from a FoodField"""
+        if self.batch is None:
+            self.update(foods, dt)
+            self.handle_food_collisions(foods, energy_gain)
+            return
+        
+        self.update_stuck()
+        
+        if self.interactions:
+            batch = self.batch
+            interact(batch.x, batch.y, batch.direction, batch.alive, np.arange(len(batch.x)) // batch.agent_count,
+                     self.arenas, Agent.radius, Agent.vision_radius, self.environment.width,
+                     self.environment.height, 'separation' in self.interactions,
+                     batch.sense if 'sense' in self.interactions else None)
+        
+        # The kernels update the field's arrays in place and move eaten food
+        # to the next positions of its respawn pool
+        randoms = (kernels.draw_randoms(len(self.batch.x)),) + foods.respawn_pool(self.respawn_pool_size())
+        params = kernels.StepParams(Agent, Food.radius, self.environment.width, self.environment.height,
+                                    dt, energy_gain)
+        _, eaten = kernels.STEP_FUNCTIONS[self.backend](self.batch, foods.x, foods.y, randoms, params)
+        foods.consume(eaten)
+        
+        # A target that was just eaten has moved to its respawn position
+        if len(eaten):
+            batch = self.batch
+            targeted = batch.target >= 0
+            arena_start = np.arange(len(batch.target)) // batch.agent_count * len(foods)
+            batch.target[targeted & np.isin(batch.target + arena_start, eaten)] = -1
+        
+        # Statistics straight from the arrays; an agent counts as alive (or
+        # stuck) while it is in any arena
+        batch = self.batch
+        self.alive_count = int(np.count_nonzero(batch.per_arena(batch.alive).any(axis=0)))
+        self.stuck_count = int(np.count_nonzero(batch.per_arena(batch.is_stuck & batch.alive).any(axis=0)))
+        if len(self.agents):
+            self.max_fitness = max(self.max_fitness, self.batch_fitnesses().max().item())
+        self.food_eaten = int(batch.food_eaten.sum())
+        
+        if self.sync_agents_each_step:
+            self.sync_agents(foods)
+    
+    def sync_agents(self, foods=None):
+        """Copy batched state back into the Agent objects (for drawing, recording, evolving)"""
+        if self.batch is None:
+            return
+        
+        # Arena 0 is the first len(agents) entries
+        batch = self.batch
+        count = len(self.agents)
+        columns = zip(self.agents, batch.x[:count].tolist(), batch.y[:count].tolist(),
+                      batch.direction[:count].tolist(), batch.energy[:count].tolist(),
+                      batch.food_eaten[:count].tolist(), batch.alive[:count].tolist(),
+                      batch.is_stuck[:count].tolist(), batch.target[:count].tolist())
+        for i, (agent, x, y, direction, energy, food_eaten, alive, is_stuck, target) in enumerate(columns):
+            agent.position_x = x
+            agent.position_y = y
+            agent.direction = direction
+            agent.energy = energy
+            agent.food_eaten = food_eaten
+            agent.alive = alive
+            agent.is_stuck = is_stuck
+            agent.target_food = foods[target] if foods is not None and target >= 0 else None
+            agent.last_inputs = batch.inputs[i]
+            agent.last_outputs = batch.outputs[i]
+        
+        # Hidden-layer activations are only needed for the visualized agent
+        best_agent = self.get_best_agent()
+        if best_agent is not None and best_agent.alive:
+            best_agent.brain.forward(best_agent.last_inputs)
+    
+    def respawn_pool_size(self):
+        """Respawn positions handed to one step; more meals than this reuse them"""
+        return 8 * len(self.agents) * self.arenas + 64
     
     def update(self, foods, dt):
         """Update all agents in the population"""
+        self.update_stuck()
+        sense = self.interact_agents()
+        
+        # Agent objects look at Food snapshots of the food that is out
+        items = foods.items()
+        for i, agent in enumerate(self.agents):
+            if not agent.alive:
+                continue
+            
+            agent.update(items, dt, self.environment, sense[i].tolist())
+            self.agent_positions[i] = agent.position_x, agent.position_y
+            
+            # Keep the counters in step with deaths
+            if not agent.alive:
+                self.agent_alive[i] = False
+                self.alive_count -= 1
+                if agent.is_stuck:
+                    self.stuck_count -= 1
+    
+    def interact_agents(self):
+        """Separate and sense the Agent objects (python backend); returns
+        each agent's extra brain inputs"""
+        count = len(self.agents)
+        sense = np.zeros((count, self.brain_inputs - kernels.BASE_INPUTS))
+        if not self.interactions or count == 0:
+            return sense
+        
+        state = np.array([(agent.position_x, agent.position_y, agent.direction, agent.alive)
+                          for agent in self.agents], dtype=np.float64)
+        x = state[:, 0].copy()
+        y = state[:, 1].copy()
+        interact(x, y, state[:, 2], state[:, 3] > 0, np.zeros(count, dtype=np.int64), 1, Agent.radius,
+                 Agent.vision_radius, self.environment.width, self.environment.height,
+                 'separation' in self.interactions, sense if 'sense' in self.interactions else None)
+        for i in np.flatnonzero((x != state[:, 0]) | (y != state[:, 1])).tolist():
+            self.agents[i].position_x = x[i]
+            self.agents[i].position_y = y[i]
+        return sense
+    
+    def handle_food_collisions(self, foods, energy_gain=50):
+        """Let agents eat the food they touch; eaten food moves to the next
+        position of the field's respawn pool"""
+        reach = Agent.radius + Food.radius
+        pool_x, pool_y = foods.respawn_pool(self.respawn_pool_size())
+        eaten = []
+        for i, agent in enumerate(self.agents):
+            if agent.alive:
+                touching = np.sqrt((foods.x - agent.position_x)**2 + (foods.y - agent.position_y)**2) < reach
+                for food in np.flatnonzero(touching).tolist():
+                    # Agent eats food
+                    agent.energy += energy_gain
+                    agent.food_eaten += 1
+                    self.food_eaten += 1
+                    self.record_fitness(i)
+                    
+                    foods.x[food] = pool_x[len(eaten) % len(pool_x)]
+                    foods.y[food] = pool_y[len(eaten) % len(pool_y)]
+                    eaten.append(food)
+        foods.consume(np.array(eaten, dtype=np.int64))
+    
+    def record_fitness(self, index):
+        """Register a fitness increase of the agent at index"""
+        fitness = self.agents[index].get_fitness()
+        self.max_fitness = max(self.max_fitness, fitness)
+        heapq.heappush(self.best_heap, (-fitness, index))
+    
+    def get_stats(self):
+        """Cheap snapshot of the running population statistics"""
+        return {
+            'alive_count': self.alive_count,
+            'stuck_count': self.stuck_count,
+            'max_fitness': self.max_fitness,
+            'food_eaten': self.food_eaten,
+            'all_dead': self.alive_count == 0,
+            'size': len(self.agents)
+        }
+    
+    def batch_fitnesses(self):
+        """Fitness array of the batched agents, combined over the arenas"""
+        per_arena = Agent.fitness_per_food * self.batch.per_arena(self.batch.food_eaten)
+        if self.arenas == 1:
+            return per_arena[0]
+        return ARENA_FITNESS[self.arena_fitness](per_arena, axis=0)
+    
+    def memory_bytes(self):
+        """Approximate bytes held by the agents, their brains and the population's arrays"""
+        total = self.position_history.nbytes + self.stuck_counters.nbytes + self.stuck_flags.nbytes
         for agent in self.agents:
-            agent.update(foods, dt)
+            brain = agent.brain
+            total += sys.getsizeof(agent) + sum(array.nbytes for array in brain.weights + brain.biases + (brain.last_activations or []))
+        if self.batch is not None:
+            total += sum(value.nbytes for value in vars(self.batch).values() if isinstance(value, np.ndarray))
+        if self.novelty is not None:
+            total += self.novelty.archive.nbytes + self.novelty.visited.nbytes
+        return total
+    
+    def positions(self):
+        """x, y and alive arrays of the agents (arena 0)"""
+        count = len(self.agents)
+        if self.batch is not None:
+            return self.batch.x[:count], self.batch.y[:count], self.batch.alive[:count]
+        state = np.array([(agent.position_x, agent.position_y, agent.alive) for agent in self.agents],
+                         dtype=np.float64).reshape(count, 3)
+        return state[:, 0], state[:, 1], state[:, 2] > 0
+    
+    def get_fitnesses(self):
+        """Current fitness of every agent, in population order"""
+        if self.batch is not None:
+            return self.batch_fitnesses().tolist()
+        return [agent.get_fitness() for agent in self.agents]
     
     def get_best_agent(self):
-        """Get the agent with the highest fitness"""
+        """Get the living agent with the highest fitness"""
         if not self.agents:
             return None
-            
-        living_agents = [agent for agent in self.agents if agent.alive]
-        if not living_agents:
-            return self.agents[0]  # Return any agent if none are alive
-            
-        return max(living_agents, key=lambda agent: agent.get_fitness())
+        
+        if self.batch is not None:
+            alive = self.batch.per_arena(self.batch.alive).any(axis=0)
+            if not alive.any():
+                return self.agents[0]
+            return self.agents[int(np.argmax(np.where(alive, self.batch_fitnesses(), -1)))]
+        
+        while self.best_heap:
+            neg_fitness, index = self.best_heap[0]
+            agent = self.agents[index]
+            if agent.alive and agent.get_fitness() == -neg_fitness:
+                return agent
+            heapq.heappop(self.best_heap)
+        
+        return self.agents[0]  # Return any agent if none are alive
+    
+    def get_genomes(self, indices):
+        """float32 genomes of the agents at indices, one row each"""
+        return np.array([self.agents[i].brain.get_genome(np.float32) for i in indices],
+                        dtype=np.float32).reshape(len(indices), -1)
     
-    def evolve(self):
-        """Evolve the population for the next generation"""
+    def add_immigrants(self, genomes):
+        """Replace the last agents (never the elites at the front) with new
+        ones carrying the given genomes, e.g. migrants from another population"""
+        if not self.agents:
+            return
+        layer_sizes = self.agents[0].brain.layer_sizes
+        count = min(len(genomes), len(self.agents) - self.elite_count)
+        for i in range(count):
+            x = random.uniform(50, self.environment.width - 50)
+            y = random.uniform(50, self.environment.height - 50)
+            self.agents[len(self.agents) - 1 - i] = Agent(x, y, NeuralNetwork.from_genome(layer_sizes, genomes[i], self.dtype))
+        self.reset_stats()
+    
+    def selection_scores(self, fitnesses):
+        """Novelty of every agent's behaviour this generation (arena 0), or its
+        mix with fitness, each scaled to [0, 1]; unlike fitness, novelty is
+        non-zero even before any agent has eaten"""
+        descriptors = self.novelty.descriptors([agent.position_x for agent in self.agents],
+                                               [agent.position_y for agent in self.agents],
+                                               [agent.food_eaten for agent in self.agents])
+        novelty = self.novelty.score(descriptors)
+        if self.objective == 'novelty':
+            return novelty.tolist()
+        
+        fitnesses = np.asarray(fitnesses, dtype=np.float64)
+        scaled_fitness = fitnesses / fitnesses.max() if fitnesses.max() > 0 else fitnesses * 0
+        scaled_novelty = novelty / novelty.max() if novelty.max() > 0 else novelty
+        return ((1 - self.novelty_weight) * scaled_fitness + self.novelty_weight * scaled_novelty).tolist()
+    
+    def evolve(self, fitnesses=None):
+        """Evolve the population for the next generation; fitnesses overrides
+        the agents' own (e.g. when they were evaluated elsewhere, which also
+        skips novelty scoring)"""
+        self.sync_agents()
+        
         # Calculate fitness for all agents
-        fitnesses = [agent.get_fitness() for agent in self.agents]
+        if fitnesses is None:
+            fitnesses = self.get_fitnesses()
+            if self.novelty is not None:
+                fitnesses = self.selection_scores(fitnesses)
+        else:
+            fitnesses = list(fitnesses)
         
         # Check if any agent has fitness (avoid division by zero)
         if sum(fitnesses) == 0:
@@ -49,20 +462,20 @@ class Population:
         # Create new population
         new_agents = []
         
-        # Keep the best agent (elitism)
-        best_agent = self.agents[np.argmax(fitnesses)]
-        new_agents.append(Agent(
-            random.uniform(50, self.environment.width - 50),
-            random.uniform(50, self.environment.height - 50),
-            self.environment,
-            best_agent.brain
-        ))
+        # Keep the best agents (elitism); ties go to the earlier agent
+        ranking = sorted(range(len(self.agents)), key=lambda i: fitnesses[i], reverse=True)
+        for index in ranking[:self.elite_count]:
+            new_agents.append(Agent(
+                random.uniform(50, self.environment.width - 50),
+                random.uniform(50, self.environment.height - 50),
+                self.agents[index].brain
+            ))
         
         # Selection probability proportional to fitness
         selection_probs = np.array(fitnesses) / sum(fitnesses)
         
         # Create rest of the new population
-        for _ in range(self.size - 1):
+        for _ in range(self.size - len(new_agents)):
             # Select parents
             parent1_idx = np.random.choice(len(self.agents), p=selection_probs)
             parent2_idx = np.random.choice(len(self.agents), p=selection_probs)
@@ -71,7 +484,7 @@ class Population:
             parent2 = self.agents[parent2_idx]
             
             # Crossover
-            if random.random() < 0.7:  # 70% chance of crossover
+            if random.random() < self.crossover_rate:
                 child_brain = parent1.brain.crossover(parent2.brain)
             else:
                 # No crossover, just copy the better parent
@@ -81,12 +494,13 @@ class Population:
                     child_brain = parent2.brain.copy()
             
             # Mutation
-            child_brain.mutate(mutation_rate=0.1, mutation_scale=0.2)
+            child_brain.mutate(mutation_rate=self.mutation_rate, mutation_scale=self.mutation_scale)
             
             # Create new agent with evolved brain
             x = random.uniform(50, self.environment.width - 50)
             y = random.uniform(50, self.environment.height - 50)
-            new_agents.append(Agent(x, y, self.environment, child_brain))
+            new_agents.append(Agent(x, y, child_brain))
         
         # Replace old population with new one
-        self.agents = new_agents
\ No newline at end of file
+        self.agents = new_agents
+        self.reset_stats()
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""
+Compact brains: float32 weights and int8-quantized genomes.
+
+A Population's precision (GENOME_PRECISION env var, --precision in sweep.py
+and distributed.py) is the dtype its brains store, multiply and mutate their
+weights in:
+
+    float64   the default
+    float32   half the weight memory and genome bandwidth
+
+Sigmoids are evaluated in float64 and rounded once to the brain's dtype, so
+the numpy and numba backends still agree bit for bit in either precision.
+
+For storing and sending genomes quantize() goes further: int8 values with
+one float32 scale per weight or bias tensor of each genome, a quarter of
+float32's bytes plus a few scales. encode() / decode() give the raw byte
+layout, used for island migrants and distributed leases with
+--genome-encoding int8, and policy files saved with encoding='int8'. Brains
+are always dequantized to run.
+
+tests/test_precision.py checks that float32 gives float64's fitness on
+seeded genomes. Run this module for a fuller report on seeded runs:
+
+    python precision.py --population-size 100 --seeds 2 --generations 5
+"""
+import argparse
+import random
+import sys
+import time
+import numpy as np
+
+PRECISIONS = {
+    'float64': np.float64,
+    'float32': np.float32
+}
+ENCODINGS = ('float32', 'int8')
+
+WIDTH = 900
+HEIGHT = 600
+DT = 1.0 / 60.0
+
+
+def resolve_precision(precision):
+    """'float32' (or a dtype) -> np.dtype('float32')"""
+    name = precision if isinstance(precision, str) else np.dtype(precision).name
+    if name not in PRECISIONS:
+        raise ValueError(f"Unknown genome precision {name!r}; choose from {', '.join(PRECISIONS)}")
+    return np.dtype(PRECISIONS[name])
+
+
+def tensor_bounds(layer_sizes):
+    """(start, end) of each weight and bias tensor in a genome, in
+    NeuralNetwork.get_genome() order"""
+    bounds = []
+    offset = 0
+    for inputs, outputs in zip(layer_sizes[:-1], layer_sizes[1:]):
+        for size in (inputs * outputs, outputs):
+            bounds.append((offset, offset + size))
+            offset += size
+    return bounds
+
+
+def quantize(genomes, layer_sizes):
+    """(rows, length) genomes -> (int8 values, (rows, tensors) float32 scales).
+    Each tensor's largest weight maps to +-127; value * scale restores it."""
+    genomes = np.atleast_2d(np.asarray(genomes, dtype=np.float32))
+    bounds = tensor_bounds(layer_sizes)
+    if genomes.shape[1] != bounds[-1][1]:
+        raise ValueError(f"Genome length {genomes.shape[1]} does not match layer sizes {list(layer_sizes)}")
+
+    values = np.empty(genomes.shape, dtype=np.int8)
+    scales = np.empty((len(genomes), len(bounds)), dtype=np.float32)
+    for tensor, (start, end) in enumerate(bounds):
+        block = genomes[:, start:end]
+        scale = np.abs(block).max(axis=1) / 127
+        scale[scale == 0] = 1  # An all-zero tensor, e.g. fresh biases
+        scales[:, tensor] = scale
+        values[:, start:end] = np.clip(np.rint(block / scale[:, None]), -127, 127)
+    return values, scales
+
+
+def dequantize(values, scales, layer_sizes, dtype=np.float32):
+    """Genomes back from quantize()'s values and scales"""
+    genomes = np.empty(values.shape, dtype=dtype)
+    for tensor, (start, end) in enumerate(tensor_bounds(layer_sizes)):
+        genomes[:, start:end] = values[:, start:end] * scales[:, tensor:tensor + 1]
+    return genomes
+
+
+def encode(genomes, layer_sizes, encoding='float32'):
+    """Raw little-endian bytes of (rows, length) genomes: float32 values, or
+    for int8 the (rows, tensors) float32 scales followed by the int8 values"""
+    if encoding == 'float32':
+        return np.asarray(genomes).astype('<f4').tobytes()
+    if encoding == 'int8':
+        values, scales = quantize(genomes, layer_sizes)
+        return scales.astype('<f4').tobytes() + values.tobytes()
+    raise ValueError(f"Unknown genome encoding {encoding!r}; choose from {', '.join(ENCODINGS)}")
+
+
+def decode(data, shape, layer_sizes, encoding='float32'):
+    """float32 genomes of the given (rows, length) shape from encode()'s bytes"""
+    if encoding == 'float32':
+        return np.frombuffer(data, dtype='<f4').reshape(shape)
+    if encoding == 'int8':
+        rows = shape[0]
+        tensors = len(tensor_bounds(layer_sizes))
+        scales = np.frombuffer(data, dtype='<f4', count=rows * tensors).reshape(rows, tensors)
+        values = np.frombuffer(data, dtype=np.int8, offset=rows * tensors * 4).reshape(shape)
+        return dequantize(values, scales, layer_sizes)
+    raise ValueError(f"Unknown genome encoding {encoding!r}; choose from {', '.join(ENCODINGS)}")
+
+
+def same_genome_parity(args, seed):
+    """Evolve in float64 and, after every generation, re-run the population's
+    genomes as float64, float32 and int8 (dequantized to float32) episodes
+    with one seed; returns a row per generation and mode"""
+    from distributed import evaluate
+    from simulation import Simulation
+
+    random.seed(seed)
+    np.random.seed(seed)
+    settings = {'width': WIDTH, 'height': HEIGHT, 'food_count': args.food_count,
+                'generation_timeout': args.generation_timeout, 'backend': args.backend,
+                'arenas': 1, 'arena_fitness': 'mean', 'food_dynamics': {}}
+    simulation = Simulation(WIDTH, HEIGHT, args.population_size, args.food_count, args.generation_timeout,
+                            population_options={'backend': args.backend, 'sync_agents': False,
+                                                'precision': 'float64'})
+    rows = []
+
+    def compare(simulation):
+        agents = simulation.population.agents
+        layer_sizes = agents[0].brain.layer_sizes
+        genomes = np.array([agent.brain.get_genome(np.float64) for agent in agents])
+        episode_seed = seed * 1009 + simulation.generation
+        reference, _ = evaluate(genomes, layer_sizes, dict(settings, precision='float64'), episode_seed)
+        modes = (('float32', genomes.astype(np.float32)),
+                 ('int8', dequantize(*quantize(genomes, layer_sizes), layer_sizes)))
+        for mode, mode_genomes in modes:
+            fitnesses, _ = evaluate(mode_genomes, layer_sizes, dict(settings, precision='float32'), episode_seed)
+            rows.append({'seed': seed, 'generation': simulation.generation, 'mode': mode,
+                         'best_float64': reference.max(), 'best': fitnesses.max(),
+                         'mean_float64': reference.mean(), 'mean': fitnesses.mean(),
+                         'identical': np.mean(fitnesses == reference),
+                         'max_weight_error': np.abs(mode_genomes - genomes).max()})
+
+    simulation.on_generation_end = compare
+    while simulation.generation <= args.generations:
+        simulation.step(DT)
+    return rows
+
+
+def independent_runs(args, seed, precision):
+    """Final best/mean fitness, brain memory and wall time of a whole seeded
+    evolution run in one precision"""
+    from simulation import Simulation
+
+    random.seed(seed)
+    np.random.seed(seed)
+    simulation = Simulation(WIDTH, HEIGHT, args.population_size, args.food_count, args.generation_timeout,
+                            population_options={'backend': args.backend, 'sync_agents': False,
+                                                'precision': precision})
+    final = {}
+
+    def record(simulation):
+        fitnesses = simulation.population.get_fitnesses()
+        final.update(best=max(fitnesses), mean=sum(fitnesses) / len(fitnesses))
+
+    simulation.on_generation_end = record
+    start = time.perf_counter()
+    while simulation.generation <= args.generations:
+        simulation.step(DT)
+    brains = sum(array.nbytes for agent in simulation.population.agents
+                 for array in agent.brain.weights + agent.brain.biases)
+    return dict(final, brain_bytes=brains, wall_time=time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fitness parity of float32 and int8 genomes against float64")
+    parser.add_argument('--population-size', type=int, default=100)
+    parser.add_argument('--food-count', type=int, default=20)
+    parser.add_argument('--generation-timeout', type=float, default=20)
+    parser.add_argument('--generations', type=int, default=5)
+    parser.add_argument('--seeds', type=int, default=2)
+    parser.add_argument('--backend', default='numpy', help="Population step backend (python, numpy, numba)")
+    args = parser.parse_args(argv)
+
+    print("Same genomes, same seed (evolved in float64):")
+    print(f"{'seed':>4} {'gen':>4} {'mode':>8} {'best f64':>9} {'best':>7} {'mean f64':>9} {'mean':>7} "
+          f"{'identical':>9} {'max |dw|':>9}")
+    for seed in range(args.seeds):
+        for row in same_genome_parity(args, seed):
+            print(f"{row['seed']:>4} {row['generation']:>4} {row['mode']:>8} {row['best_float64']:>9.0f} "
+                  f"{row['best']:>7.0f} {row['mean_float64']:>9.2f} {row['mean']:>7.2f} "
+                  f"{row['identical']:>9.0%} {row['max_weight_error']:>9.2e}")
+
+    print(f"\nIndependent seeded runs, after {args.generations} generations:")
+    print(f"{'seed':>4} {'precision':>9} {'best':>7} {'mean':>7} {'brain bytes':>12} {'wall s':>7}")
+    for seed in range(args.seeds):
+        for precision in PRECISIONS:
+            result = independent_runs(args, seed, precision)
+            print(f"{seed:>4} {precision:>9} {result['best']:>7.0f} {result['mean']:>7.2f} "
+                  f"{result['brain_bytes']:>12} {result['wall_time']:>7.1f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,361 @@
+import heapq
+import json
+import os
+import struct
+import zlib
+import numpy as np
+from agent import Agent
+from food_field import FoodField
+from population import Population
+from neural_network import NeuralNetwork
+
+# File layout:
+#   MAGIC, uint32 metadata length, metadata JSON
+#   records: RECORD_HEADER + zlib-compressed payload
+#   optional index record and TRAILER (written on close)
+# The index is only a shortcut; a file that was never closed is indexed by
+# scanning the record headers, so a live recording can be replayed too.
+# A run record (its generation field the run number) marks a reset: readers
+# drop everything recorded before it.
+MAGIC = b"NEVOREP1"
+TRAILER_MAGIC = b"NEVOIDX1"
+RECORD_HEADER = struct.Struct("<cIIIIII")  # type, generation, first_tick, tick_count, agents, food, payload length
+TRAILER = struct.Struct("<Q8s")
+
+TICKS_RECORD = b"T"
+BRAINS_RECORD = b"G"
+INDEX_RECORD = b"I"
+RUN_RECORD = b"R"
+
+
+class ReplayRecorder:
+    """Records compact per-tick world state into a chunked, compressed log"""
+    def __init__(self, path, width, height, chunk_ticks=256, compression_level=1, record_brains=True):
+        self.path = path
+        self.chunk_ticks = chunk_ticks
+        self.compression_level = compression_level
+        self.record_brains = record_brains
+
+        self.file = open(path, "wb")
+        metadata = json.dumps({'width': width, 'height': height}).encode()
+        self.file.write(MAGIC)
+        self.file.write(struct.pack("<I", len(metadata)))
+        self.file.write(metadata)
+        self.index = []
+        self.run = 0
+
+        # Current chunk
+        self.generation = None
+        self.first_tick = 0
+        self.count = 0
+        self.num_agents = 0
+        self.num_food = 0
+        self.agent_state = None
+        self.alive_bits = None
+        self.food_state = None
+
+    def record(self, generation, agents, foods):
+        """Append one tick of state for the given generation"""
+        if generation != self.generation:
+            self.flush()
+            self.generation = generation
+            self.first_tick = 0
+            if self.record_brains:
+                self.write_brains(generation, agents)
+
+        if self.agent_state is None or len(agents) != self.num_agents or len(foods) != self.num_food:
+            self.flush()
+            self.allocate(len(agents), len(foods))
+
+        # One pass over the agents; columns are split out by NumPy
+        row = self.count
+        state = np.array([(a.position_x, a.position_y, a.direction, a.food_eaten, a.alive) for a in agents],
+                         dtype=np.float64).reshape(-1, 5)
+        self.agent_state[:, row] = state[:, :4].T
+        self.alive_bits[row] = np.packbits(state[:, 4] > 0)
+        self.food_state[row] = foods.positions() if len(foods) else 0
+
+        self.count += 1
+        if self.count == self.chunk_ticks:
+            self.flush()
+
+    def reset(self):
+        """Start a new run (e.g. after a simulation reset); readers forget the old one"""
+        self.flush()
+        self.generation = None
+        self.run += 1
+        # The old run's records stay in the file but leave the index
+        self.index = []
+        self.write_record(RUN_RECORD, self.run, 0, 0, 0, 0, b"")
+
+    def allocate(self, num_agents, num_food):
+        self.num_agents = num_agents
+        self.num_food = num_food
+        self.agent_state = np.zeros((4, self.chunk_ticks, num_agents), dtype=np.float32)
+        self.alive_bits = np.zeros((self.chunk_ticks, (num_agents + 7) // 8), dtype=np.uint8)
+        self.food_state = np.zeros((self.chunk_ticks, num_food, 2), dtype=np.float32)
+
+    def write_brains(self, generation, agents):
+        """Store the genomes of a generation so replays can show its brains"""
+        genomes = np.array([agent.brain.get_genome() for agent in agents], dtype=np.float32)
+        layer_sizes = np.array(agents[0].brain.layer_sizes if agents else [], dtype=np.uint32)
+        payload = struct.pack("<I", len(layer_sizes)) + layer_sizes.tobytes() + genomes.tobytes()
+        self.write_record(BRAINS_RECORD, generation, 0, 0, len(agents), genomes.shape[1] if agents else 0, payload)
+
+    def flush(self):
+        """Compress and write the buffered ticks"""
+        if self.count == 0:
+            return
+
+        count = self.count
+        eaten = self.agent_state[3, :count].astype(np.uint16)
+        payload = b"".join((
+            self.agent_state[:3, :count].tobytes(),
+            eaten.tobytes(),
+            self.alive_bits[:count].tobytes(),
+            self.food_state[:count].tobytes(),
+        ))
+        self.write_record(TICKS_RECORD, self.generation, self.first_tick, count,
+                          self.num_agents, self.num_food, payload)
+
+        self.first_tick += count
+        self.count = 0
+
+    def write_record(self, kind, generation, first_tick, tick_count, num_agents, num_food, payload):
+        compressed = zlib.compress(payload, self.compression_level)
+        offset = self.file.tell()
+        self.file.write(RECORD_HEADER.pack(kind, generation, first_tick, tick_count,
+                                           num_agents, num_food, len(compressed)))
+        self.file.write(compressed)
+        self.file.flush()
+        self.index.append((kind, generation, first_tick, tick_count, num_agents, num_food, offset))
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+
+        # Write the index so readers can seek without scanning
+        entries = [(kind.decode(), generation, first_tick, tick_count, num_agents, num_food, offset)
+                   for kind, generation, first_tick, tick_count, num_agents, num_food, offset in self.index]
+        payload = json.dumps(entries).encode()
+        index_offset = self.file.tell()
+        self.write_record(INDEX_RECORD, 0, 0, 0, 0, 0, payload)
+        self.file.write(TRAILER.pack(index_offset, TRAILER_MAGIC))
+        self.file.close()
+
+
+class ReplayFrame:
+    """World state of a single recorded tick"""
+    def __init__(self, generation, tick, x, y, direction, food_eaten, alive, food):
+        self.generation = generation
+        self.tick = tick
+        self.x = x
+        self.y = y
+        self.direction = direction
+        self.food_eaten = food_eaten
+        self.alive = alive
+        self.food = food
+
+    def apply(self, population, foods):
+        """Write this frame's state into an existing population and FoodField"""
+        for i, agent in enumerate(population.agents):
+            agent.position_x = float(self.x[i])
+            agent.position_y = float(self.y[i])
+            agent.direction = float(self.direction[i])
+            agent.food_eaten = int(self.food_eaten[i])
+            agent.alive = bool(self.alive[i])
+            agent.target_food = None
+
+        foods.set_positions(self.food)
+
+        # The population's running counters don't see these direct writes;
+        # recompute them from the frame instead of resetting the population
+        alive = np.asarray(self.alive, dtype=bool)
+        food_eaten = np.asarray(self.food_eaten, dtype=np.int64)
+        fitnesses = (Agent.fitness_per_food * food_eaten).tolist()
+        population.alive_count = int(np.count_nonzero(alive))
+        population.stuck_count = 0  # Not recorded
+        population.food_eaten = int(food_eaten.sum())
+        population.max_fitness = max(fitnesses, default=0)
+        population.best_heap = [(-fitnesses[i], i) for i in np.flatnonzero(alive).tolist()]
+        heapq.heapify(population.best_heap)
+
+        # Batched backends pick the best agent from the batch arrays
+        batch = population.batch
+        if batch is not None:
+            count = len(population.agents)
+            batch.x[:count] = self.x
+            batch.y[:count] = self.y
+            batch.direction[:count] = self.direction
+            batch.food_eaten[:count] = food_eaten
+            batch.alive[:count] = alive
+            batch.is_stuck[:count] = False
+
+
+class ReplayReader:
+    """Random access and streaming over a replay log"""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a replay file")
+        metadata_length, = struct.unpack("<I", self.file.read(4))
+        self.metadata = json.loads(self.file.read(metadata_length))
+
+        self.chunks = {}  # generation -> [(first_tick, tick_count, agents, food, offset)]
+        self.brain_offsets = {}  # generation -> offset
+        self.run = 0  # Run the indexed records belong to
+        self.scan_offset = self.file.tell()
+        self.cached_offset = None
+        self.cached_chunk = None
+
+        if not self.load_index():
+            self.refresh()
+
+    def load_index(self):
+        """Load the index written on close, if there is one"""
+        file_size = os.path.getsize(self.path)
+        if file_size < self.scan_offset + TRAILER.size:
+            return False
+        self.file.seek(file_size - TRAILER.size)
+        index_offset, magic = TRAILER.unpack(self.file.read(TRAILER.size))
+        if magic != TRAILER_MAGIC:
+            return False
+
+        _, _, _, _, _, _, payload = self.read_record(index_offset)
+        for kind, generation, first_tick, tick_count, num_agents, num_food, offset in json.loads(payload):
+            self.add_entry(kind.encode(), generation, first_tick, tick_count, num_agents, num_food, offset)
+        self.scan_offset = index_offset
+        return True
+
+    def refresh(self):
+        """Index any records appended since the last scan (for live recordings)"""
+        file_size = os.path.getsize(self.path)
+        while self.scan_offset + RECORD_HEADER.size <= file_size:
+            self.file.seek(self.scan_offset)
+            header = RECORD_HEADER.unpack(self.file.read(RECORD_HEADER.size))
+            kind, generation, first_tick, tick_count, num_agents, num_food, length = header
+            end = self.scan_offset + RECORD_HEADER.size + length
+            if end > file_size or kind == INDEX_RECORD:
+                break  # Partially written record, or the closing index
+            self.add_entry(kind, generation, first_tick, tick_count, num_agents, num_food, self.scan_offset)
+            self.scan_offset = end
+
+    def add_entry(self, kind, generation, first_tick, tick_count, num_agents, num_food, offset):
+        if kind == TICKS_RECORD:
+            if first_tick == 0:
+                # A generation recorded again after a reset replaces the earlier run
+                self.chunks[generation] = []
+            self.chunks.setdefault(generation, []).append((first_tick, tick_count, num_agents, num_food, offset))
+        elif kind == BRAINS_RECORD:
+            self.brain_offsets[generation] = offset
+        elif kind == RUN_RECORD:
+            # The recording was reset: only what follows belongs to the current run
+            self.chunks = {}
+            self.brain_offsets = {}
+            self.run = generation
+
+    def read_record(self, offset):
+        self.file.seek(offset)
+        header = RECORD_HEADER.unpack(self.file.read(RECORD_HEADER.size))
+        payload = zlib.decompress(self.file.read(header[-1]))
+        return header[:-1] + (payload,)
+
+    @property
+    def generations(self):
+        return sorted(self.chunks)
+
+    def tick_count(self, generation):
+        chunks = self.chunks.get(generation)
+        if not chunks:
+            return 0
+        first_tick, tick_count = chunks[-1][:2]
+        return first_tick + tick_count
+
+    def load_chunk(self, offset):
+        """Decode a tick chunk, keeping the last one cached for sequential playback"""
+        if offset == self.cached_offset:
+            return self.cached_chunk
+
+        _, generation, first_tick, count, num_agents, num_food, payload = self.read_record(offset)
+        position = 0
+
+        def take(dtype, shape):
+            nonlocal position
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            array = np.frombuffer(payload, dtype=dtype, count=int(np.prod(shape)), offset=position).reshape(shape)
+            position += size
+            return array
+
+        agent_state = take(np.float32, (3, count, num_agents))
+        eaten = take(np.uint16, (count, num_agents))
+        alive = np.unpackbits(take(np.uint8, (count, (num_agents + 7) // 8)), axis=1, count=num_agents).astype(bool)
+        food = take(np.float32, (count, num_food, 2))
+
+        self.cached_offset = offset
+        self.cached_chunk = (generation, first_tick, agent_state, eaten, alive, food)
+        return self.cached_chunk
+
+    def frame(self, generation, tick):
+        """Return the state at a given generation and tick"""
+        for first_tick, tick_count, _, _, offset in self.chunks.get(generation, []):
+            if first_tick <= tick < first_tick + tick_count:
+                _, _, agent_state, eaten, alive, food = self.load_chunk(offset)
+                row = tick - first_tick
+                return ReplayFrame(generation, tick, agent_state[0, row], agent_state[1, row],
+                                   agent_state[2, row], eaten[row], alive[row], food[row])
+        raise KeyError(f"No tick {tick} recorded for generation {generation}")
+
+    def frames(self, generation=None, start_tick=0, step=1):
+        """Stream frames in order, from one generation or the whole log.
+        A step above 1 plays back faster by skipping ticks."""
+        generations = self.generations if generation is None else [generation]
+        for gen in generations:
+            for tick in range(start_tick, self.tick_count(gen), step):
+                yield self.frame(gen, tick)
+            start_tick = 0
+
+    def brains(self, generation):
+        """Rebuild the recorded brains of a generation, or None if not recorded"""
+        offset = self.brain_offsets.get(generation)
+        if offset is None:
+            return None
+        _, _, _, _, num_agents, genome_size, payload = self.read_record(offset)
+        layer_count, = struct.unpack_from("<I", payload)
+        layer_sizes = np.frombuffer(payload, dtype=np.uint32, count=layer_count, offset=4).tolist()
+        genomes = np.frombuffer(payload, dtype=np.float32, offset=4 + 4 * layer_count).reshape(num_agents, genome_size)
+        return [NeuralNetwork.from_genome(layer_sizes, genome) for genome in genomes]
+
+    def close(self):
+        self.file.close()
+
+
+class ReplayPlayer:
+    """Applies replayed frames to a scratch population so they render like live frames"""
+    def __init__(self, reader, environment):
+        self.reader = reader
+        self.environment = environment
+        self.population = None
+        self.foods = FoodField(0, environment.width, environment.height)
+        self.brains_generation = None  # (run, generation) of the brains swapped in
+
+    def seek(self, generation, tick):
+        frame = self.reader.frame(generation, tick)
+
+        if self.population is None or len(self.population.agents) != len(frame.x):
+            self.population = Population(len(frame.x), self.environment)
+            self.brains_generation = None
+        if len(self.foods) != len(frame.food):
+            self.foods = FoodField(len(frame.food), self.environment.width, self.environment.height)
+
+        # Swap in the recorded brains when the generation changes
+        if (self.reader.run, generation) != self.brains_generation:
+            brains = self.reader.brains(generation)
+            if brains is not None:
+                for agent, brain in zip(self.population.agents, brains):
+                    agent.brain = brain
+            self.brains_generation = (self.reader.run, generation)
+
+        frame.apply(self.population, self.foods)
+        return frame
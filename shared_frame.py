@@ -0,0 +1,97 @@
+import struct
+from multiprocessing import shared_memory
+
+# Layout: a header followed by two slots. The writer always fills the slot
+# that is not currently published, then flips the active index. The sequence
+# counter is odd while a publish is in progress (a seqlock), so readers can
+# tell whether the slot they copied was overwritten underneath them.
+HEADER = struct.Struct('<QQQQ')  # sequence, active slot, tick, revision
+LENGTH = struct.Struct('<I')  # part count, then each part's length
+
+DEFAULT_SLOT_SIZE = 4 * 2**20
+
+class SharedFrameBuffer:
+    """Latest simulation status and frame, published by one process and read by many"""
+    def __init__(self, name=None, slot_size=DEFAULT_SLOT_SIZE, create=False):
+        if create:
+            size = HEADER.size + 2 * slot_size
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            HEADER.pack_into(self.shm.buf, 0, 0, 0, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.slot_size = (self.shm.size - HEADER.size) // 2
+
+        # Readers keep the last parts they copied and reuse them until the sequence moves
+        self.cached_sequence = None
+        self.cached_parts = 0
+        self.cached = None
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def slot_offset(self, slot):
+        return HEADER.size + slot * self.slot_size
+
+    def publish(self, tick, revision, *parts):
+        """Write the parts (bytes) into the idle slot and make it current"""
+        buf = self.shm.buf
+        size = LENGTH.size * (1 + len(parts)) + sum(len(part) for part in parts)
+        if size > self.slot_size:
+            raise ValueError(f"Publish of {size} bytes does not fit a {self.slot_size} byte slot")
+
+        sequence, active, published_tick, published_revision = HEADER.unpack_from(buf, 0)
+        slot = 1 - active
+        # Odd sequence: publish in progress
+        HEADER.pack_into(buf, 0, sequence + 1, active, published_tick, published_revision)
+
+        offset = self.slot_offset(slot)
+        LENGTH.pack_into(buf, offset, len(parts))
+        offset += LENGTH.size
+        for part in parts:
+            LENGTH.pack_into(buf, offset, len(part))
+            offset += LENGTH.size
+        for part in parts:
+            buf[offset:offset + len(part)] = part
+            offset += len(part)
+
+        HEADER.pack_into(buf, 0, sequence + 2, slot, tick, revision)
+
+    def read(self, count=None):
+        """(tick, revision, *parts) for the latest publish, or None if nothing was
+        published yet. count limits how many leading parts are copied out."""
+        buf = self.shm.buf
+        while True:
+            sequence, active, tick, revision = HEADER.unpack_from(buf, 0)
+            if sequence & 1:
+                # Mid-publish: the active slot still holds the previous publish
+                sequence -= 1
+            if sequence == 0:
+                return None
+            if sequence == self.cached_sequence:
+                wanted = self.cached_parts if count is None else min(count, self.cached_parts)
+                if len(self.cached) >= 2 + wanted:
+                    return self.cached[:2 + wanted]
+
+            offset = self.slot_offset(active)
+            part_count = LENGTH.unpack_from(buf, offset)[0]
+            lengths = [LENGTH.unpack_from(buf, offset + LENGTH.size * (1 + i))[0] for i in range(part_count)]
+            offset += LENGTH.size * (1 + part_count)
+            parts = []
+            for length in lengths[:count]:
+                parts.append(bytes(buf[offset:offset + length]))
+                offset += length
+
+            # The copied slot is only rewritten by the publish after next
+            if HEADER.unpack_from(buf, 0)[0] <= sequence + 2:
+                self.cached_sequence = sequence
+                self.cached_parts = part_count
+                self.cached = (tick, revision, *parts)
+                return self.cached
+
+    def close(self):
+        self.cached = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
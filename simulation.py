@@ -0,0 +1,212 @@
+import threading
+import time
+from camera import draw_world
+from environment import Environment
+from food_field import FoodField
+from population import Population
+from termination import Termination
+
+class Simulation:
+    """The evolution world and its step loop, independent of any front end"""
+    def __init__(self, width, height, population_size=50, food_count=20, generation_timeout=45,
+                 log_generations=False, population_options=None, termination=None, food_options=None):
+        self.width = width
+        self.height = height
+        self.population_size = population_size
+        self.food_count = food_count
+        self.generation_timeout = generation_timeout  # seconds before forcing next generation
+        self.log_generations = log_generations
+        # Extra Population arguments (backend, evolution settings, ...)
+        self.population_options = population_options or {}
+        # FoodField dynamics (see food_field.py)
+        self.food_options = food_options or {}
+
+        # Optional ReplayRecorder, fed every step
+        self.recorder = None
+
+        # Optional MetricsHistory, given a row per generation (see history.py)
+        self.history = None
+
+        # Optional callback, called with the simulation when a generation ends, before it evolves
+        self.on_generation_end = None
+
+        # Early-exit policies, and the tally of why generations ended
+        self.termination = termination or Termination()
+        self.last_end_reason = None
+
+        # Steps taken since creation; keeps counting across resets
+        self.tick = 0
+
+        self.environment = Environment(width, height)
+        self.population = None
+        self.foods = []
+        self.reset()
+
+    def reset(self, population_size=None, food_count=None):
+        """Start over from generation 1, optionally with new settings"""
+        if population_size is not None:
+            self.population_size = population_size
+        if food_count is not None:
+            self.food_count = food_count
+
+        self.population = Population(self.population_size, self.environment, **self.population_options)
+        self.foods = FoodField(self.food_count, self.width, self.height, arenas=self.population.arenas,
+                               **self.food_options)
+
+        self.generation = 1
+        self.best_fitness = 0
+        self.generation_time = 0
+        self.paused = False
+
+        self.termination.reset()
+        self.termination.start_generation(self)
+
+        # A reset re-records from generation 1
+        if self.recorder:
+            self.recorder.reset()
+        if self.history:
+            self.history.start_generation()
+
+    def reset_food(self):
+        """Reset all food to new random positions"""
+        self.foods.reset()
+
+    def next_generation(self, reason='manual'):
+        """Move to next generation"""
+        self.last_end_reason = reason
+        self.termination.end_generation(self, reason)
+        if self.history:
+            self.history.end_generation(self)
+        if self.on_generation_end:
+            self.on_generation_end(self)
+
+        self.generation += 1
+        self.generation_time = 0
+
+        # Evolve population
+        self.population.evolve()
+        self.reset_food()
+        self.termination.start_generation(self)
+
+    def step(self, dt=1.0 / 60.0):
+        """Run one step of the simulation"""
+        if self.paused:
+            return
+
+        self.generation_time += dt
+        self.tick += 1
+
+        # Regrow and move food, then update agents and let them eat
+        step_start = time.perf_counter()
+        self.foods.update(dt)
+        self.population.step(self.foods, dt)
+        if self.history:
+            self.history.record_tick(self.population.alive_count, time.perf_counter() - step_start)
+
+        if self.recorder:
+            self.recorder.record(self.generation, self.population.agents, self.foods)
+
+        # Update best fitness
+        self.best_fitness = max(self.best_fitness, self.population.max_fitness)
+
+        # Check if generation should end
+        if self.population.alive_count == 0:
+            reason = 'all dead'
+        elif self.generation_time > self.generation_timeout:
+            reason = 'timeout'
+        else:
+            reason = self.termination.check(self)
+
+        if reason:
+            if self.log_generations:
+                print(f"Generation {self.generation} ended - {reason} after {self.generation_time:.1f}s")
+            self.next_generation(reason)
+            if self.log_generations and self.termination.policies:
+                print(f"  Termination: {self.termination.summary()}")
+
+    def stats(self):
+        """Snapshot of the numbers shown by the front ends"""
+        return {
+            'tick': self.tick,
+            'generation': self.generation,
+            'best_fitness': self.best_fitness,
+            'alive_count': self.population.alive_count,
+            'stuck_count': self.population.stuck_count,
+            'population_size': len(self.population.agents),
+            'time': self.generation_time,
+            'paused': self.paused,
+            'ticks_saved': self.termination.ticks_saved,
+            'ticks_saved_fraction': self.termination.saved_fraction()
+        }
+
+    def draw(self, surface, camera=None, background=(0, 0, 0)):
+        """Draw the world (environment, food, living agents) onto a surface,
+        or only a Camera's view of it (see camera.py)"""
+        draw_world(surface, self.environment, self.population, self.foods, camera, background)
+
+
+class SimulationWorker:
+    """Runs a Simulation on a background thread so it advances independently of UI refreshes"""
+    def __init__(self, simulation, dt=1.0 / 60.0, max_steps_per_second=None, on_step=None):
+        self.simulation = simulation
+        self.dt = dt
+        self.max_steps_per_second = max_steps_per_second  # None runs as fast as possible
+        self.on_step = on_step  # Called after each step, with the lock held
+
+        # Hold the lock while reading or changing the simulation from another thread
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.steps = 0
+        self.steps_per_second = 0.0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+
+    def run(self):
+        window_start = time.perf_counter()
+        window_steps = 0
+
+        while self.running:
+            step_start = time.perf_counter()
+            try:
+                with self.lock:
+                    paused = self.simulation.paused
+                    if not paused:
+                        self.simulation.step(self.dt)
+                        if self.on_step:
+                            self.on_step(self.simulation)
+            except Exception as e:
+                print(f"Simulation error: {e}")
+                time.sleep(0.1)  # Brief pause on error
+                continue
+
+            if paused:
+                time.sleep(0.05)
+            else:
+                self.steps += 1
+                window_steps += 1
+
+            # Measure throughput once a second
+            now = time.perf_counter()
+            if now - window_start >= 1.0:
+                self.steps_per_second = window_steps / (now - window_start)
+                window_start = now
+                window_steps = 0
+
+            if self.max_steps_per_second:
+                remaining = 1.0 / self.max_steps_per_second - (now - step_start)
+                if remaining > 0:
+                    time.sleep(remaining)
+            else:
+                # Let UI threads in between steps
+                time.sleep(0)
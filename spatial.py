@@ -0,0 +1,98 @@
+"""
+Uniform-grid broad phase for points in the plane.
+
+UniformGrid buckets points into square cells with one counting sort, so
+building it is O(n). Neighbour queries gather the points of the cells
+around each query point as flat (query, point) candidate pairs that the
+caller filters by exact distance (nearest_per_query then picks each query's
+closest), and rectangle queries return the points in the cells a rectangle
+overlaps. Points can be split into groups (for example one per arena) that
+never see each other. Points outside the world rectangle, like parked food,
+are left out of the index.
+"""
+import numpy as np
+
+
+def concatenate_ranges(starts, ends):
+    """Indices start..end-1 of every (start, end) pair, concatenated, and the
+    pair each index came from"""
+    lengths = ends - starts
+    total = int(lengths.sum())
+    owner = np.repeat(np.arange(len(starts)), lengths)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+    return offsets, owner
+
+
+def nearest_per_query(query, point, distance):
+    """Positions of each query's nearest (query, point) pair, for pairs
+    grouped by query with each point at most once per query; ties go to the
+    lowest point index"""
+    if len(query) == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Every group's nearest distance, then its lowest point index at that distance
+    starts = np.flatnonzero(np.concatenate(([True], query[1:] != query[:-1])))
+    lengths = np.diff(np.append(starts, len(query)))
+    nearest = np.repeat(np.minimum.reduceat(distance, starts), lengths)
+    candidate = np.where(distance == nearest, point, np.iinfo(np.int64).max)
+    return np.flatnonzero(candidate == np.repeat(np.minimum.reduceat(candidate, starts), lengths))
+
+
+class UniformGrid:
+    """Points bucketed by cell; order holds point indices sorted by cell and
+    starts[c]:starts[c + 1] is cell c's slice of it"""
+    def __init__(self, x, y, cell_size, width, height, group=None, groups=1):
+        self.cell_size = float(cell_size)
+        self.columns = max(1, int(np.ceil(width / cell_size)))
+        self.rows = max(1, int(np.ceil(height / cell_size)))
+        self.groups = groups
+
+        inside = (x >= 0) & (x <= width) & (y >= 0) & (y <= height)
+        points = np.flatnonzero(inside)
+        cells = self.cell_ids(x[points], y[points], None if group is None else group[points])
+        counts = np.bincount(cells, minlength=self.groups * self.rows * self.columns)
+        self.starts = np.concatenate(([0], np.cumsum(counts)))
+        self.order = points[np.argsort(cells, kind='stable')]
+
+    def __len__(self):
+        return len(self.order)
+
+    def cell_ids(self, x, y, group=None):
+        column = np.clip((x / self.cell_size).astype(np.int64), 0, self.columns - 1)
+        row = np.clip((y / self.cell_size).astype(np.int64), 0, self.rows - 1)
+        ids = row * self.columns + column
+        if group is not None:
+            ids += group * (self.rows * self.columns)
+        return ids
+
+    def neighbours(self, x, y, radius, group=None):
+        """(query, point) index pairs for every point in the cells within
+        radius of each query point; a superset of the points within radius"""
+        reach = int(np.ceil(radius / self.cell_size))
+        offsets = np.arange(-reach, reach + 1)
+        column = np.clip((x / self.cell_size).astype(np.int64), 0, self.columns - 1)[:, None] + offsets
+        row = np.clip((y / self.cell_size).astype(np.int64), 0, self.rows - 1)[:, None] + offsets
+        column_ok = (column >= 0) & (column < self.columns)
+        row_ok = (row >= 0) & (row < self.rows)
+
+        # (queries, rows, columns) cell ids, only the ones inside the grid
+        cells = row[:, :, None] * self.columns + column[:, None, :]
+        if group is not None:
+            cells = cells + (group * (self.rows * self.columns))[:, None, None]
+        valid = row_ok[:, :, None] & column_ok[:, None, :]
+        query = np.broadcast_to(np.arange(len(x))[:, None, None], cells.shape)[valid]
+        cells = cells[valid]
+
+        positions, owner = concatenate_ranges(self.starts[cells], self.starts[cells + 1])
+        return query[owner], self.order[positions]
+
+    def in_rect(self, left, top, right, bottom, group=0):
+        """Indices of the points in the cells overlapping a rectangle"""
+        first_column, last_column = (np.clip(np.array([left, right]) // self.cell_size, 0, self.columns - 1)
+                                     .astype(np.int64))
+        first_row, last_row = np.clip(np.array([top, bottom]) // self.cell_size, 0, self.rows - 1).astype(np.int64)
+        base = group * (self.rows * self.columns)
+        # Each row of cells is one contiguous run of the sorted points
+        cell_rows = base + np.arange(first_row, last_row + 1) * self.columns
+        positions, _ = concatenate_ranges(self.starts[cell_rows + first_column],
+                                          self.starts[cell_rows + last_column + 1])
+        return self.order[positions]
@@ -0,0 +1,255 @@
+"""
+Sweep evolution settings headlessly and write a results table.
+
+Each configuration runs for a fixed number of generations once per seed, in
+a process pool. The CSV has one row per configuration, seed and generation
+(best/mean fitness, ticks, wall time, ticks per second); a summary ranking
+configurations by the compute they needed to reach --target is printed,
+counted in agent-ticks (ticks x population size x arenas) so that
+population sizes and multi-episode evaluation compare fairly.
+
+    python sweep.py --param mutation_rate=0.05,0.1,0.2 --param elite_count=1,3 \\
+        --seeds 3 --generations 20 --target 100 --output sweep.csv
+
+    python sweep.py --random 30 --param mutation_rate=0.02:0.3 \\
+        --param population_size=30,50,100 --param generation_timeout=15:45
+
+    python sweep.py --param arenas=1,2,4 --arena-fitness min --target 100
+
+    python sweep.py --objective mixed --param novelty_weight=0.25,0.5,0.75 --target 100
+
+    python sweep.py --food-dynamics patchy,regrow=2 --param food_count=200,2000
+
+    python sweep.py --interactions separation,sense --param population_size=50,200
+
+    python sweep.py --precision float32 --param population_size=1000,5000
+
+Values are comma-separated lists; --random also accepts lo:hi ranges.
+"""
+import argparse
+import csv
+import itertools
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+WIDTH = 900
+HEIGHT = 600
+DT = 1.0 / 60.0
+
+# Sweepable settings and their defaults (the live simulation's values)
+PARAMETERS = {
+    'crossover_rate': (float, 0.7),
+    'mutation_rate': (float, 0.1),
+    'mutation_scale': (float, 0.2),
+    'elite_count': (int, 1),
+    'arenas': (int, 1),
+    'novelty_weight': (float, 0.5),
+    'population_size': (int, 50),
+    'food_count': (int, 20),
+    'generation_timeout': (float, 45)
+}
+EVOLUTION_PARAMETERS = ('crossover_rate', 'mutation_rate', 'mutation_scale', 'elite_count', 'arenas',
+                        'novelty_weight')
+
+COLUMNS = ['config', 'seed'] + list(PARAMETERS) + [
+    'generation', 'best_fitness', 'mean_fitness', 'end_reason', 'ticks', 'total_ticks', 'wall_time',
+    'ticks_per_sec'
+]
+
+
+def parse_param(text):
+    """'name=1,2,3' -> (name, [1, 2, 3]); 'name=lo:hi' -> (name, (lo, hi))"""
+    name, _, values = text.partition('=')
+    if name not in PARAMETERS:
+        raise ValueError(f"Unknown parameter {name!r}; choose from {', '.join(PARAMETERS)}")
+    kind = PARAMETERS[name][0]
+    if ':' in values:
+        low, high = values.split(':')
+        return name, (kind(low), kind(high))
+    return name, [kind(value) for value in values.split(',')]
+
+
+def grid_configs(space):
+    """Every combination of the listed values"""
+    for name, values in space.items():
+        if isinstance(values, tuple):
+            raise ValueError(f"{name}: ranges need --random; list values for a grid")
+    names = list(space)
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def random_configs(space, count, rng):
+    """count configurations drawn uniformly from lists and ranges"""
+    for _ in range(count):
+        config = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                config[name] = rng.randint(low, high) if PARAMETERS[name][0] is int else rng.uniform(low, high)
+            else:
+                config[name] = rng.choice(values)
+        yield config
+
+
+def run_config(job):
+    """Run one configuration with one seed; returns a row per generation"""
+    (config_id, config, seed, generations, backend, termination, arena_fitness, objective, food_dynamics,
+     interactions, precision) = job
+
+    import numpy as np
+    from food_field import parse_dynamics
+    from simulation import Simulation
+    from termination import Termination, parse_policies
+
+    random.seed(seed)
+    np.random.seed(seed)
+
+    settings = {name: config.get(name, default) for name, (_, default) in PARAMETERS.items()}
+    population_options = {name: settings[name] for name in EVOLUTION_PARAMETERS}
+    population_options.update(backend=backend, sync_agents=False, arena_fitness=arena_fitness,
+                              objective=objective, interactions=interactions, precision=precision)
+
+    simulation = Simulation(WIDTH, HEIGHT, settings['population_size'], settings['food_count'],
+                            settings['generation_timeout'], population_options=population_options,
+                            termination=Termination(parse_policies(termination)),
+                            food_options=parse_dynamics(food_dynamics))
+
+    rows = []
+    generation_start = {'time': time.perf_counter(), 'tick': simulation.tick}
+
+    def record_generation(simulation):
+        now = time.perf_counter()
+        fitnesses = simulation.population.get_fitnesses()
+        ticks = simulation.tick - generation_start['tick']
+        wall_time = now - generation_start['time']
+        rows.append(dict(settings, config=config_id, seed=seed, generation=simulation.generation,
+                         best_fitness=max(fitnesses), mean_fitness=sum(fitnesses) / len(fitnesses),
+                         end_reason=simulation.last_end_reason,
+                         ticks=ticks, total_ticks=simulation.tick, wall_time=round(wall_time, 4),
+                         ticks_per_sec=round(ticks / wall_time, 1) if wall_time > 0 else 0))
+        generation_start['time'] = time.perf_counter()
+        generation_start['tick'] = simulation.tick
+
+    simulation.on_generation_end = record_generation
+    while len(rows) < generations:
+        simulation.step(DT)
+    return rows
+
+
+def summarize(rows, target):
+    """Per configuration: mean final best fitness, how many seeds reached
+    target, and the mean agent-ticks until best fitness first did"""
+    runs = {}
+    for row in rows:
+        runs.setdefault(row['config'], {}).setdefault(row['seed'], []).append(row)
+
+    summary = []
+    for config_id, seeds in runs.items():
+        finals = []
+        to_target = []
+        total_ticks = 0
+        total_time = 0
+        for seed_rows in seeds.values():
+            seed_rows.sort(key=lambda row: row['generation'])
+            finals.append(seed_rows[-1]['best_fitness'])
+            total_ticks += seed_rows[-1]['total_ticks']
+            total_time += sum(row['wall_time'] for row in seed_rows)
+            if target is not None:
+                reached = [row['total_ticks'] * row['population_size'] * row['arenas']
+                           for row in seed_rows if row['best_fitness'] >= target]
+                if reached:
+                    to_target.append(reached[0])
+
+        first = next(iter(seeds.values()))[0]
+        summary.append({
+            'config': config_id,
+            'settings': {name: first[name] for name in PARAMETERS},
+            'final_best': sum(finals) / len(finals),
+            'reached': len(to_target),
+            'seeds': len(seeds),
+            'agent_ticks_to_target': sum(to_target) / len(to_target) if to_target else None,
+            'ticks_per_sec': total_ticks / total_time if total_time > 0 else 0
+        })
+
+    # Configurations that reached the target on every seed with the least compute first
+    summary.sort(key=lambda item: (-item['reached'], item['agent_ticks_to_target'] or float('inf'),
+                                   -item['final_best']))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep evolution settings headlessly")
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUES',
+                        help=f"Values to sweep; one of {', '.join(PARAMETERS)}")
+    parser.add_argument('--random', type=int, metavar='N', help="Random search over N configurations "
+                        "instead of the full grid")
+    parser.add_argument('--seeds', type=int, default=3, help="Runs per configuration")
+    parser.add_argument('--generations', type=int, default=20, help="Generations per run")
+    parser.add_argument('--target', type=float, help="Fitness to reach; ranks configurations by agent-ticks to it")
+    parser.add_argument('--termination', default='', help="Early generation-end policies, "
+                        "e.g. alive=0.2,idle=5 (see termination.py)")
+    parser.add_argument('--arena-fitness', default='mean', choices=('mean', 'min'),
+                        help="How fitness combines over arenas when arenas > 1")
+    parser.add_argument('--food-dynamics', default='', help="Food spawn and regrowth spec, "
+                        "e.g. patchy,regrow=2 (see food_field.py)")
+    parser.add_argument('--interactions', default='', help="Agent-agent interactions, "
+                        "e.g. separation,sense (see interactions.py)")
+    parser.add_argument('--precision', default='float64', choices=('float64', 'float32'),
+                        help="Brain weight dtype (see precision.py)")
+    parser.add_argument('--objective', default='fitness', choices=('fitness', 'novelty', 'mixed'),
+                        help="What selection rewards; best/mean fitness are reported either way")
+    parser.add_argument('--backend', default='numpy', help="Population step backend (python, numpy, numba)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--search-seed', type=int, default=0, help="Seed for --random sampling")
+    parser.add_argument('--output', default='sweep.csv')
+    args = parser.parse_args(argv)
+
+    try:
+        from food_field import parse_dynamics
+        from interactions import parse_interactions
+        from termination import parse_policies
+        parse_policies(args.termination)
+        parse_dynamics(args.food_dynamics)
+        parse_interactions(args.interactions)
+        space = dict(parse_param(text) for text in args.param)
+        if args.random:
+            configs = list(random_configs(space, args.random, random.Random(args.search_seed)))
+        else:
+            configs = list(grid_configs(space))
+    except ValueError as e:
+        parser.error(str(e))
+
+    jobs = [(config_id, config, seed, args.generations, args.backend, args.termination, args.arena_fitness,
+             args.objective, args.food_dynamics, args.interactions, args.precision)
+            for config_id, config in enumerate(configs) for seed in range(args.seeds)]
+    print(f"Running {len(configs)} configurations x {args.seeds} seeds on {args.workers} workers")
+
+    start = time.perf_counter()
+    rows = []
+    with Pool(args.workers) as pool, open(args.output, 'w', newline='') as output:
+        writer = csv.DictWriter(output, fieldnames=COLUMNS)
+        writer.writeheader()
+        for done, run_rows in enumerate(pool.imap_unordered(run_config, jobs), 1):
+            writer.writerows(run_rows)
+            output.flush()
+            rows.extend(run_rows)
+            print(f"  {done}/{len(jobs)} runs done", end='\r')
+    print()
+    print(f"Wrote {len(rows)} rows to {args.output} in {time.perf_counter() - start:.1f}s")
+
+    print()
+    print(f"{'config':>6} {'final best':>10} {'reached':>8} {'agent-ticks to target':>21} {'ticks/s':>9}  settings")
+    for item in summarize(rows, args.target):
+        to_target = item['agent_ticks_to_target']
+        to_target = f"{to_target:.0f}" if to_target is not None else '-'
+        settings = ' '.join(f"{name}={value:g}" for name, value in item['settings'].items())
+        print(f"{item['config']:>6} {item['final_best']:>10.1f} {item['reached']:>4}/{item['seeds']:<3} "
+              f"{to_target:>21} {item['ticks_per_sec']:>9.0f}  {settings}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
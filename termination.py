@@ -0,0 +1,216 @@
+"""
+Policies that end a generation before the fixed timeout.
+
+A Simulation always ends a generation when every agent is dead or after
+generation_timeout seconds; these policies add earlier exits for
+generations whose outcome is already decided. Configure them with a
+comma-separated spec (TERMINATION env var in app.py / main.py,
+--termination in sweep.py):
+
+    alive=0.2      end when fewer than 20% of the agents are alive
+    idle=5         end when no food was eaten for 5 seconds
+    stable=8       end when the top-10 fitness ranking hasn't changed for 8 seconds
+    adaptive=1.5   end after 1.5x the time the last food was eaten in recent generations
+"""
+
+
+class TerminationPolicy:
+    """Ends a generation early; subclasses override the hooks they need"""
+    reason = 'policy'
+
+    def reset(self):
+        """Forget everything learned from earlier generations"""
+
+    def start_generation(self, simulation):
+        """Called when a generation begins"""
+
+    def should_end(self, simulation):
+        """Called after every step; True ends the generation"""
+        return False
+
+
+class AliveFraction(TerminationPolicy):
+    """End once fewer than threshold of the agents are alive"""
+    reason = 'few alive'
+
+    def __init__(self, threshold=0.2):
+        self.threshold = threshold
+
+    def should_end(self, simulation):
+        population = simulation.population
+        return population.alive_count < self.threshold * len(population.agents)
+
+
+class NoFoodEaten(TerminationPolicy):
+    """End when no agent has eaten for seconds of simulated time"""
+    reason = 'no food eaten'
+
+    def __init__(self, seconds=5.0):
+        self.seconds = seconds
+        self.food_eaten = 0
+        self.last_eaten = 0.0
+
+    def start_generation(self, simulation):
+        self.food_eaten = simulation.population.food_eaten
+        self.last_eaten = 0.0
+
+    def should_end(self, simulation):
+        if simulation.population.food_eaten != self.food_eaten:
+            self.food_eaten = simulation.population.food_eaten
+            self.last_eaten = simulation.generation_time
+        return simulation.generation_time - self.last_eaten > self.seconds
+
+
+class RankingStable(TerminationPolicy):
+    """End once the order of the top_k agents by fitness hasn't changed for
+    seconds. Selection favours the top of the ranking, so once it settles,
+    more ticks rarely change who reproduces. Checked every interval seconds."""
+    reason = 'ranking stable'
+
+    def __init__(self, seconds=8.0, top_k=10, interval=0.5):
+        self.seconds = seconds
+        self.top_k = top_k
+        self.interval = interval
+        self.ranking = None
+        self.changed = 0.0
+        self.next_check = 0.0
+
+    def start_generation(self, simulation):
+        self.ranking = None
+        self.changed = 0.0
+        self.next_check = 0.0
+
+    def should_end(self, simulation):
+        now = simulation.generation_time
+        if now < self.next_check:
+            return False
+        self.next_check = now + self.interval
+
+        fitnesses = simulation.population.get_fitnesses()
+        ranking = tuple(sorted(range(len(fitnesses)), key=lambda i: fitnesses[i], reverse=True)[:self.top_k])
+        if not fitnesses or fitnesses[ranking[0]] <= 0:
+            # Nobody has scored yet, so the ranking is just index order
+            self.ranking = None
+            self.changed = now
+            return False
+        if ranking != self.ranking:
+            self.ranking = ranking
+            self.changed = now
+            return False
+        return now - self.changed >= self.seconds
+
+
+class AdaptiveTimeout(TerminationPolicy):
+    """Per-generation time budget: margin times the latest time any food was
+    eaten over the last history generations, clamped to [minimum, the
+    simulation's generation_timeout]"""
+    reason = 'time budget'
+
+    def __init__(self, margin=1.5, minimum=10.0, history=5):
+        self.margin = margin
+        self.minimum = minimum
+        self.history = history
+        self.last_meals = []
+        self.budget = None
+        self.food_eaten = 0
+        self.last_eaten = 0.0
+
+    def reset(self):
+        self.last_meals = []
+        self.budget = None
+        self.food_eaten = 0
+        self.last_eaten = 0.0
+
+    def start_generation(self, simulation):
+        # Record when the previous generation last found food
+        if self.budget is not None:
+            self.last_meals = (self.last_meals + [self.last_eaten])[-self.history:]
+
+        if self.last_meals:
+            budget = self.margin * max(self.last_meals)
+            self.budget = min(max(budget, self.minimum), simulation.generation_timeout)
+        else:
+            self.budget = simulation.generation_timeout
+
+        self.food_eaten = simulation.population.food_eaten
+        self.last_eaten = 0.0
+
+    def should_end(self, simulation):
+        if simulation.population.food_eaten != self.food_eaten:
+            self.food_eaten = simulation.population.food_eaten
+            self.last_eaten = simulation.generation_time
+        return simulation.generation_time > self.budget
+
+
+POLICIES = {
+    'alive': AliveFraction,
+    'idle': NoFoodEaten,
+    'stable': RankingStable,
+    'adaptive': AdaptiveTimeout
+}
+
+
+def parse_policies(spec):
+    """'alive=0.2,idle=5' -> [AliveFraction(0.2), NoFoodEaten(5)]; a bare name uses its default"""
+    policies = []
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, value = item.partition('=')
+        if name not in POLICIES:
+            raise ValueError(f"Unknown termination policy {name!r}; choose from {', '.join(POLICIES)}")
+        policies.append(POLICIES[name](float(value)) if value else POLICIES[name]())
+    return policies
+
+
+class Termination:
+    """The policies a Simulation checks each step, and a tally of the
+    simulated time they saved. Saved time counts what was left until the
+    fixed timeout, so it is an upper bound: without the policy the
+    generation might still have ended sooner, once every agent died."""
+    def __init__(self, policies=(), min_time=5.0):
+        self.policies = list(policies)
+        self.min_time = min_time  # No policy ends a generation sooner than this
+        self.reset()
+
+    def reset(self):
+        for policy in self.policies:
+            policy.reset()
+        self.generations = 0
+        self.ended_by = {}
+        self.ticks_run = 0
+        self.ticks_saved = 0
+
+    def start_generation(self, simulation):
+        self.generation_tick = simulation.tick
+        for policy in self.policies:
+            policy.start_generation(simulation)
+
+    def check(self, simulation):
+        """Name of the first policy that ends the generation, or None"""
+        ended = None
+        for policy in self.policies:
+            # Every policy sees every step, so none of them misses a meal
+            if policy.should_end(simulation) and ended is None:
+                ended = policy.reason
+        if simulation.generation_time < self.min_time:
+            return None
+        return ended
+
+    def end_generation(self, simulation, reason):
+        ticks = simulation.tick - self.generation_tick
+        self.generations += 1
+        self.ended_by[reason] = self.ended_by.get(reason, 0) + 1
+        self.ticks_run += ticks
+
+        if any(reason == policy.reason for policy in self.policies) and simulation.generation_time > 0:
+            remaining = simulation.generation_timeout - simulation.generation_time
+            self.ticks_saved += max(0, round(remaining * ticks / simulation.generation_time))
+
+    def saved_fraction(self):
+        """Share of the ticks a fixed-timeout run would have needed that were skipped"""
+        total = self.ticks_run + self.ticks_saved
+        return self.ticks_saved / total if total else 0.0
+
+    def summary(self):
+        ended_by = ', '.join(f"{reason}: {count}" for reason, count in self.ended_by.items())
+        return (f"{self.generations} generations, {self.ticks_run} ticks run, up to {self.ticks_saved} "
+                f"saved ({self.saved_fraction():.0%}); ended by {ended_by or 'nothing yet'}")
@@ -0,0 +1,68 @@
+import json
+import os
+import threading
+import time
+import pytest
+import app as app_module
+
+
+def publication(tick, revision=0, paused=False):
+    status = json.dumps({'tick': tick, 'paused': paused}).encode()
+    frame = json.dumps({'frame': None, 'tick': tick}).encode()
+    return (tick, revision, status, frame, None)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Serve a hand-made publish instead of starting the simulation thread
+    monkeypatch.setitem(app_module.simulation_state, 'pid', os.getpid())
+    monkeypatch.setitem(app_module.simulation_state, 'published', publication(10))
+    monkeypatch.setattr(app_module, 'SHARED_SIMULATION', False)
+    monkeypatch.setattr(app_module, 'LONG_POLL_TIMEOUT', 0.3)
+    return app_module.create_app().test_client()
+
+
+def publish_later(published, delay=0.1):
+    def run():
+        time.sleep(delay)
+        with app_module.published_condition:
+            app_module.simulation_state['published'] = published
+            app_module.published_condition.notify_all()
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_matching_etag_gets_304(client):
+    response = client.get('/api/status')
+    assert response.status_code == 200 and response.headers['X-Simulation-Tick'] == '10'
+    etag = response.headers['ETag']
+    assert client.get('/api/status', headers={'If-None-Match': etag}).status_code == 304
+
+    app_module.simulation_state['published'] = publication(11)
+    assert client.get('/api/status', headers={'If-None-Match': etag}).status_code == 200
+
+
+@pytest.mark.parametrize('published', [publication(11), publication(10, revision=1)])
+def test_since_wakes_on_a_new_tick_or_revision(client, published):
+    thread = publish_later(published)
+    start = time.perf_counter()
+    response = client.get('/api/frame?since=10')
+    thread.join()
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{published[0]}-{published[1]}"'
+    assert time.perf_counter() - start < app_module.LONG_POLL_TIMEOUT
+
+
+def test_since_times_out_with_204(client):
+    start = time.perf_counter()
+    response = client.get('/api/status?since=10')
+    assert response.status_code == 204 and response.headers['Retry-After'] == '1'
+    assert time.perf_counter() - start >= app_module.LONG_POLL_TIMEOUT
+
+
+def test_paused_since_answers_204_at_once(client):
+    app_module.simulation_state['published'] = publication(10, paused=True)
+    start = time.perf_counter()
+    assert client.get('/api/status?since=10').status_code == 204
+    assert time.perf_counter() - start < app_module.LONG_POLL_TIMEOUT
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from history import LEVEL_BLOCK, METRICS, MetricsHistory, lttb
+
+
+def row(n):
+    return {name: float(n * (i + 1) % 97) for i, name in enumerate(METRICS)}
+
+
+def write_history(directory, values):
+    for i, name in enumerate(METRICS):
+        values[i].astype('<f8').tofile(str(directory / f"{name}.f64"))
+
+
+@pytest.mark.parametrize('count,points', [(10, 20), (1000, 3), (1000, 50), (5, 2)])
+def test_lttb_keeps_the_endpoints_and_the_point_count(count, points):
+    y = np.random.default_rng(0).normal(size=(3, count))
+    chosen = lttb(np.arange(count, dtype=np.float64), y, points)
+    assert chosen.shape == (3, min(count, points))
+    assert (chosen[:, 0] == 0).all() and (chosen[:, -1] == count - 1).all()
+    assert (np.diff(chosen, axis=1) > 0).all()
+
+
+def test_rows_roll_over_to_disk_and_reopen(tmp_path):
+    history = MetricsHistory(capacity=16, directory=str(tmp_path))
+    for n in range(40):
+        history.append(row(n))
+    np.testing.assert_array_equal(history.rows(0, 40)[2], [row(n)['best_fitness'] for n in range(40)])
+    history.close()
+
+    # A partly written row is dropped when the history is continued
+    with open(tmp_path / 'tick.f64', 'ab') as handle:
+        handle.write(b'\0' * 4)
+    history = MetricsHistory(capacity=16, directory=str(tmp_path))
+    assert history.count == 40
+    history.append(row(40))
+    assert MetricsHistory(directory=str(tmp_path), readonly=True).rows_on_disk() == 41
+    result = history.series(points=100)
+    assert [pair[0] for pair in result['series']['tick']] == list(range(41))
+    history.close()
+
+
+def test_long_ranges_come_from_summary_levels(tmp_path):
+    count = LEVEL_BLOCK * 400 + 37
+    values = np.cumsum(np.random.default_rng(1).normal(size=(len(METRICS), count)), axis=1)
+    write_history(tmp_path, values)
+    history = MetricsHistory(directory=str(tmp_path), readonly=True)
+    for start, end, points in ((0, None, 100), (1234, count - 567, 40)):
+        result = history.series(start, end, points)
+        end = count if end is None else end
+        for i, name in enumerate(METRICS):
+            rows = [pair[0] for pair in result['series'][name]]
+            assert len(rows) == points and rows[0] == start and rows[-1] == end - 1
+            assert rows == sorted(set(rows))
+            assert [pair[1] for pair in result['series'][name]] == values[i, rows].tolist()
+    assert history.levels
+
+    # Every block's peak and dip is a candidate for downsampling
+    rows, _ = history.candidates(0, count, len(history.levels) - 1)
+    for i in range(len(METRICS)):
+        for first in range(0, count, LEVEL_BLOCK * 8):
+            block = values[i, first:first + LEVEL_BLOCK * 8]
+            assert first + int(block.argmax()) in rows[i] and first + int(block.argmin()) in rows[i]
+
+
+def test_summary_levels_grow_with_the_history(tmp_path):
+    values = np.cumsum(np.random.default_rng(2).normal(size=(len(METRICS), LEVEL_BLOCK * 300)), axis=1)
+    write_history(tmp_path, values[:, :LEVEL_BLOCK * 200])
+    history = MetricsHistory(capacity=64, directory=str(tmp_path))
+    history.series(points=50)
+    for n in range(LEVEL_BLOCK * 200, LEVEL_BLOCK * 300):
+        history.append(dict(zip(METRICS, values[:, n])))
+    fresh = MetricsHistory(directory=str(tmp_path), readonly=True)
+    assert history.series(points=50) == fresh.series(points=50)
+    history.close()
@@ -0,0 +1,68 @@
+import random
+import numpy as np
+import pytest
+import kernels
+from agent import Agent
+from environment import Environment
+from food import Food
+from food_field import FoodField
+from population import Population
+
+DT = 1.0 / 60.0
+
+
+def run(backend, ticks=300, size=60, arenas=2, interactions=('separation', 'sense'), precision='float64'):
+    """Agent state and fitness after a short seeded run"""
+    random.seed(3)
+    np.random.seed(3)
+    environment = Environment(600, 400)
+    population = Population(size, environment, backend=backend, sync_agents=False, arenas=arenas,
+                            interactions=interactions, precision=precision)
+    foods = FoodField(25, environment.width, environment.height, arenas=arenas, distribution='patchy',
+                      regrow_time=0.5, depletion=0.2, drift_speed=10)
+    for _ in range(ticks):
+        foods.update(DT)
+        population.step(foods, DT)
+    batch = population.batch
+    state = {name: getattr(batch, name).copy()
+             for name in ('x', 'y', 'direction', 'energy', 'food_eaten', 'alive', 'target')}
+    state['food_x'] = foods.x.copy()
+    return state, population.get_fitnesses()
+
+
+@pytest.mark.skipif(kernels.numba is None, reason="numba is not installed")
+@pytest.mark.parametrize('precision', ['float64', 'float32'])
+def test_numpy_and_numba_match(precision):
+    numpy_state, numpy_fitness = run('numpy', precision=precision)
+    numba_state, numba_fitness = run('numba', precision=precision)
+    for name, values in numpy_state.items():
+        np.testing.assert_array_equal(values, numba_state[name], err_msg=name)
+    assert numpy_fitness == numba_fitness
+    assert sum(numpy_fitness) > 0
+
+
+def test_numpy_run_is_repeatable():
+    first_state, first_fitness = run('numpy', ticks=120)
+    second_state, second_fitness = run('numpy', ticks=120)
+    for name, values in first_state.items():
+        np.testing.assert_array_equal(values, second_state[name], err_msg=name)
+    assert first_fitness == second_fitness
+
+
+@pytest.mark.skipif(kernels.numba is None, reason="numba is not installed")
+def test_numba_reports_every_meal_in_a_crowd():
+    # Every agent stands on every food, and eaten food respawns on the crowd
+    np.random.seed(5)
+    agents = [Agent(100, 100) for _ in range(20)]
+    params = kernels.StepParams(Agent, Food.radius, 600, 400, DT, 10)
+    results = []
+    for step in (kernels.step_numpy, kernels.step_numba):
+        state = kernels.BatchState(agents)
+        food_x = np.full(30, 100.0)
+        food_y = np.full(30, 100.0)
+        randoms = (kernels.draw_randoms(len(agents)), np.full(4, 100.0), np.full(4, 100.0))
+        results.append(step(state, food_x, food_y, randoms, params))
+    (numpy_meals, numpy_eaten), (numba_meals, numba_eaten) = results
+    assert len(numpy_meals) == 20 * 30
+    np.testing.assert_array_equal(numba_meals, numpy_meals)
+    np.testing.assert_array_equal(numba_eaten, numpy_eaten)
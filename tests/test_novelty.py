@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from novelty import BehaviourArchive, NoveltySearch
+
+
+def clustered(rng, count):
+    centres = rng.random((5, 4))
+    return np.clip(centres[rng.integers(0, 5, count)] + rng.normal(0, 0.02, (count, 4)), 0, 1)
+
+
+def sparse(rng, count):
+    # A dense corner and a few far-off points, whose neighbours are many cells away
+    return np.vstack((rng.random((count - 20, 4)) * 0.1, rng.random((20, 4))))
+
+
+@pytest.mark.parametrize('make', [clustered, sparse])
+@pytest.mark.parametrize('k', [1, 15])
+def test_grid_nearest_matches_brute_force(make, k):
+    rng = np.random.default_rng(0)
+    archive = BehaviourArchive(max_size=3000, brute_force_below=0)
+    archive.add(make(rng, 3000))
+    queries = np.vstack((make(rng, 200), rng.random((50, 4)), [[0, 0, 0, 0], [1, 1, 1, 1]]))
+    for query in queries:
+        np.testing.assert_array_equal(archive.nearest(query, k), archive.brute_force(query, k))
+
+
+def test_score_matches_a_distance_matrix():
+    rng = np.random.default_rng(1)
+    descriptors = clustered(rng, 400)
+    novelty = NoveltySearch(900, 600, k=10)
+    novelty.archive.brute_force_below = 0
+    novelty.archive.add(sparse(rng, 500))
+    archived = novelty.archive.points[:len(novelty.archive)].copy()
+    scores = novelty.score(descriptors)
+
+    own = np.sqrt(((descriptors[:, None] - descriptors[None]) ** 2).sum(axis=2))
+    np.fill_diagonal(own, np.inf)
+    other = np.sqrt(((descriptors[:, None] - archived[None]) ** 2).sum(axis=2))
+    expected = np.sort(np.hstack((own, other)), axis=1)[:, :10].mean(axis=1)
+    np.testing.assert_allclose(scores, expected)
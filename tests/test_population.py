@@ -0,0 +1,23 @@
+import random
+import numpy as np
+from environment import Environment
+from food_field import FoodField
+from population import Population
+
+DT = 1.0 / 60.0
+
+
+def test_python_backend_tracks_positions_while_updating():
+    random.seed(4)
+    np.random.seed(4)
+    environment = Environment(600, 400)
+    population = Population(40, environment, backend='python', interactions=('separation',))
+    foods = FoodField(20, environment.width, environment.height)
+    for _ in range(150):
+        foods.update(DT)
+        population.step(foods, DT)
+        agents = population.agents
+        np.testing.assert_array_equal(population.agent_positions,
+                                      [(agent.position_x, agent.position_y) for agent in agents])
+        np.testing.assert_array_equal(population.agent_alive, [agent.alive for agent in agents])
+    assert population.stuck_count == sum(agent.alive and agent.is_stuck for agent in population.agents)
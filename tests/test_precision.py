@@ -0,0 +1,59 @@
+import io
+import random
+import numpy as np
+import pytest
+from distributed import evaluate
+from neural_network import NeuralNetwork
+from policy import PolicyWeights
+from precision import decode, dequantize, encode, quantize, tensor_bounds
+
+LAYER_SIZES = [3, 8, 3]
+SETTINGS = {'width': 600, 'height': 400, 'food_count': 25, 'generation_timeout': 10, 'backend': 'numpy',
+            'arenas': 1, 'arena_fitness': 'mean', 'food_dynamics': {}}
+
+
+def genomes(count, seed=0):
+    random.seed(seed)
+    np.random.seed(seed)
+    return np.array([NeuralNetwork(LAYER_SIZES).get_genome(np.float64) for _ in range(count)])
+
+
+def test_quantize_error_is_within_half_a_step_per_tensor():
+    original = genomes(20) * 5
+    values, scales = quantize(original, LAYER_SIZES)
+    assert values.dtype == np.int8 and scales.shape == (20, len(tensor_bounds(LAYER_SIZES)))
+    restored = dequantize(values, scales, LAYER_SIZES)
+    for tensor, (start, end) in enumerate(tensor_bounds(LAYER_SIZES)):
+        error = np.abs(restored[:, start:end] - original[:, start:end])
+        assert (error <= scales[:, tensor:tensor + 1] * 0.5 + 1e-6).all()
+
+
+@pytest.mark.parametrize('encoding', ['float32', 'int8'])
+def test_encode_round_trip(encoding):
+    original = genomes(7).astype(np.float32)
+    data = encode(original, LAYER_SIZES, encoding)
+    if encoding == 'int8':
+        assert len(data) < original.nbytes / 3
+    restored = decode(data, original.shape, LAYER_SIZES, encoding)
+    np.testing.assert_allclose(restored, original, atol=np.abs(original).max() / 127)
+
+
+def test_int8_policy_file_loads():
+    network = NeuralNetwork(LAYER_SIZES)
+    file = io.BytesIO()
+    PolicyWeights.from_network(network, 3, 40.0).save(file, 'int8')
+    file.seek(0)
+    loaded = PolicyWeights.load(file)
+    assert loaded.layer_sizes == LAYER_SIZES and loaded.generation == 3
+    np.testing.assert_allclose(loaded.genome, network.get_genome(), atol=np.abs(network.get_genome()).max() / 127)
+
+
+def test_float32_matches_float64_fitness_on_seeded_genomes():
+    # Scaled up so the brains steer decisively and agents actually eat
+    population = genomes(40, seed=1) * 20
+    reference, reference_ticks = evaluate(population, LAYER_SIZES, dict(SETTINGS, precision='float64'), 7)
+    compact, compact_ticks = evaluate(population.astype(np.float32), LAYER_SIZES,
+                                      dict(SETTINGS, precision='float32'), 7)
+    assert reference.sum() > 0
+    np.testing.assert_array_equal(compact, reference)
+    assert compact_ticks == reference_ticks
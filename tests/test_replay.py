@@ -0,0 +1,39 @@
+import random
+import numpy as np
+from environment import Environment
+from food_field import FoodField
+from population import Population
+from replay import ReplayPlayer, ReplayReader, ReplayRecorder
+
+DT = 1.0 / 60.0
+
+
+def test_seek_recomputes_counters_from_the_frame(tmp_path):
+    random.seed(2)
+    np.random.seed(2)
+    environment = Environment(600, 400)
+    population = Population(30, environment, backend='numpy')
+    foods = FoodField(40, environment.width, environment.height)
+    path = tmp_path / 'run.replay'
+    recorder = ReplayRecorder(str(path), environment.width, environment.height, chunk_ticks=50)
+    for _ in range(200):
+        foods.update(DT)
+        population.step(foods, DT)
+        recorder.record(0, population.agents, foods)
+    recorded = population.get_stats()
+    assert recorded['food_eaten'] > 0
+    recorder.close()
+
+    player = ReplayPlayer(ReplayReader(str(path)), environment)
+    player.seek(0, 199)
+    replayed = player.population
+    batch = replayed.batch
+    for tick in (10, 199):
+        frame = player.seek(0, tick)
+        assert replayed.batch is batch  # Updated in place, not rebuilt
+        assert replayed.food_eaten == int(frame.food_eaten.sum())
+        assert replayed.alive_count == int(np.count_nonzero(frame.alive))
+    stats = replayed.get_stats()
+    for name in ('alive_count', 'food_eaten', 'max_fitness'):
+        assert stats[name] == recorded[name], name
+    assert replayed.get_best_agent().get_fitness() == recorded['max_fitness']
@@ -0,0 +1,70 @@
+import builtins
+import pytest
+import shared_frame
+from shared_frame import HEADER, SharedFrameBuffer
+
+
+@pytest.fixture
+def buffers():
+    writer = SharedFrameBuffer(slot_size=4096, create=True)
+    reader = SharedFrameBuffer(writer.name)
+    yield writer, reader
+    reader.close()
+    writer.close()
+    writer.unlink()
+
+
+def publish(writer, tick):
+    writer.publish(tick, 0, f"status {tick}".encode(), f"frame {tick}".encode() * 10)
+
+
+def consistent(published):
+    tick = published[0]
+    return published[2:] == (f"status {tick}".encode(), f"frame {tick}".encode() * 10)
+
+
+def publish_while_copying(monkeypatch, writer, ticks):
+    """Run the given publishes while the reader copies its first part"""
+    pending = list(ticks)
+
+    def copy(view):
+        while pending:
+            publish(writer, pending.pop(0))
+        return builtins.bytes(view)
+    monkeypatch.setattr(shared_frame, 'bytes', copy, raising=False)
+
+
+def test_read_before_any_publish(buffers):
+    assert buffers[1].read() is None
+
+
+def test_read_rejects_a_slot_overwritten_while_copying(buffers, monkeypatch):
+    writer, reader = buffers
+    publish(writer, 1)
+    # The second publish rewrites the slot the reader is copying from
+    publish_while_copying(monkeypatch, writer, [2, 3])
+    published = reader.read()
+    assert published[0] == 3 and consistent(published)
+
+
+def test_read_keeps_a_slot_the_writer_did_not_touch(buffers, monkeypatch):
+    writer, reader = buffers
+    publish(writer, 1)
+    # One publish fills the other slot, so the copy stays whole
+    publish_while_copying(monkeypatch, writer, [2])
+    published = reader.read()
+    assert published[0] == 1 and consistent(published)
+    monkeypatch.undo()
+    assert reader.read()[0] == 2
+
+
+def test_read_during_a_publish_returns_the_previous_one(buffers):
+    writer, reader = buffers
+    publish(writer, 1)
+    publish(writer, 2)
+    # A publish in flight: odd sequence, header still naming the last slot
+    sequence, active, tick, revision = HEADER.unpack_from(writer.shm.buf, 0)
+    HEADER.pack_into(writer.shm.buf, 0, sequence + 1, active, tick, revision)
+    published = reader.read()
+    assert published[0] == 2 and consistent(published)
+    assert reader.read(1) == published[:3]
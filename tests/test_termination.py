@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+from termination import AdaptiveTimeout, RankingStable
+
+
+def simulation(fitnesses=(), food_eaten=0, generation_timeout=60.0):
+    population = SimpleNamespace(food_eaten=food_eaten, get_fitnesses=lambda: list(fitnesses))
+    return SimpleNamespace(population=population, generation_time=0.0, generation_timeout=generation_timeout)
+
+
+def run_generation(policy, sim, last_meal, length):
+    policy.start_generation(sim)
+    sim.generation_time = 0.0
+    while sim.generation_time < length:
+        sim.generation_time += 0.5
+        if sim.generation_time == last_meal:
+            sim.population.food_eaten += 1
+        if policy.should_end(sim):
+            break
+
+
+def test_adaptive_timeout_reset_forgets_the_running_generation():
+    policy = AdaptiveTimeout(margin=2.0, minimum=5.0)
+    sim = simulation()
+    run_generation(policy, sim, last_meal=10.0, length=60.0)
+    run_generation(policy, sim, last_meal=4.0, length=15.0)
+    assert policy.budget == 20.0
+
+    # Reset mid-generation, as a Simulation.reset() does
+    sim.population.food_eaten = 0
+    policy.reset()
+    policy.start_generation(sim)
+    assert policy.budget == sim.generation_timeout
+    assert policy.last_meals == []
+
+
+def test_ranking_stable_ignores_an_all_zero_ranking():
+    policy = RankingStable(seconds=2.0, top_k=3, interval=0.5)
+    sim = simulation(fitnesses=[0] * 10)
+    policy.start_generation(sim)
+    for _ in range(20):
+        sim.generation_time += 0.5
+        assert not policy.should_end(sim)
+
+    # Stability is counted from the first time anybody scores
+    sim.population.get_fitnesses = lambda: [0, 0, 3, 0, 1, 0, 0, 0, 2, 0]
+    ended = None
+    while ended is None:
+        sim.generation_time += 0.5
+        if policy.should_end(sim):
+            ended = sim.generation_time
+    assert ended == 10.5 + 2.0
@@ -0,0 +1,28 @@
+from collections import OrderedDict
+
+class TextCache:
+    """Caches rendered text surfaces so repeated strings are only rendered once"""
+    def __init__(self, font, max_entries=256):
+        self.font = font
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+
+    def render(self, text, color):
+        """Return a surface for text, rendering it only on a cache miss"""
+        key = (text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = self.font.render(text, True, color)
+        self.surfaces[key] = surface
+
+        # Drop the least recently used entry once the cache is full
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()